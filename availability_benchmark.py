@@ -0,0 +1,231 @@
+#! /usr/bin/env python
+
+from __future__ import division
+import argparse
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from uframe import UFrame
+from uframe.availability import test_product_availability, test_row_stream, MetadataIndex
+
+_headers = ['Array',
+    'ReferenceDesignator',
+    'Instrument',
+    'DataStreamR',
+    'DataStreamT',
+    'ParameterID_R',
+    'ParameterID_T']
+
+_methods = ('telemetered', 'recovered_host')
+
+
+def synthetic_metadata(ref_des, num_parameters, num_streams):
+    """
+    Create a metadata response with num_parameters parameters spread evenly
+    over num_streams streams, each available as telemetered and recovered_host.
+    Every stream also contains the 'time' parameter.
+    """
+    times = []
+    for s in range(num_streams):
+        for method in _methods:
+            times.append({'stream' : 'stream_{:d}'.format(s),
+                'method' : method,
+                'sensor' : ref_des,
+                'beginTime' : '2014-04-14T23:05:31.335Z',
+                'endTime' : '2015-04-15T23:05:31.335Z',
+                'count' : 1000})
+
+    parameters = []
+    for s in range(num_streams):
+        parameters.append({'particleKey' : 'time', 'stream' : 'stream_{:d}'.format(s)})
+    for p in range(num_parameters):
+        parameters.append({'particleKey' : 'parameter_{:d}'.format(p),
+            'stream' : 'stream_{:d}'.format(p % num_streams)})
+
+    return {'times' : times, 'parameters' : parameters}
+
+
+def synthetic_matrix(ref_des_list, num_rows, num_parameters, num_streams, seed=0):
+    """
+    Create num_rows test matrix rows.  About 1 in 10 streams and parameters do
+    not exist, about 1 in 10 parameters are 'time', which every stream
+    contains, and about 1 in 10 rows leave the stream blank.
+    """
+    rnd = random.Random(seed)
+
+    def stream():
+        n = rnd.randint(0, 9)
+        if n == 0:
+            return ''
+        elif n == 1:
+            return 'missing_stream'
+        return 'stream_{:d}'.format(rnd.randrange(num_streams))
+
+    def parameter():
+        n = rnd.randint(0, 9)
+        if n == 0:
+            return 'missing_parameter'
+        elif n == 1:
+            return 'time'
+        return 'parameter_{:d}'.format(rnd.randrange(num_parameters))
+
+    rows = []
+    for i in range(num_rows):
+        ref_des = rnd.choice(ref_des_list)
+        rows.append([ref_des.split('-')[0], ref_des, '', stream(), stream(), parameter(), parameter()])
+    return rows
+
+
+def scan_test_row_stream(row, meta, headers, stream_col, param_col, method, result_headers):
+    """
+    test_row_stream implemented with list scans of the metadata record, as the
+    availability checker originally did, used as the baseline.
+    """
+    streams = [m['stream'] for m in meta['times']]
+    parameters = [m['particleKey'] for m in meta['parameters']]
+
+    def parameter_stream(parameter):
+        for p in meta['parameters']:
+            if p['particleKey'] != parameter:
+                continue
+            for t in meta['times']:
+                if t['stream'] == p['stream'] and t['method'].startswith(method):
+                    return p['stream']
+        return None
+
+    stream = row[stream_col]
+    parameter = row[param_col]
+    if stream:
+        if stream in streams:
+            row[headers.index(result_headers[0])] = 1
+            if parameter and parameter in parameters:
+                row[headers.index(result_headers[1])] = 1
+                # Only the parameter's first entry is checked
+                if meta['parameters'][parameters.index(parameter)]['stream'] == stream:
+                    row[headers.index(result_headers[2])] = 1
+                found = parameter_stream(parameter)
+                if found:
+                    row[headers.index(result_headers[3])] = found
+    elif parameter and parameter in parameters:
+        found = parameter_stream(parameter)
+        if found:
+            row[headers.index(result_headers[3])] = found
+    else:
+        return False
+    return True
+
+
+def main(args):
+    """
+    Benchmark the availability checker on a synthetic test matrix.
+
+    The per-row stream and parameter tests are timed against the original
+    list scan implementation, and the results compared.  Then the complete
+    test_product_availability run, including reading and writing the CSV
+    files, is timed.  The metadata records are served from the UFrame
+    instance's metadata cache, so no uFrame server is needed.
+    """
+    ref_des_list = ['CP{:02d}TEST-SBD{:02d}-01-CTDBPC000'.format(i // 10, i % 10) for i in range(args.ref_des)]
+    metas = dict((r, synthetic_metadata(r, args.parameters, args.streams)) for r in ref_des_list)
+    rows = synthetic_matrix(ref_des_list, args.rows, args.parameters, args.streams)
+
+    r_headers = ('DataStreamR Available', 'ParameterID_R Available', 'ParameterID_R in Stream', 'UFrame DataStreamR')
+    t_headers = ('DataStreamT Available', 'ParameterID_T Available', 'ParameterID_T in Stream', 'UFrame DataStreamT')
+    headers = _headers + list(r_headers + t_headers)
+    empty = [0, 0, 0, 0, 0, 0, '', '']
+
+    # Baseline: list scans per row
+    scanned = [row + empty for row in rows]
+    t0 = time.time()
+    for row in scanned:
+        meta = metas[row[1]]
+        scan_test_row_stream(row, meta, headers, 3, 5, 'recovered', r_headers)
+        scan_test_row_stream(row, meta, headers, 4, 6, 'telemetered', t_headers)
+    scan_time = time.time() - t0
+
+    # Precomputed indexes
+    indexed = [row + empty for row in rows]
+    t0 = time.time()
+    indexes = {}
+    r_cols = tuple(headers.index(h) for h in r_headers)
+    t_cols = tuple(headers.index(h) for h in t_headers)
+    for row in indexed:
+        index = indexes.get(row[1])
+        if index is None:
+            index = indexes[row[1]] = MetadataIndex(metas[row[1]])
+        test_row_stream(row, index, 3, 5, 'recovered', r_cols)
+        test_row_stream(row, index, 4, 6, 'telemetered', t_cols)
+    index_time = time.time() - t0
+
+    if scanned != indexed:
+        sys.stderr.write('Indexed results differ from the list scan results\n')
+        return 1
+
+    # Complete run
+    uframe = UFrame(base_url='http://localhost', metadata_cache_size=len(ref_des_list))
+    for (ref_des, meta) in metas.items():
+        uframe.metadata_cache.get(ref_des, lambda meta=meta: meta)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        test_csv = os.path.join(tmp_dir, 'matrix.csv')
+        with open(test_csv, 'w') as fid:
+            writer = csv.writer(fid)
+            writer.writerow(_headers)
+            writer.writerows(rows)
+
+        # Discard the checker's progress and warning messages
+        (stdout, stderr) = (sys.stdout, sys.stderr)
+        sys.stdout = sys.stderr = open(os.devnull, 'w')
+        try:
+            t0 = time.time()
+            out_csv = test_product_availability(test_csv, uframe=uframe)
+            run_time = time.time() - t0
+        finally:
+            sys.stdout.close()
+            (sys.stdout, sys.stderr) = (stdout, stderr)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if not out_csv:
+        sys.stderr.write('test_product_availability failed\n')
+        return 1
+
+    sys.stdout.write('{:d} rows, {:d} reference designators, {:d} parameters x {:d} streams each\n'.format(
+        args.rows, args.ref_des, args.parameters, args.streams))
+    sys.stdout.write('{:>28s} {:>10s} {:>12s}\n'.format('', 'time (s)', 'rows/sec'))
+    sys.stdout.write('{:>28s} {:10.3f} {:12.0f}\n'.format('row tests, list scans', scan_time, args.rows / scan_time))
+    sys.stdout.write('{:>28s} {:10.3f} {:12.0f}\n'.format('row tests, indexed', index_time, args.rows / index_time))
+    sys.stdout.write('{:>28s} {:10.3f} {:12.0f}\n'.format('test_product_availability', run_time, args.rows / run_time))
+    sys.stdout.write('Speedup: {:.1f}x\n'.format(scan_time / index_time))
+
+    return 0
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument('--rows',
+            type=int,
+            default=100000,
+            help='Number of test matrix rows (Default is 100000).')
+    arg_parser.add_argument('--ref-des',
+            dest='ref_des',
+            type=int,
+            default=100,
+            help='Number of reference designators (Default is 100).')
+    arg_parser.add_argument('--parameters',
+            type=int,
+            default=100,
+            help='Number of parameters per reference designator (Default is 100).')
+    arg_parser.add_argument('--streams',
+            type=int,
+            default=10,
+            help='Number of streams per reference designator (Default is 10).')
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
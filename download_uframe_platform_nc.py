@@ -1,7 +1,9 @@
 #! /usr/bin/env python
 
 import argparse
-from uframe import UFrame, get_uframe_array
+from uframe import UFrame, get_uframe_array, DEFAULT_CHUNK_SIZE
+from uframe.cache import InventoryCache, DEFAULT_CACHE_DIR
+from uframe.metrics import write_metrics_at_exit
 
 
 def main(args):
@@ -13,14 +15,28 @@ def main(args):
     """
     array_id = args.array_id
 
+    # Downloads get their own connections, so that they do not block discovery
     if args.base_url:
-        uframe_base = UFrame(base_url=args.base_url, timeout=args.timeout)
+        uframe_base = UFrame(base_url=args.base_url, timeout=args.timeout, max_downloads=args.parallel)
     else:
-        uframe_base = UFrame(timeout=args.timeout)
+        uframe_base = UFrame(timeout=args.timeout, max_downloads=args.parallel)
+
+    if not args.no_cache:
+        uframe_base.cache = InventoryCache(args.cache_dir)
+
+    if args.metrics:
+        write_metrics_at_exit(uframe_base.metrics, args.metrics)
+
+    if args.verbose:
+        uframe_base.verbose = True
 
     delattr(args, 'array_id')
     delattr(args, 'base_url')
     delattr(args, 'timeout')
+    delattr(args, 'cache_dir')
+    delattr(args, 'no_cache')
+    delattr(args, 'metrics')
+    delattr(args, 'verbose')
     args.uframe_base = uframe_base
 
     fetched_urls = get_uframe_array(array_id, **vars(args))
@@ -74,6 +90,46 @@ if __name__ == '__main__':
             action='store_false',
             dest='limit',
             help='Turn data decimation off.')
+    arg_parser.add_argument('--parallel',
+            type=int,
+            default=1,
+            help='Number of concurrent downloads (Default is 1).')
+    arg_parser.add_argument('--queue-depth',
+            dest='queue_depth',
+            type=int,
+            help='Maximum number of discovered downloads waiting for a download worker.  Inventory discovery pauses while the queue is full (Default is 2 x --parallel).')
+    arg_parser.add_argument('--chunk-size',
+            dest='chunk_size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of bytes read and written at a time when downloading (Default is 1048576).')
+    arg_parser.add_argument('--fsync',
+            action='store_true',
+            help='Flush each downloaded file to disk before moving it into place.')
+    arg_parser.add_argument('--chunk-records',
+            dest='chunk_records',
+            type=int,
+            help='Split each stream request into time chunks of roughly this many records, estimated from the stream metadata.  Intended for use with --nolimit and --parallel.')
+    arg_parser.add_argument('--incremental',
+            action='store_true',
+            help='Only request data added since the last successful download of each stream.  Streams that have not been downloaded before use --alltimes or --deltatype/--deltavalue.')
+    arg_parser.add_argument('--watermarks',
+            dest='watermark_file',
+            help='Stream endTime watermark file used by --incremental (Default is DEST/.uframe_watermarks.json).')
+    arg_parser.add_argument('--cache-dir',
+            dest='cache_dir',
+            default=DEFAULT_CACHE_DIR,
+            help='Directory in which to cache uFrame inventory responses (Default is $UFRAME_CACHE_DIR or ~/.uframe/cache).')
+    arg_parser.add_argument('-v', '--verbose',
+            action='store_true',
+            help='Write changes of the adaptive concurrency limits to STDERR.')
+    arg_parser.add_argument('--metrics',
+            dest='metrics',
+            help="Write request metrics on exit to this file: Prometheus text if it ends with .prom or .txt, JSON otherwise ('-' for STDERR).")
+    arg_parser.add_argument('--no-cache',
+            dest='no_cache',
+            action='store_true',
+            help='Do not use the inventory cache.')
 
     parsed_args = arg_parser.parse_args()
 
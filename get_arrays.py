@@ -3,7 +3,10 @@
 import argparse
 import sys
 import os
-from uframe import UFrame, get_arrays, get_platforms, get_platform_sensors
+from uframe import UFrame, get_arrays
+from uframe.crawler import InventoryCrawler
+from uframe.cache import InventoryCache, DEFAULT_CACHE_DIR
+from uframe.metrics import write_metrics_at_exit
 
 
 def main(args):
@@ -22,6 +25,15 @@ def main(args):
         else:
             uframe_base = UFrame()
 
+    if not args.no_cache:
+        uframe_base.cache = InventoryCache(args.cache_dir)
+
+    if args.metrics:
+        write_metrics_at_exit(uframe_base.metrics, args.metrics)
+
+    if args.verbose:
+        uframe_base.verbose = True
+
     arrays = get_arrays(uframe_base=uframe_base)
 
     if not arrays:
@@ -30,12 +42,11 @@ def main(args):
     
     results = []    
     if args.refdes:
-        for array in arrays:
-            subsites = get_platforms(array, uframe_base=uframe_base)
-            for subsite in subsites:
-                instruments = get_platform_sensors(array, subsite, uframe_base=uframe_base)
-                for instrument in instruments:
-                    results.append('{:s}-{:s}-{:s}'.format(array, subsite, instrument))
+        crawler = InventoryCrawler(uframe_base, workers=args.workers)
+        for instrument in crawler.crawl(arrays=arrays, metadata=False):
+            results.append(instrument['ref_des'])
+        for error in crawler.errors:
+            sys.stderr.write('{:s}: {:s}\n'.format(error['ref_des'], error['reason']))
     else:
         results = arrays
         
@@ -54,6 +65,25 @@ if __name__ == '__main__':
         dest='refdes',
         action='store_true',
         help='Create a list of all all fully qualified reference designators')
+    arg_parser.add_argument('-w', '--workers',
+        dest='workers',
+        type=int,
+        default=1,
+        help='Number of concurrent inventory requests used with --refdes (Default is 1).')
+    arg_parser.add_argument('--cache-dir',
+        dest='cache_dir',
+        default=DEFAULT_CACHE_DIR,
+        help='Directory in which to cache uFrame inventory responses (Default is $UFRAME_CACHE_DIR or ~/.uframe/cache).')
+    arg_parser.add_argument('-v', '--verbose',
+        action='store_true',
+        help='Write changes of the adaptive concurrency limits to STDERR.')
+    arg_parser.add_argument('--metrics',
+        dest='metrics',
+        help="Write request metrics on exit to this file: Prometheus text if it ends with .prom or .txt, JSON otherwise ('-' for STDERR).")
+    arg_parser.add_argument('--no-cache',
+        dest='no_cache',
+        action='store_true',
+        help='Do not use the inventory cache.')
     parsed_args = arg_parser.parse_args()
 
     main(parsed_args)
@@ -5,6 +5,9 @@ import sys
 import csv
 import json
 from uframe import UFrame, get_ref_des_streams
+from uframe.cache import InventoryCache, DEFAULT_CACHE_DIR
+from uframe.jsonio import available_backends
+from uframe.metrics import write_metrics_at_exit
 
 
 def main(args):
@@ -20,6 +23,13 @@ def main(args):
     else:
         uframe_base = UFrame()
 
+    if not args.no_cache:
+        uframe_base.cache = InventoryCache(args.cache_dir)
+    uframe_base.json_backend = args.json_backend
+
+    if args.metrics:
+        write_metrics_at_exit(uframe_base.metrics, args.metrics)
+
     streams = get_ref_des_streams(args.ref_des, uframe_base=uframe_base)
 
     if not streams:
@@ -48,6 +58,22 @@ if __name__ == '__main__':
             dest='file_format',
             default='csv',
             help='Specify the format in which to download the files (\'csv\' <Default> or \'json\').')
+    arg_parser.add_argument('--cache-dir',
+        dest='cache_dir',
+        default=DEFAULT_CACHE_DIR,
+        help='Directory in which to cache uFrame inventory responses (Default is $UFRAME_CACHE_DIR or ~/.uframe/cache).')
+    arg_parser.add_argument('--metrics',
+        dest='metrics',
+        help="Write request metrics on exit to this file: Prometheus text if it ends with .prom or .txt, JSON otherwise ('-' for STDERR).")
+    arg_parser.add_argument('--json-backend',
+        dest='json_backend',
+        default='json',
+        choices=['auto'] + available_backends(),
+        help="JSON decoder for uFrame responses: 'auto' selects the fastest installed decoder (Default is json, the standard library).")
+    arg_parser.add_argument('--no-cache',
+        dest='no_cache',
+        action='store_true',
+        help='Do not use the inventory cache.')
     parsed_args = arg_parser.parse_args()
 
     main(parsed_args)
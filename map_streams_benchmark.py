@@ -0,0 +1,140 @@
+#! /usr/bin/env python
+
+from __future__ import division
+import argparse
+import sys
+import time
+from map_uframe_datastreams import map_streams
+
+
+def synthetic_metadata(num_parameters, num_streams, methods=('telemetered', 'recovered_host', 'recovered_inst', 'streamed')):
+    """
+    Create a metadata response with num_parameters parameters spread evenly
+    over num_streams streams, each available for every method.
+    """
+    times = []
+    for s in range(num_streams):
+        for method in methods:
+            times.append({'stream' : 'stream_{:d}'.format(s),
+                'method' : method,
+                'sensor' : 'CE01ISSM-MFD35-02-PRESFA000',
+                'beginTime' : '2014-04-14T23:05:31.335Z',
+                'endTime' : '2015-04-15T23:05:31.335Z',
+                'count' : 1000})
+
+    parameters = []
+    for p in range(num_parameters):
+        parameters.append({'particleKey' : 'parameter_{:d}'.format(p),
+            'stream' : 'stream_{:d}'.format(p % num_streams),
+            'pdId' : 'PD{:d}'.format(p),
+            'units' : 'm',
+            'shape' : 'SCALAR',
+            'fillValue' : '-9999999',
+            'type' : 'FLOAT',
+            'unsigned' : False})
+
+    return {'times' : times, 'parameters' : parameters}
+
+
+def map_streams_nested(meta, url, method=None):
+    """
+    The original parameters x times nested loop implementation of map_streams,
+    used as the baseline.
+    """
+    stream_map = []
+    for parameter in meta['parameters']:
+        streams = []
+        for t in range(len(meta['times'])):
+            if method:
+                if meta['times'][t]['stream'] == parameter['stream'] and meta['times'][t]['method'].startswith(method):
+                    streams.append(meta['times'][t])
+            else:
+                if meta['times'][t]['stream'] == parameter['stream']:
+                    streams.append(meta['times'][t])
+        for stream in streams:
+            param_copy = parameter.copy()
+            param_copy['stream'] = stream
+            param_copy['metadata_url'] = url
+            stream_map.append(param_copy)
+    return stream_map
+
+
+def time_call(func, repeat, *args, **kwargs):
+    best = None
+    for i in range(repeat):
+        t0 = time.time()
+        func(*args, **kwargs)
+        elapsed = time.time() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main(args):
+    """
+    Benchmark map_streams against the original nested loop implementation for
+    synthetic metadata responses with an increasing number of parameters.  The
+    number of streams grows with the number of parameters (1 stream per
+    --params-per-stream parameters).
+
+    The time per parameter of map_streams should stay roughly constant as the
+    number of parameters grows, while that of the nested loop grows linearly.
+    """
+    url = 'http://localhost:12576/sensor/inv/CE01ISSM/MFD35/02-PRESFA000/metadata'
+
+    sys.stdout.write('{:>10s} {:>8s} {:>8s} {:>12s} {:>12s} {:>14s} {:>8s}\n'.format(
+        'parameters', 'times', 'rows', 'nested (s)', 'indexed (s)', 'indexed us/row', 'speedup'))
+
+    num_parameters = args.start
+    while num_parameters <= args.stop:
+        num_streams = max(1, num_parameters // args.params_per_stream)
+        meta = synthetic_metadata(num_parameters, num_streams)
+
+        rows = map_streams(meta, url, method=args.method)
+        if rows != map_streams_nested(meta, url, method=args.method):
+            sys.stderr.write('map_streams output differs from the nested loop output\n')
+            return 1
+
+        nested = time_call(map_streams_nested, args.repeat, meta, url, method=args.method)
+        indexed = time_call(map_streams, args.repeat, meta, url, method=args.method)
+
+        sys.stdout.write('{:10d} {:8d} {:8d} {:12.4f} {:12.4f} {:14.2f} {:8.1f}\n'.format(
+            num_parameters,
+            len(meta['times']),
+            len(rows),
+            nested,
+            indexed,
+            indexed / max(len(rows), 1) * 1e6,
+            nested / indexed if indexed else 0))
+
+        num_parameters *= 2
+
+    return 0
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument('--start',
+            type=int,
+            default=100,
+            help='Smallest number of parameters (Default is 100).')
+    arg_parser.add_argument('--stop',
+            type=int,
+            default=3200,
+            help='Largest number of parameters (Default is 3200).')
+    arg_parser.add_argument('--params-per-stream',
+            dest='params_per_stream',
+            type=int,
+            default=10,
+            help='Number of parameters per stream (Default is 10).')
+    arg_parser.add_argument('-m', '--method',
+            default=None,
+            help='Stream method prefix to filter on (i.e.: telemetered, recovered).')
+    arg_parser.add_argument('--repeat',
+            type=int,
+            default=3,
+            help='Number of timed runs per size; the fastest is reported (Default is 3).')
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
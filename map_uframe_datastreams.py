@@ -2,6 +2,12 @@
 
 from uframe import *
 from uframe.availability import get_parameter_stream
+from uframe.crawler import InventoryCrawler
+from uframe.records import StreamRecord, intern_stream_times
+from uframe import columnar
+from uframe.cache import InventoryCache, DEFAULT_CACHE_DIR
+from uframe.jsonio import available_backends
+from uframe.metrics import write_metrics_at_exit
 import sys
 import csv
 import json
@@ -20,169 +26,254 @@ def main(args):
     uframe = UFrame()
     if args.base_url:
         uframe = UFrame(base_url=args.base_url)
+
+    if not args.no_cache:
+        uframe.cache = InventoryCache(args.cache_dir)
+    uframe.json_backend = args.json_backend
+
+    if args.metrics:
+        write_metrics_at_exit(uframe.metrics, args.metrics)
+
+    if args.verbose:
+        uframe.verbose = True
+        
+    if args.file_format in ['npz', 'parquet']:
+        if not args.output:
+            sys.stderr.write('An output file (--output) is required for {:s} format\n'.format(args.file_format))
+            sys.stderr.flush()
+            return
+        if not columnar.HAVE_NUMPY:
+            sys.stderr.write('{:s} format requires numpy\n'.format(args.file_format))
+            sys.stderr.flush()
+            return
+        if args.file_format == 'parquet' and not columnar.HAVE_PYARROW:
+            sys.stderr.write('parquet format requires pyarrow\n')
+            sys.stderr.flush()
+            return
         
     if args.ref_des:
-        stream_map = map_parameters_by_reference_designator(args.ref_des, method=args.method, uframe=uframe)
+        stream_maps = [map_parameters_by_reference_designator(args.ref_des, method=args.method, uframe=uframe, records=True) or []]
     else:
-        stream_map = map_uframe_datastreams(args.array_id, subsite=args.subsite, method=args.method, uframe=uframe)
+        stream_maps = iter_stream_maps(args.array_id, subsite=args.subsite, method=args.method, uframe=uframe, workers=args.workers, records=True)
     
     if args.file_format == 'json':
-        sys.stdout.write(json.dumps(stream_map))
-        sys.stdout.flush()
-    else:   
-        stdout_writer = csv.writer(sys.stdout)
-    
-        column_map = {'parameter' : 'particleKey',
-            'method' : 'stream method',
-            'stream' : 'stream stream',
-            'calculated' : '',
-            'reference_designator' : 'stream sensor',
-            'pdId' : 'pdId',
-            'units' : 'units',
-            'beginTime' : 'stream beginTime',
-            'endTime' : 'stream endTime',
-            'num_records' : 'stream count',
-            'fillValue' : 'fillValue',
-            'type' : 'type',
-            'unsigned' : 'unsigned',
-            'metadata_url' : 'metadata_url'}
-            
-        if args.all:
-            
-            cols = ['reference_designator',
-                'stream',
-                'parameter',
-                'method',
-                'pdId',
-                'units',
-                'beginTime',
-                'endTime',
-                'num_records',
-                'fillValue',
-                'type',
-                'unsigned',
-                'metadata_url']
-        else:
-            cols = ['reference_designator',
-                'stream',
-                'parameter',
-                'method',
-                'calculated']
-                
-            if args.particles:
-                cols.append('num_records')
-            if args.urls:
-                cols.append('metadata_url')
-            
+        return write_json(stream_maps, sys.stdout)
+    elif args.file_format == 'jsonl':
+        return write_json_lines(stream_maps, sys.stdout)
+    elif args.file_format == 'npz':
+        return columnar.write_npz(stream_maps, args.output)
+    elif args.file_format == 'parquet':
+        return columnar.write_parquet(stream_maps, args.output)
+        
+    if args.all:
+        
+        cols = ['reference_designator',
+            'stream',
+            'parameter',
+            'method',
+            'pdId',
+            'units',
+            'beginTime',
+            'endTime',
+            'num_records',
+            'fillValue',
+            'type',
+            'unsigned',
+            'metadata_url']
+    else:
+        cols = ['reference_designator',
+            'stream',
+            'parameter',
+            'method',
+            'calculated']
             
-        stdout_writer.writerow(cols)
+        if args.particles:
+            cols.append('num_records')
+        if args.urls:
+            cols.append('metadata_url')
+        
+    return write_csv(stream_maps, cols, sys.stdout)
+    
+# Output column name -> stream map record key(s)
+_column_map = {'parameter' : 'particleKey',
+    'method' : 'stream method',
+    'stream' : 'stream stream',
+    'calculated' : '',
+    'reference_designator' : 'stream sensor',
+    'pdId' : 'pdId',
+    'units' : 'units',
+    'beginTime' : 'stream beginTime',
+    'endTime' : 'stream endTime',
+    'num_records' : 'stream count',
+    'fillValue' : 'fillValue',
+    'type' : 'type',
+    'unsigned' : 'unsigned',
+    'metadata_url' : 'metadata_url'}
+    
+def _column_accessor(col):
+    
+    if col == 'calculated':
+        return lambda stream: 1 if stream.get('shape') == 'FUNCTION' else 0
+        
+    tokens = _column_map[col].split(' ')
+    if len(tokens) == 1:
+        key = tokens[0]
+        return lambda stream: stream.get(key)
+        
+    (key, subkey) = tokens
+    return lambda stream: stream[key][subkey]
+    
+def _record_dict(stream):
+    
+    if isinstance(stream, StreamRecord):
+        return stream.to_dict()
+    return stream
+    
+def write_csv(stream_maps, cols, fid):
+    '''
+    Write the stream map records to fid as CSV, one batch at a time.
+    
+    Parameters:
+        stream_maps: iterable of stream maps (lists of dictionaries or
+            StreamRecords), as returned by iter_stream_maps.  fid is flushed after each.
+        cols: output column names.  Unknown column names are ignored.
+        fid: file-like object to write to
         
+    Returns:
+        count: number of records written
+    '''
+    
+    # Only valid columns are written
+    cols = [col for col in cols if col in _column_map]
+    accessors = [_column_accessor(col) for col in cols]
+    
+    csv_writer = csv.writer(fid)
+    csv_writer.writerow(cols)
+    fid.flush()
+    
+    count = 0
+    for stream_map in stream_maps:
         for stream in stream_map:
-            
-            row = []
-            for col in cols:
-                
-                if col not in column_map.keys():
-                    continue
-                    
-                tokens = column_map[col].split(' ')
-                if len(tokens) == 1:
-                    if col == 'calculated':
-                        if stream['shape'] == 'FUNCTION':
-                            row.append(1)
-                        else:
-                            row.append(0)
-                    else:
-                        row.append(stream[column_map[col]])
-                else:
-                    row.append(stream[tokens[0]][tokens[1]])
             try:    
-                stdout_writer.writerow(row)
+                csv_writer.writerow([accessor(stream) for accessor in accessors])
             except ValueError as e:
                 sys.stderr.write('{:s}\n'.format(e.message))
                 continue
+        count += len(stream_map)
+        fid.flush()
+        
+    return count
+    
+def write_json(stream_maps, fid):
+    '''
+    Write the stream map records to fid as a single JSON array, one batch at a
+    time.  The output is identical to json.dumps of the list of all records as
+    dictionaries.
+    
+    Returns:
+        count: number of records written
+    '''
+    
+    count = 0
+    fid.write('[')
+    for stream_map in stream_maps:
+        for stream in stream_map:
+            if count:
+                fid.write(', ')
+            fid.write(json.dumps(_record_dict(stream)))
+            count += 1
+        fid.flush()
+    fid.write(']')
+    fid.flush()
+    
+    return count
+    
+def write_json_lines(stream_maps, fid):
+    '''
+    Write the stream map records to fid as JSON Lines (one JSON object per line),
+    one batch at a time.
+    
+    Returns:
+        count: number of records written
+    '''
+    
+    count = 0
+    for stream_map in stream_maps:
+        for stream in stream_map:
+            fid.write(json.dumps(_record_dict(stream)))
+            fid.write('\n')
+        count += len(stream_map)
+        fid.flush()
         
-    return len(stream_map)
+    return count
     
-def map_uframe_datastreams(array_id=None, subsite=None, method=None, uframe=UFrame()):
+def map_uframe_datastreams(array_id=None, subsite=None, method=None, uframe=UFrame(), workers=1, records=False):
     """
     Download metadata records for all available parameters and associated streams 
     (telemetered/recovered) from the default UFrame instance as CSV (default) or 
     JSON.
 
+    The inventory is crawled using workers concurrent requests.  The stream map
+    is returned in inventory order regardless of the number of workers.  See
+    map_streams for records.
+
     The default uFrame instance is: http://uframe-test.ooi.rutgers.edu
     """
-    stream_map = []
+    return list(iter_uframe_datastreams(array_id, subsite=subsite, method=method, uframe=uframe, workers=workers, records=records))
+    
+def iter_uframe_datastreams(array_id=None, subsite=None, method=None, uframe=UFrame(), workers=1, records=False):
+    """
+    Generator version of map_uframe_datastreams, yielding each stream map record
+    as soon as its sensor's metadata has been fetched.
+    """
+    for stream_map in iter_stream_maps(array_id, subsite=subsite, method=method, uframe=uframe, workers=workers, records=records):
+        for stream in stream_map:
+            yield stream
+    
+def iter_stream_maps(array_id=None, subsite=None, method=None, uframe=UFrame(), workers=1, records=False):
+    """
+    Crawl the uFrame instance and yield the stream map (see map_streams) of each
+    sensor, in inventory order, as soon as its metadata has been fetched.  With
+    records, the StreamRecords of all of the stream maps share one table of
+    interned strings, which is released when the crawl completes.
+    """
     
     # Get the list of available array names
     arrays = get_arrays(uframe_base=uframe)
     if not arrays:
         sys.stderr.write('UFrame instance contains no arrays\n')
         sys.stderr.flush()
-        return stream_map
+        return
     
     if array_id:
         if array_id not in arrays:
             sys.stderr.write('Invalid array specified: {:s}\n'.format(array_id))
             sys.stderr.flush()
-            return stream_map
+            return
         else:
             arrays = [array_id]
             
-    for array_id in arrays:
-        
-        #sys.stdout.write('Fetching Stream: {:s}\n'.format(array_id))
+    crawler = InventoryCrawler(uframe, workers=workers)
+    num_errors = 0
+    interned = {} if records else None
+    
+    for sensor in crawler.iter_crawl(arrays=arrays, subsite=subsite):
         
-        # Get the list of available platforms for the current array_id
-        platforms = get_platforms(array_id, uframe_base=uframe)
+        for error in crawler.errors[num_errors:]:
+            sys.stderr.write('{:s}: {:s}\n'.format(error['ref_des'], error['reason']))
+        num_errors = len(crawler.errors)
+        sys.stderr.flush()
         
-        if not platforms:
-            sys.stderr.write('{:s}: Array contains no platforms\n'.format(array_id))
-            sys.stderr.flush()
+        if not sensor['metadata']:
             continue
             
-        for platform in platforms:
-            
-            if subsite and subsite != platform:
-                continue
-                
-            #sys.stdout.write('Fetching Platform: {:s}\n'.format(platform))
-            
-            # Get the list of sensors for this platform
-            sensors = get_platform_sensors(array_id, platform, uframe_base=uframe)
-            
-            if not sensors:
-                sys.stderr.write('{:s}-{:s}: Platform contains no sensors'.format(array_id, platform))
-                sys.stderr.flush()
-                continue
-                
-            for sensor in sensors:
-                
-                #sys.stdout.write('Fetching Sensor: {:s}\n'.format(sensor))
-                
-                # Get the metadata for this sensor
-                meta = get_sensor_metadata(array_id, platform, sensor, uframe_base=uframe)
-                
-                if not meta:
-                    sys.stderr.write('{:s}-{:s}-{:s}: Sensor contains no particleKeys'.format(array_id, platform, sensor))
-                    sys.stderr.flush()
-                    continue
-                    
-                # Create the metadata url
-                url = '{:s}/{:s}/{:s}/{:s}/metadata'.format(
-                    uframe.url,
-                    array_id,
-                    platform,
-                    sensor)
-                
-                streams = map_streams(meta, url, method=method)
-                
-                for stream in streams:
-                    stream_map.append(stream)
-    
-    return stream_map
+        yield map_streams(sensor['metadata'], sensor['metadata_url'], method=method, records=records, interned=interned)
+        
+    for error in crawler.errors[num_errors:]:
+        sys.stderr.write('{:s}: {:s}\n'.format(error['ref_des'], error['reason']))
+    sys.stderr.flush()
 
-def map_streams(meta, url, method=None):
+def map_streams(meta, url, method=None, records=False, interned=None):
     '''
     Return a stream map containing metadata for all streams and parameters 
     in the metadata (meta) array of dictionaries.
@@ -196,26 +287,30 @@ def map_streams(meta, url, method=None):
             records from above.
         method: Return only streams for the specified method (i.e.: telemetered,
             'recovered', etc.)
+        records: if True, return compact uframe.records.StreamRecords, which
+            support dictionary-style access, rather than dictionaries
+        interned: dictionary in which the repeated strings of the StreamRecords
+            are interned.  A new one is used if not specified.
             
     Returns:
-        stream_map: array of dictionaries containing information on all parameters
-            contained in the the meta argument.
+        stream_map: array of dictionaries (or StreamRecords) containing
+            information on all parameters contained in the the meta argument.
     '''
     
     stream_map = []
+    if records and interned is None:
+        interned = {}
+    
+    # Index the stream times by stream name once, rather than scanning all of
+    # meta['times'] for every parameter
+    stream_times = index_stream_times(meta['times'], method=method, interned=interned)
        
     for parameter in meta['parameters']:
         
-        streams = []
-        for t in range(len(meta['times'])):
-            if method:
-                if meta['times'][t]['stream'] == parameter['stream'] and meta['times'][t]['method'].startswith(method):
-                    streams.append(meta['times'][t])
-            else:
-                if meta['times'][t]['stream'] == parameter['stream']:
-                    streams.append(meta['times'][t])
-                    
-        for stream in streams:
+        for stream in stream_times.get(parameter['stream'], ()):
+            if records:
+                stream_map.append(StreamRecord(parameter, stream, url, interned))
+                continue
             param_copy = parameter.copy()
             param_copy['stream'] = stream 
             param_copy['metadata_url'] = url
@@ -223,7 +318,33 @@ def map_streams(meta, url, method=None):
             
     return stream_map
     
-def map_parameters_by_reference_designator(ref_des, method=None, uframe=UFrame()):
+def index_stream_times(times, method=None, interned=None):
+    '''
+    Index a metadata 'times' array by stream name.
+    
+    Parameters:
+        times: the 'times' array of a metadata response
+        method: only index entries whose method starts with method (i.e.:
+            telemetered, recovered, etc.)
+        interned: if specified, the repeated string values of the entries are
+            replaced in place with their copies interned in this dictionary
+            
+    Returns:
+        index: dictionary mapping each stream name to the list of its times
+            entries, in their original order.
+    '''
+    
+    index = {}
+    for t in times:
+        if method and not t['method'].startswith(method):
+            continue
+        if interned is not None:
+            intern_stream_times(t, interned)
+        index.setdefault(t['stream'], []).append(t)
+        
+    return index
+    
+def map_parameters_by_reference_designator(ref_des, method=None, uframe=UFrame(), records=False):
     '''
     Return a stream map containing metadata for all streams and parameters 
     for the specified reference designator.
@@ -233,10 +354,12 @@ def map_parameters_by_reference_designator(ref_des, method=None, uframe=UFrame()
             
             SITE-NODE-INSTRUMENT
         uframe: UFrame instance pointing the desired UFrame installation.
+        records: if True, return StreamRecords rather than dictionaries (see
+            map_streams)
             
     Returns:
-        stream_map: array of dictionaries containing information on all parameters
-            contained in the the meta response.
+        stream_map: array of dictionaries (or StreamRecords) containing
+            information on all parameters contained in the the meta response.
     '''
     
     # Split the reference designtor on dashes
@@ -262,7 +385,7 @@ def map_parameters_by_reference_designator(ref_des, method=None, uframe=UFrame()
         r_tokens[0],
         r_tokens[1],
         '-'.join([r_tokens[2], r_tokens[3]]))    
-    stream_map = map_streams(metadata, url, method=method)
+    stream_map = map_streams(metadata, url, method=method, records=records)
     
     return stream_map
     
@@ -334,11 +457,38 @@ if __name__ == '__main__':
     arg_parser.add_argument('-f', '--format',
         dest='file_format',
         default='csv',
-        help='Specify the response type format (\'csv\' <Default> or \'json\').')
+        help='Specify the response type format (\'csv\' <Default>, \'json\', \'jsonl\' for JSON Lines, or the columnar \'npz\' (requires numpy) or \'parquet\' (requires pyarrow) formats).')
+    arg_parser.add_argument('-o', '--output',
+        dest='output',
+        help='Output file for the npz and parquet formats.')
     arg_parser.add_argument('-u', '--url',
         help = 'Print the instrument metadata stream url.',
         dest = 'urls',
         action = 'store_true')
+    arg_parser.add_argument('-w', '--workers',
+        dest='workers',
+        type=int,
+        default=1,
+        help='Number of concurrent inventory requests (Default is 1).')
+    arg_parser.add_argument('--cache-dir',
+        dest='cache_dir',
+        default=DEFAULT_CACHE_DIR,
+        help='Directory in which to cache uFrame inventory responses (Default is $UFRAME_CACHE_DIR or ~/.uframe/cache).')
+    arg_parser.add_argument('-v', '--verbose',
+        action='store_true',
+        help='Write changes of the adaptive concurrency limits to STDERR.')
+    arg_parser.add_argument('--metrics',
+        dest='metrics',
+        help="Write request metrics on exit to this file: Prometheus text if it ends with .prom or .txt, JSON otherwise ('-' for STDERR).")
+    arg_parser.add_argument('--json-backend',
+        dest='json_backend',
+        default='json',
+        choices=['auto'] + available_backends(),
+        help="JSON decoder for uFrame responses: 'auto' selects the fastest installed decoder (Default is json, the standard library).")
+    arg_parser.add_argument('--no-cache',
+        dest='no_cache',
+        action='store_true',
+        help='Do not use the inventory cache.')
     
     parsed_args = arg_parser.parse_args()
 
@@ -4,12 +4,25 @@ import argparse
 import sys
 import os
 import csv
-from uframe import UFrame, get_arrays, get_platforms, get_platform_sensors, get_sensor_metadata
+from uframe import UFrame
+from uframe.cache import InventoryCache, DEFAULT_CACHE_DIR
+from uframe.jsonio import available_backends
+from uframe.streamindex import build_stream_index, load_stream_index, stream_index_path, STREAM_FIELDS, DEFAULT_MAX_AGE
+from uframe.metrics import write_metrics_at_exit
 
 
 def main(args):
     """
-    Retrieve the list of available OOI arrays on the uFrame instance.
+    Print the reference designators producing each of the target streams, or,
+    with --parameters, the streams containing each of the target parameters
+    (particleKey or pdId) and the reference designators producing them.
+
+    Targets are looked up in an inverted index of the inventory, built with a
+    single crawl of the uFrame instance and saved in the cache directory.  The
+    index is rebuilt when it is older than --max-age or if --rebuild is given.
+    An index built while some inventory requests failed is used for the current
+    query only, and is not saved.  With --no-cache, the index is neither read
+    from nor saved to the cache directory, unless --index is given.
 
     The default uFrame instance is: http://uframe-test.ooi.rutgers.edu.  
     
@@ -26,75 +39,116 @@ def main(args):
         else:
             uframe_base = UFrame()
 
-    #sys.stdout.write('{:s}\n'.format(uframe_base))
-    
-    arrays = get_arrays(uframe_base=uframe_base)
+    if not args.no_cache:
+        uframe_base.cache = InventoryCache(args.cache_dir)
+    uframe_base.json_backend = args.json_backend
 
-    reference_designators = []
-    
-    if not arrays:
-        sys.stderr.write('No arrays found for uFrame instance: {:s}\n'.format(uframe_base.url))
+    if args.metrics:
+        write_metrics_at_exit(uframe_base.metrics, args.metrics)
+
+    if args.verbose:
+        uframe_base.verbose = True
+
+    index_path = args.index_file
+    if not index_path and not args.no_cache:
+        index_path = stream_index_path(args.cache_dir, uframe_base.url)
+
+    index = None
+    if index_path and not args.rebuild:
+        index = load_stream_index(index_path, json_backend=args.json_backend)
+        if index and (index.uframe_url != uframe_base.url or index.age > args.max_age or not index.complete):
+            index = None
+
+    if not index:
+        sys.stderr.write('Building stream index: {:s}\n'.format(uframe_base.url))
         sys.stderr.flush()
-        return
-    
-    for array in arrays:
+        (index, errors) = build_stream_index(uframe_base, workers=args.workers)
+        for error in errors:
+            sys.stderr.write('{:s}: {:s}\n'.format(error['ref_des'], error['reason']))
+        sys.stderr.flush()
+        if not index:
+            sys.stderr.write('No streams found for uFrame instance: {:s}\n'.format(uframe_base.url))
+            sys.stderr.flush()
+            return 1
+        if not index.complete:
+            # Do not persist false negatives for the sensors that failed
+            sys.stderr.write('Stream index is incomplete and was not saved: results may be missing reference designators\n')
+            sys.stderr.flush()
+        elif index_path:
+            if not os.path.isdir(os.path.dirname(os.path.abspath(index_path))):
+                os.makedirs(os.path.dirname(os.path.abspath(index_path)))
+            index.save(index_path)
 
-        platforms = get_platforms(array, uframe_base=uframe_base)
-        
-        if not platforms:
-            sys.stderr.write('{:s}: No platforms found for array\n'.format(ref_des))
+    csv_writer = csv.writer(sys.stdout)
+    if args.parameters:
+        csv_writer.writerow(('parameter', 'stream') + STREAM_FIELDS)
+    else:
+        csv_writer.writerow(('stream',) + STREAM_FIELDS)
+
+    status = 0
+    for target in args.targets:
+        if args.parameters:
+            rows = [[target, stream] + entry for stream in index.parameter_streams(target) for entry in index.stream_entries(stream)]
+        else:
+            rows = [[target] + entry for entry in index.stream_entries(target)]
+
+        if not rows:
+            sys.stderr.write('No reference designators found for {:s}: {:s}\n'.format('parameter' if args.parameters else 'stream', target))
             sys.stderr.flush()
+            status = 1
             continue
-            
-        for platform in platforms:
-            
-            ref_des = '{:s}-{:s}'.format(array, platform)
-            
-            sensors = get_platform_sensors(array, platform, uframe_base=uframe_base)
-            
-            if not sensors:
-                sys.stderr.write('{:s}: No instruments found\n'.format(ref_des))
-                sys.stderr.flush()
-                continue
-                
-            for sensor in sensors:
-                
-                ref_des = '{:s}-{:s}-{:s}'.format(array, platform, sensor)
-                
-                meta = get_sensor_metadata(array, platform, sensor, uframe_base=uframe_base)
-                if not meta:
-                    sys.stderr.write('{:s}: No metadata found\n'.format(ref_des))
-                    sys.stderr.flush()
-                    continue
-                    
-                for t in meta['times']:
-                    if t['stream'] != args.target_stream:
-                        continue
-                    
-                    reference_designators.append(t)
-                    
-    if not reference_designators:
-        sys.stderr.write('No reference designators found for stream: {:s}\n'.format(args.target_stream))
-        sys.stderr.flush()
-        return 1
-        
-    csv_writer = csv.writer(sys.stdout)
-    cols = reference_designators[0].keys()
-    csv_writer.writerow(cols)
-    for r in reference_designators:
-        v = [r[k] for k in cols]
-        csv_writer.writerow(v)
+
+        csv_writer.writerows(rows)
         
-    return 0
+    return status
 
 if __name__ == '__main__':
 
     arg_parser = argparse.ArgumentParser(description=main.__doc__)
-    arg_parser.add_argument('target_stream',
-        help='Target stream name')
+    arg_parser.add_argument('targets',
+        nargs='+',
+        help='Target stream names, or parameter names/pdIds with --parameters')
+    arg_parser.add_argument('-p', '--parameters',
+        action='store_true',
+        help='Treat the targets as parameter particleKeys or pdIds.')
     arg_parser.add_argument('-b', '--baseurl',
         dest='base_url',
         help='Specify an alternate uFrame server URL. Must start with \'http://\'.')
+    arg_parser.add_argument('-w', '--workers',
+        dest='workers',
+        type=int,
+        default=1,
+        help='Number of concurrent inventory requests used to build the index (Default is 1).')
+    arg_parser.add_argument('--index',
+        dest='index_file',
+        help='Stream index file (Default is a file in the cache directory named for the uFrame instance).')
+    arg_parser.add_argument('--max-age',
+        dest='max_age',
+        type=float,
+        default=DEFAULT_MAX_AGE,
+        help='Rebuild the stream index when it is older than this many seconds (Default is {:d}).'.format(DEFAULT_MAX_AGE))
+    arg_parser.add_argument('--rebuild',
+        action='store_true',
+        help='Rebuild the stream index.')
+    arg_parser.add_argument('--cache-dir',
+        dest='cache_dir',
+        default=DEFAULT_CACHE_DIR,
+        help='Directory in which to cache uFrame inventory responses (Default is $UFRAME_CACHE_DIR or ~/.uframe/cache).')
+    arg_parser.add_argument('-v', '--verbose',
+        action='store_true',
+        help='Write changes of the adaptive concurrency limits to STDERR.')
+    arg_parser.add_argument('--metrics',
+        dest='metrics',
+        help="Write request metrics on exit to this file: Prometheus text if it ends with .prom or .txt, JSON otherwise ('-' for STDERR).")
+    arg_parser.add_argument('--json-backend',
+        dest='json_backend',
+        default='json',
+        choices=['auto'] + available_backends(),
+        help="JSON decoder for uFrame responses: 'auto' selects the fastest installed decoder (Default is json, the standard library).")
+    arg_parser.add_argument('--no-cache',
+        dest='no_cache',
+        action='store_true',
+        help='Do not use the inventory cache or the cached stream index.')
     parsed_args = arg_parser.parse_args()
 
     sys.exit(main(parsed_args))
@@ -0,0 +1,53 @@
+"""
+Tests for uframe.async_client.  Run from the repository root with:
+
+    python -m unittest discover -s tests
+"""
+
+import time
+import threading
+import unittest
+import uframe.async_client as async_client
+from uframe import UFrame
+
+DOWNLOAD_SECONDS = 0.5
+
+
+class AsyncUFrameTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = (async_client.fetch_uframe_time_bound_stream, async_client.get_sensor_metadata)
+        self._release = threading.Event()
+
+        def slow_download(**kwargs):
+            self._release.wait(DOWNLOAD_SECONDS)
+            return kwargs['stream']
+
+        def metadata(**kwargs):
+            return {'sensor' : kwargs['sensor']}
+
+        async_client.fetch_uframe_time_bound_stream = slow_download
+        async_client.get_sensor_metadata = metadata
+
+    def tearDown(self):
+        self._release.set()
+        (async_client.fetch_uframe_time_bound_stream, async_client.get_sensor_metadata) = self._saved
+
+    def test_queued_downloads_do_not_delay_metadata(self):
+        client = async_client.AsyncUFrame(uframe_base=UFrame(), max_requests=2, max_downloads=2)
+        downloads = [client.fetch_uframe_time_bound_stream('CE01ISSM', 'MFD35', '04-ADCPTM000', 'telemetered',
+            'stream_{:d}'.format(i), '2016-01-01T00:00:00.000Z', '2016-01-02T00:00:00.000Z') for i in range(40)]
+
+        t0 = time.time()
+        result = client.get_sensor_metadata('CE01ISSM', 'MFD35', '04-ADCPTM000')
+        self.assertEqual(result.get(5), {'sensor' : '04-ADCPTM000'})
+        self.assertLess(time.time() - t0, DOWNLOAD_SECONDS / 2)
+        self.assertFalse(downloads[-1].ready())
+
+        self._release.set()
+        self.assertEqual(client.gather(downloads, 5), ['stream_{:d}'.format(i) for i in range(40)])
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
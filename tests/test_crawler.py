@@ -0,0 +1,64 @@
+"""
+Tests for uframe.crawler.
+"""
+
+import random
+import time
+import unittest
+import uframe.crawler as crawler
+from uframe import UFrame
+
+PLATFORMS = ['MFD35', 'MFD37', 'SBD17']
+SENSORS = ['01-CTDBPC000', '02-ADCPTM000', '04-DOSTAD000']
+
+
+class InventoryCrawlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = (crawler.get_platforms, crawler.get_platform_sensors, crawler.get_sensor_metadata)
+        self.requests = []
+        rnd = random.Random(0)
+
+        def request(level, *branch):
+            # Complete the requests out of order
+            time.sleep(rnd.random() * 0.005)
+            self.requests.append((level,) + branch)
+
+        def platforms(array, **kwargs):
+            request('platforms', array)
+            return PLATFORMS
+
+        def sensors(array, platform, **kwargs):
+            request('sensors', array, platform)
+            return SENSORS
+
+        def metadata(array, platform, sensor, **kwargs):
+            request('metadata', array, platform, sensor)
+            return {'times' : [], 'parameters' : [], 'sensor' : sensor}
+
+        crawler.get_platforms = platforms
+        crawler.get_platform_sensors = sensors
+        crawler.get_sensor_metadata = metadata
+
+    def tearDown(self):
+        (crawler.get_platforms, crawler.get_platform_sensors, crawler.get_sensor_metadata) = self._saved
+
+    def test_records_in_inventory_order(self):
+        expected = ['{:s}-{:s}-{:s}'.format(a, p, s) for a in ('CE01ISSM', 'CE02SHSM') for p in PLATFORMS for s in SENSORS]
+        for workers in (1, 4):
+            c = crawler.InventoryCrawler(UFrame(), workers=workers)
+            records = c.crawl(arrays=['CE01ISSM', 'CE02SHSM'])
+            self.assertEqual([r['ref_des'] for r in records], expected)
+            self.assertEqual([r['metadata']['sensor'] for r in records], [r['sensor'] for r in records])
+            self.assertEqual(c.errors, [])
+
+    def test_first_record_before_the_crawl_completes(self):
+        records = crawler.InventoryCrawler(UFrame(), workers=1).iter_crawl(arrays=['CE01ISSM', 'CE02SHSM'])
+        self.assertEqual(next(records)['ref_des'], 'CE01ISSM-MFD35-01-CTDBPC000')
+        self.assertEqual(self.requests, [('platforms', 'CE01ISSM'), ('sensors', 'CE01ISSM', 'MFD35'),
+            ('metadata', 'CE01ISSM', 'MFD35', '01-CTDBPC000')])
+        records.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Tests for the release of connections, limiter slots and worker threads by
+failed data downloads.
+"""
+
+import shutil
+import tempfile
+import threading
+import unittest
+from requests.packages.urllib3.exceptions import ProtocolError
+import uframe
+from uframe import UFrame
+
+
+class StalledRaw(object):
+    """
+    Raw response body that is interrupted after the first chunk.
+    """
+
+    def __init__(self):
+        self._reads = 0
+
+    def readinto(self, buf):
+        self._reads += 1
+        if self._reads > 1:
+            raise ProtocolError('Connection broken: IncompleteRead')
+        buf[:4] = b'CDF\x01'
+        return 4
+
+
+class StalledResponse(object):
+
+    status_code = 200
+    reason = 'OK'
+
+    def __init__(self):
+        self.headers = {'content-type' : 'application/x-netcdf'}
+        self.raw = StalledRaw()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class StalledUFrame(UFrame):
+    """
+    UFrame whose responses are all interrupted partway through the body.
+    """
+
+    def __init__(self, **kwargs):
+        UFrame.__init__(self, base_url='http://localhost', retries=0, **kwargs)
+        self.responses = []
+
+    def get(self, url, **kwargs):
+        self.responses.append(StalledResponse())
+        return self.responses[-1]
+
+
+class InterruptedDownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dest_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dest_dir)
+
+    def test_interrupted_download_closes_response(self):
+        uframe_base = StalledUFrame(pool_maxsize=1, max_downloads=1)
+        for i in range(3):
+            fetched_url = {'code' : -1, 'reason' : None, 'file' : None, 'bytes' : 0, 'ttfb' : None, 'resumed' : False}
+            file_name = 'stream_{:d}.nc'.format(i)
+            status = uframe._download_stream_file(uframe_base, 'http://localhost/{:s}'.format(file_name), 'stream',
+                self.dest_dir, file_name, file_name + '.zip', fetched_url, None, 1024, False)
+            self.assertEqual(status, uframe.STATUS_ERROR)
+            self.assertEqual(fetched_url['code'], 500)
+        self.assertEqual([r.closed for r in uframe_base.responses], [True] * 3)
+        self.assertEqual(uframe_base.data_limiter.in_flight, 0)
+
+
+class DiscoveryFailureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dest_dir = tempfile.mkdtemp()
+        self._saved = (uframe.get_arrays, uframe.get_platforms, uframe.get_platform_sensors)
+
+        def platform_sensors(*args, **kwargs):
+            raise RuntimeError('discovery failed')
+
+        uframe.get_arrays = lambda array_id=None, **kwargs: [array_id]
+        uframe.get_platforms = lambda array_id, **kwargs: ['MFD35']
+        uframe.get_platform_sensors = platform_sensors
+
+    def tearDown(self):
+        (uframe.get_arrays, uframe.get_platforms, uframe.get_platform_sensors) = self._saved
+        shutil.rmtree(self.dest_dir)
+
+    def test_failed_discovery_stops_download_workers(self):
+        threads = threading.active_count()
+        self.assertRaises(RuntimeError, uframe.get_uframe_array, 'CE01ISSM', out_dir=self.dest_dir,
+            uframe_base=UFrame(base_url='http://localhost'), parallel=4)
+        self.assertEqual(threading.active_count(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
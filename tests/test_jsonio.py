@@ -0,0 +1,69 @@
+"""
+Tests for uframe.jsonio and the partial decoding of cached metadata responses.
+"""
+
+import json
+import shutil
+import tempfile
+import unittest
+from uframe import UFrame, get_ref_des_streams
+from uframe.cache import InventoryCache
+from uframe.jsonio import JSONBackend
+
+METADATA = {'parameters' : [{'particleKey' : 'pressure', 'stream' : 'ctd_[x]', 'unit' : 'dbar {"]'},
+        {'particleKey' : 'temp', 'stream' : 'ctd_{y}', 'fillValue' : -9999.5, 'flags' : [True, None, []]}],
+    'times' : [{'stream' : 'ctd_[x]', 'sensor' : 'CE01ISSM-MFD35-04-ADCPTM000', 'method' : 'telemetered',
+        'beginTime' : '2016-01-01T00:00:00.000Z', 'endTime' : '2016-02-01T00:00:00.000Z', 'count' : 10}],
+    'empty' : {}}
+
+
+class LoadsMembersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = JSONBackend()
+
+    def test_named_members_match_full_decode(self):
+        for body in (json.dumps(METADATA), json.dumps(METADATA, indent=2)):
+            self.assertEqual(self.backend.loads_members(body, ('times',)), {'times' : METADATA['times']})
+            self.assertEqual(self.backend.loads_members(body, ('times', 'parameters', 'empty')), METADATA)
+
+    def test_missing_members_are_omitted(self):
+        self.assertEqual(self.backend.loads_members('{"a" : 1, "b" : "x\\"}"}', ('times',)), {})
+        self.assertEqual(self.backend.loads_members(' { } ', ('times',)), {})
+
+    def test_invalid_json_raises_value_error(self):
+        for body in ('[1, 2]', '{"parameters" : [1, 2', '{"parameters" : [] "times" : []}', '{"times" : [1, }'):
+            self.assertRaises(ValueError, self.backend.loads_members, body, ('times',))
+
+    def test_auto_selects_an_installed_backend(self):
+        self.assertNotEqual(JSONBackend('auto').name, 'auto')
+
+
+class CachedMetadataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_streams_from_cached_body_and_decoded_entries(self):
+        uframe_base = UFrame(base_url='http://localhost', metadata_cache_size=0)
+        uframe_base.cache = InventoryCache(self.cache_dir)
+        url = uframe_base.url + '/CE01ISSM/MFD35/04-ADCPTM000/metadata'
+        expected = [['CE01ISSM-MFD35-04-ADCPTM000', 'ctd_[x]']]
+
+        uframe_base.cache.put(url, json.dumps(METADATA))
+        self.assertEqual(get_ref_des_streams('CE01ISSM-MFD35-04-ADCPTM000', uframe_base=uframe_base), expected)
+
+        # Entries written by earlier versions hold the decoded response
+        entry = uframe_base.cache.get(url)
+        del entry['body']
+        entry['content'] = METADATA
+        uframe_base.cache.touch(entry)
+        self.assertEqual(get_ref_des_streams('CE01ISSM-MFD35-04-ADCPTM000', uframe_base=uframe_base), expected)
+        self.assertEqual(uframe_base.metrics.to_dict()['endpoints']['metadata']['requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for uframe.limiter and the release of limiter slots by failed requests.
+"""
+
+import unittest
+import requests
+from uframe import UFrame, get_arrays, get_sensor_metadata
+from uframe.limiter import AdaptiveLimiter
+
+
+class FailingUFrame(UFrame):
+    """
+    UFrame whose requests all raise exception.
+    """
+
+    def __init__(self, exception, **kwargs):
+        UFrame.__init__(self, base_url='http://localhost', retries=0, metadata_cache_size=0, **kwargs)
+        self._exception = exception
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        raise self._exception
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def test_overload_cuts_limit_once_per_window(self):
+        limiter = AdaptiveLimiter(8)
+        tickets = [limiter.acquire() for i in range(4)]
+        for ticket in tickets:
+            limiter.release(ticket, 'metadata', overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_success_grows_limit(self):
+        limiter = AdaptiveLimiter(8, initial=2)
+        for i in range(4):
+            limiter.release(limiter.acquire(), 'metadata', 0.01)
+        self.assertEqual(limiter.limit, 3)
+
+
+class FailedRequestReleaseTest(unittest.TestCase):
+
+    def assert_released(self, exception):
+        uframe_base = FailingUFrame(exception, pool_maxsize=2)
+        # More failures than slots would deadlock if any slot leaked
+        for i in range(4):
+            errors = []
+            self.assertFalse(get_arrays(uframe_base=uframe_base, errors=errors))
+            self.assertEqual(len(errors), 1)
+            errors = []
+            self.assertFalse(get_sensor_metadata('CE01ISSM', 'MFD35', '04-ADCPTM000', uframe_base=uframe_base, errors=errors))
+            self.assertEqual(len(errors), 1)
+        self.assertEqual(uframe_base.requests, 8)
+        self.assertEqual(uframe_base.limiter.in_flight, 0)
+
+    def test_chunked_encoding_error_releases_slot(self):
+        self.assert_released(requests.exceptions.ChunkedEncodingError('Connection broken: IncompleteRead'))
+
+    def test_content_decoding_error_releases_slot(self):
+        self.assert_released(requests.exceptions.ContentDecodingError('Invalid gzip data'))
+
+    def test_too_many_redirects_releases_slot(self):
+        self.assert_released(requests.TooManyRedirects('Exceeded 30 redirects.'))
+
+    def test_timeout_releases_slot(self):
+        self.assert_released(requests.Timeout('Read timed out.'))
+
+    def test_other_exception_releases_slot(self):
+        uframe_base = FailingUFrame(KeyError('unexpected'))
+        self.assertRaises(KeyError, get_sensor_metadata, 'CE01ISSM', 'MFD35', '04-ADCPTM000', uframe_base=uframe_base)
+        self.assertEqual(uframe_base.limiter.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
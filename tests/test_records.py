@@ -0,0 +1,58 @@
+"""
+Tests for uframe.records and the stream maps built from them.
+"""
+
+import json
+import unittest
+from uframe.records import StreamRecord, intern_string
+
+# map_uframe_datastreams.py is a script at the repository root
+from map_uframe_datastreams import map_streams
+
+METADATA_URL = 'http://localhost:12576/sensor/inv/CE01ISSM/MFD35/02-PRESFA000/metadata'
+
+
+def metadata():
+    return {'times' : [{'stream' : u'presf_abc_dcl_tide_measurement',
+            'method' : u'telemetered',
+            'sensor' : u'CE01ISSM-MFD35-02-PRESFA000',
+            'beginTime' : u'2014-04-14T23:05:31.335Z',
+            'endTime' : u'2015-04-15T23:05:31.335Z',
+            'count' : 1000}],
+        'parameters' : [{'particleKey' : u'abs_seafloor_pressure',
+            'stream' : u'presf_abc_dcl_tide_measurement',
+            'pdId' : u'PD2596',
+            'units' : u'dbar',
+            'shape' : u'SCALAR',
+            'fillValue' : u'-9999999',
+            'type' : u'FLOAT',
+            'unsigned' : False}]}
+
+
+class StreamRecordTest(unittest.TestCase):
+
+    def test_map_streams_returns_dictionaries_by_default(self):
+        stream_map = map_streams(metadata(), METADATA_URL)
+        self.assertTrue(all(isinstance(row, dict) for row in stream_map))
+        self.assertEqual(stream_map[0]['metadata_url'], METADATA_URL)
+        json.dumps(stream_map)
+
+    def test_records_match_dictionaries(self):
+        rows = map_streams(metadata(), METADATA_URL)
+        records = map_streams(metadata(), METADATA_URL, records=True)
+        self.assertTrue(all(isinstance(record, StreamRecord) for record in records))
+        self.assertEqual([record.to_dict() for record in records], rows)
+        self.assertEqual(records[0]['stream']['method'], 'telemetered')
+
+    def test_strings_are_interned_in_the_given_table(self):
+        table = {}
+        first = StreamRecord(metadata()['parameters'][0], {}, METADATA_URL, table)
+        second = StreamRecord(metadata()['parameters'][0], {}, METADATA_URL, table)
+        self.assertIs(first.units, second.units)
+        self.assertIs(intern_string(u'dbar', table), first.units)
+        self.assertIn(u'dbar', table)
+        self.assertEqual(intern_string(5, table), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
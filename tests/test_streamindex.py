@@ -0,0 +1,36 @@
+"""
+Tests for uframe.streamindex.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from uframe.streamindex import StreamIndex, load_stream_index
+
+
+class StreamIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_save_and_load_keep_completeness(self):
+        path = os.path.join(self._dir, 'streams.index')
+        for complete in (True, False):
+            index = StreamIndex(uframe_url='http://localhost:12576/sensor/inv', complete=complete)
+            index.add_sensor('CE01ISSM-MFD35-04-ADCPTM000', {'times' : [{'stream' : 'adcp_velocity_earth',
+                'method' : 'telemetered', 'beginTime' : '2016-01-01T00:00:00.000Z',
+                'endTime' : '2016-02-01T00:00:00.000Z', 'count' : 10}]})
+            self.assertTrue(index.save(path))
+
+            loaded = load_stream_index(path)
+            self.assertEqual(loaded.complete, complete)
+            self.assertEqual(loaded.stream_entries('adcp_velocity_earth'), [['CE01ISSM-MFD35-04-ADCPTM000',
+                'telemetered', '2016-01-01T00:00:00.000Z', '2016-02-01T00:00:00.000Z', 10]])
+
+
+if __name__ == '__main__':
+    unittest.main()
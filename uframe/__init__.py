@@ -3,14 +3,26 @@ Module for querying uFrame instances and downloading responses, primarily as Net
 """
 
 import requests
+from requests.packages.urllib3.exceptions import ReadTimeoutError, ProtocolError
 import sys
 import os
 import datetime
-from dateutil import parser
-from dateutil.relativedelta import relativedelta as tdelta
+import threading
+from collections import OrderedDict
+import json
+import time
+from multiprocessing.pool import ThreadPool
+from uframe.cache import MetadataCache, DEFAULT_METADATA_CACHE_SIZE
+from uframe.jsonio import JSONBackend
+from uframe.metrics import RequestMetrics, STATUS_ERROR
+from uframe.limiter import AdaptiveLimiter, is_overloaded, backoff_delay
+from uframe.timeutil import parse_iso8601, next_timestamp, file_stamp, time_windows
 
 
 HTTP_STATUS_OK = 200
+HTTP_STATUS_PARTIAL_CONTENT = 206
+HTTP_STATUS_NOT_MODIFIED = 304
+HTTP_STATUS_RANGE_NOT_SATISFIABLE = 416
 
 _valid_relativedeltatypes = ('years',
     'months',
@@ -22,14 +34,97 @@ _valid_relativedeltatypes = ('years',
 
 __filename_extension = { 'netcdf':'nc', 'json':'json', 'zip':'zip' }
 
+# Default number of bytes read from a download response and written at a time
+DEFAULT_CHUNK_SIZE = 1048576
+
+# Default number of times a request is retried after a timeout or a 5xx response
+DEFAULT_RETRIES = 3
+
+# Number of bytes received between updates of a partial download's journal
+_journal_interval = 4 * 1048576
+
+# Download destination directories known to exist
+_dest_dirs = set()
+_dest_dirs_lock = threading.Lock()
+
 
 class UFrame(object):
+    """
+    uFrame instance location and the HTTP connection pool used to talk to it.
+
+    All requests made through the instance share a single keep-alive connection
+    pool.  Each thread gets its own requests.Session, but every session is
+    mounted on the same HTTPAdapter, so connections are reused across threads
+    and the number of open connections to a host never exceeds pool_maxsize +
+    max_downloads.
 
-    def __init__(self, base_url='http://uframe-test.ooi.rutgers.edu', port=12576, timeout=10):
+    Data downloads hold a connection for the whole transfer, so they have their
+    own connections and adaptive concurrency limit (data_limiter), separate from
+    those of the inventory and metadata requests (limiter).  Long downloads
+    therefore cannot take the connections inventory discovery needs.
+
+    Args:
+        base_url: uFrame server url, including the scheme
+        port: uFrame web services port
+        timeout: request timeout, in seconds
+        pool_connections: number of distinct hosts to keep connection pools for
+        pool_maxsize: maximum number of connections kept open to a single host
+            for inventory and metadata requests
+        pool_block: if True, requests block when all pooled connections to a
+            host are in use rather than opening additional, unpooled
+            connections.  requests does not time out waiting for a pooled
+            connection, so the default is False: the limiters already bound
+            the number of requests in flight.
+        keep_alive: set to False to close each connection after its response
+        cache: optional uframe.cache.InventoryCache used for /sensor/inv
+            inventory and metadata responses
+        metadata_cache_size: maximum number of sensor metadata records held in
+            the in-memory metadata cache.  Set to 0 to disable it.
+        json_backend: name of the JSON decoder used for responses ('ujson',
+            'simplejson', 'json' or 'auto', the fastest installed decoder).
+            Defaults to the standard library json.
+        retries: number of times a request that timed out or received a 5xx
+            response is retried, after a jittered exponential backoff
+        limiter: uframe.limiter.AdaptiveLimiter shared by all inventory and
+            metadata requests made through this instance.  Defaults to an
+            adaptive limit of at most pool_maxsize requests in flight.
+        max_downloads: maximum number of concurrent data downloads, for which
+            max_downloads additional connections are pooled.  Defaults to
+            pool_maxsize.
+        data_limiter: uframe.limiter.AdaptiveLimiter shared by all data
+            downloads.  Defaults to an adaptive limit of at most max_downloads
+            downloads in flight.
+        verbose: if True, changes of the adaptive concurrency limits are
+            written to STDERR
+    """
+
+    def __init__(self, base_url='http://uframe-test.ooi.rutgers.edu', port=12576, timeout=10,
+                 pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True,
+                 cache=None, metadata_cache_size=DEFAULT_METADATA_CACHE_SIZE, json_backend=None,
+                 retries=DEFAULT_RETRIES, limiter=None, max_downloads=None, data_limiter=None,
+                 verbose=False):
         self._base_url = base_url
         self._port = port
         self._timeout = timeout
         self._url = '{:s}:{:d}/sensor/inv'.format(self.base_url, self.port)
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._max_downloads = max_downloads or pool_maxsize
+        self._pool_block = pool_block
+        self._keep_alive = keep_alive
+        self._adapter = None
+        self._adapter_lock = threading.Lock()
+        self._local = threading.local()
+        self._cache = cache
+        self._metadata_cache = MetadataCache(metadata_cache_size) if metadata_cache_size else None
+        self._json_backend = JSONBackend(json_backend)
+        self._metrics = RequestMetrics()
+        self._retries = retries
+        self._limiter = limiter or AdaptiveLimiter(pool_maxsize, metrics=self._metrics)
+        self._data_limiter = data_limiter or AdaptiveLimiter(self._max_downloads, metrics=self._metrics, name='data')
+        self._verbose = False
+        if verbose:
+            self.verbose = verbose
 
     @property
     def base_url(self):
@@ -38,6 +133,8 @@ class UFrame(object):
     def base_url(self, url):
         self._base_url = url
         self._url = '{:s}:{:d}/sensor/inv'.format(self.base_url, self.port)
+        if self._metadata_cache is not None:
+            self._metadata_cache.clear()
 
     @property
     def port(self):
@@ -46,6 +143,8 @@ class UFrame(object):
     def port(self, port):
         self._port = port
         self._url = '{:s}:{:d}/sensor/inv'.format(self.base_url, self.port)
+        if self._metadata_cache is not None:
+            self._metadata_cache.clear()
 
     @property
     def timeout(self):
@@ -58,24 +157,274 @@ class UFrame(object):
     def url(self):
         return self._url
 
+    @property
+    def cache(self):
+        return self._cache
+    @cache.setter
+    def cache(self, cache):
+        self._cache = cache
+
+    @property
+    def metadata_cache(self):
+        """
+        In-memory uframe.cache.MetadataCache of sensor metadata records, or None.
+        """
+        return self._metadata_cache
+
+    @property
+    def json_backend(self):
+        """
+        The uframe.jsonio.JSONBackend used to decode responses.  May be set to
+        a backend name.
+        """
+        return self._json_backend
+    @json_backend.setter
+    def json_backend(self, backend):
+        if not isinstance(backend, JSONBackend):
+            backend = JSONBackend(backend)
+        self._json_backend = backend
+
+    @property
+    def metrics(self):
+        """
+        uframe.metrics.RequestMetrics of the requests made through this instance.
+        """
+        return self._metrics
+
+    @property
+    def retries(self):
+        return self._retries
+    @retries.setter
+    def retries(self, retries):
+        self._retries = retries
+
+    @property
+    def limiter(self):
+        """
+        uframe.limiter.AdaptiveLimiter bounding the number of inventory and
+        metadata requests in flight.
+        """
+        return self._limiter
+
+    @property
+    def verbose(self):
+        """
+        If True, changes of the adaptive concurrency limits are written to STDERR.
+        """
+        return self._verbose
+    @verbose.setter
+    def verbose(self, verbose):
+        self._verbose = verbose
+        for limiter in (self._limiter, self._data_limiter):
+            limiter.stream = sys.stderr if verbose else None
+
+    @property
+    def data_limiter(self):
+        """
+        uframe.limiter.AdaptiveLimiter bounding the number of data downloads in
+        flight.
+        """
+        return self._data_limiter
+    @data_limiter.setter
+    def data_limiter(self, limiter):
+        self._data_limiter = limiter
+
+    @property
+    def pool_maxsize(self):
+        return self._pool_maxsize
+
+    @property
+    def max_downloads(self):
+        return self._max_downloads
+
+    @property
+    def keep_alive(self):
+        return self._keep_alive
+
+    @property
+    def adapter(self):
+        """
+        The HTTPAdapter (connection pool) shared by all sessions of this instance.
+        """
+        if self._adapter is None:
+            with self._adapter_lock:
+                if self._adapter is None:
+                    self._adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=self._pool_connections,
+                        pool_maxsize=self._pool_maxsize + self._max_downloads,
+                        pool_block=self._pool_block)
+        return self._adapter
+
+    @property
+    def session(self):
+        """
+        requests.Session for the calling thread, mounted on the shared adapter.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            if not self._keep_alive:
+                session.headers['Connection'] = 'close'
+            self._local.session = session
+        return session
+
+    def get(self, url, **kwargs):
+        """
+        Issue a GET request for url over the shared connection pool.  The
+        instance timeout is used unless a timeout keyword is given.
+        """
+        kwargs.setdefault('timeout', self._timeout)
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        """
+        Close all pooled connections.  The pool is recreated on the next request.
+        """
+        with self._adapter_lock:
+            if self._adapter is not None:
+                self._adapter.close()
+                self._adapter = None
+        self._local = threading.local()
+
     def __repr__(self):
         return '<UFrame(url={:s})>'.format(self.url)
 
-def get_arrays(array_id=None, uframe_base=UFrame()):
+def _request_failed(url, code, reason, errors=None):
+    """
+    Report a failed request.  If errors is a list, a dictionary containing the
+    url, response code and reason is appended to it.  Otherwise the failure is
+    written to STDERR.
+    """
+    if errors is not None:
+        errors.append({'url' : url, 'code' : code, 'reason' : reason})
+        return
 
-    arrays = []
+    if code == -1:
+        sys.stderr.write('{:s}: {:s}\n'.format(reason, url))
+    else:
+        sys.stderr.write('Request failed: {:s} ({:s})\n'.format(reason, url))
 
-    try:
-        r = requests.get(uframe_base.url, timeout=uframe_base.timeout)
-    except (requests.Timeout, requests.ConnectionError) as e:
-        sys.stderr.write('{:s}: {:s}\n'.format(e.message[0], uframe_base.url))
-        return arrays
+def _fetch_json(url, uframe_base, errors=None, level=None, revalidate=False, keys=None):
+    """
+    Fetch url and return the decoded JSON response, or None if the request
+    failed.  Failures are reported via _request_failed.
+
+    If level ('arrays', 'platforms', 'sensors' or 'metadata') is specified and
+    uframe_base has an inventory cache, a fresh cached response is returned
+    without contacting the server and a stale one is revalidated with a
+    conditional request.  If revalidate is True, a fresh cached response is
+    revalidated too.
+
+    If keys is specified, the response must be a JSON object and only its keys
+    members are decoded.  The others are skipped without being built.
+    """
+    metrics = uframe_base.metrics
+    cache = uframe_base.cache if level else None
+    entry = None
+    headers = {}
+    if cache:
+        entry = cache.get(url)
+        if entry and cache.is_fresh(entry, level) and not revalidate:
+            content = _cached_content(entry, uframe_base, keys)
+            if content is not None:
+                metrics.record_cache(level, 'fresh')
+                return content
+            # The cached response cannot be decoded: fetch it again
+            entry = None
+        if entry:
+            headers = cache.validators(entry)
+        else:
+            metrics.record_cache(level, 'miss')
+
+    # Timeouts and 5xx responses are retried after a jittered backoff
+    for attempt in range(uframe_base.retries + 1):
+        if attempt:
+            metrics.record_retry(level)
+            time.sleep(backoff_delay(attempt))
+
+        ticket = uframe_base.limiter.acquire()
+        start_time = time.time()
+        (r, error) = (None, None)
+        try:
+            r = uframe_base.get(url, headers=headers)
+        except requests.RequestException as e:
+            error = str(e)
+        finally:
+            elapsed = time.time() - start_time
+            uframe_base.limiter.release(ticket, level, elapsed, overloaded=r is None or is_overloaded(r.status_code))
+
+        if r is None:
+            metrics.record_request(level, STATUS_ERROR, elapsed)
+            continue
+
+        metrics.record_request(level, r.status_code, elapsed, len(r.content))
+        if not is_overloaded(r.status_code):
+            break
+
+    if r is None:
+        _request_failed(url, -1, error, errors)
+        return None
+
+    if entry and r.status_code == HTTP_STATUS_NOT_MODIFIED:
+        content = _cached_content(entry, uframe_base, keys)
+        if content is None:
+            _request_failed(url, r.status_code, 'Invalid cached JSON response', errors)
+            return None
+        metrics.record_cache(level, 'revalidated')
+        cache.touch(entry)
+        return content
+    elif entry:
+        metrics.record_cache(level, 'miss')
 
     if r.status_code != HTTP_STATUS_OK:
-        sys.stderr.write('Request failed: {:s} ({:s})\n'.format(r.reason, uframe_base.url))
-        return arrays
+        _request_failed(url, r.status_code, r.reason, errors)
+        return None
+
+    try:
+        content = _decode_json(r.content, uframe_base, keys)
+    except ValueError as e:
+        _request_failed(url, r.status_code, 'Invalid JSON response: {:s}'.format(str(e)), errors)
+        return None
+
+    if cache:
+        cache.put(url, r.content, etag=r.headers.get('etag'), last_modified=r.headers.get('last-modified'))
+
+    return content
+
+def _decode_json(body, uframe_base, keys=None):
+    """
+    Decode the JSON response text body, or only its keys members if keys is
+    specified.  Raises ValueError if body is not valid JSON.
+    """
+    if keys:
+        return uframe_base.json_backend.loads_members(body, keys)
+    return uframe_base.json_backend.loads(body)
+
+def _cached_content(entry, uframe_base, keys=None):
+    """
+    Return the decoded response of the inventory cache entry, or only its keys
+    members if keys is specified.  Returns None if it cannot be decoded.
+    """
+    if 'body' not in entry:
+        # Entry written by an earlier version, holding the decoded response
+        content = entry.get('content')
+        if keys and isinstance(content, dict):
+            return dict((key, content[key]) for key in keys if key in content)
+        return content
+
+    try:
+        return _decode_json(entry['body'], uframe_base, keys)
+    except ValueError:
+        return None
+
+def get_arrays(array_id=None, uframe_base=UFrame(), errors=None):
+
+    arrays = _fetch_json(uframe_base.url, uframe_base, errors=errors, level='arrays')
+    if not arrays:
+        return []
 
-    arrays = r.json()
     if not array_id:
         return arrays
 
@@ -84,7 +433,7 @@ def get_arrays(array_id=None, uframe_base=UFrame()):
 
     return []
 
-def get_platforms(array_id, uframe_base=UFrame()):
+def get_platforms(array_id, uframe_base=UFrame(), errors=None):
 
     platforms = []
 
@@ -94,19 +443,9 @@ def get_platforms(array_id, uframe_base=UFrame()):
 
     url = uframe_base.url + '/{:s}'.format(array_id)
 
-    try:
-        r = requests.get(url, timeout=uframe_base.timeout)
-    except (requests.Timeout, requests.ConnectionError) as e:
-        sys.stderr.write('{:s}: {:s}\n'.format(e.message[0], url))
-        return platforms
-
-    if r.status_code != HTTP_STATUS_OK:
-        sys.stderr.write('Request failed: {:s} ({:s})\n'.format(r.reason, url))
-        return platforms
+    return _fetch_json(url, uframe_base, errors=errors, level='platforms') or platforms
 
-    return r.json()
-
-def get_platform_sensors(array_id, platform, uframe_base=UFrame()):
+def get_platform_sensors(array_id, platform, uframe_base=UFrame(), errors=None):
 
     sensors = []
 
@@ -119,19 +458,9 @@ def get_platform_sensors(array_id, platform, uframe_base=UFrame()):
 
     url = uframe_base.url + '/{:s}/{:s}'.format(array_id, platform)
 
-    try:
-        r = requests.get(url, timeout=uframe_base.timeout)
-    except (requests.Timeout, requests.ConnectionError) as e:
-        sys.stderr.write('{:s}: {:s}\n'.format(e.message[0], url))
-        return sensors
+    return _fetch_json(url, uframe_base, errors=errors, level='sensors') or sensors
 
-    if r.status_code != HTTP_STATUS_OK:
-        sys.stderr.write('Request failed: {:s} ({:s})\n'.format(r.reason, url))
-        return sensors
-
-    return r.json()
-
-def get_sensor_metadata(array_id, platform, sensor, uframe_base=UFrame()):
+def get_sensor_metadata(array_id, platform, sensor, uframe_base=UFrame(), errors=None, revalidate=False):
 
     metadata = {}
 
@@ -145,26 +474,143 @@ def get_sensor_metadata(array_id, platform, sensor, uframe_base=UFrame()):
         sys.stderr.write('No sensor specified\n')
         return metadata
 
+    return _fetch_sensor_metadata(array_id, platform, sensor, uframe_base, errors=errors, revalidate=revalidate) or metadata
+
+def get_sensor_metadata_many(ref_des_list, uframe_base=UFrame(), workers=None, check_sensors=True):
+    """
+    Fetch the metadata records of many sensors concurrently.  See
+    iter_sensor_metadata_many.
+
+    Returns:
+        results: OrderedDict mapping each unique reference designator, in the
+            order first listed, to a (metadata, errors) tuple
+    """
+    ref_des_list = _unique(ref_des_list)
+    results = dict(iter_sensor_metadata_many(ref_des_list, uframe_base=uframe_base, workers=workers, check_sensors=check_sensors))
+    return OrderedDict((ref_des, results[ref_des]) for ref_des in ref_des_list)
+
+def iter_sensor_metadata_many(ref_des_list, uframe_base=UFrame(), workers=None, check_sensors=True):
+    """
+    Fetch the metadata records of the fully-qualified reference designators
+    (SITE-NODE-SENSOR-INSTRUMENT) in ref_des_list, using at most workers
+    concurrent requests, and yield each result as it completes.  Duplicate
+    reference designators are fetched once.
+
+    Failures are not written to STDERR.  They are returned with each result as
+    a list of dictionaries containing the url, response code and reason.
+    Invalid reference designators fail without a request.
+
+    Args:
+        ref_des_list: iterable of reference designators
+        uframe_base: UFrame instance to use
+        workers: maximum number of concurrent requests.  Defaults to the
+            connection pool size of uframe_base.
+        check_sensors: if True, the sensor list of each platform is fetched
+            once and sensors it does not list fail without a metadata
+            request, so that long lists of designators are validated with
+            one request per platform
+
+    Yields:
+        (ref_des, (metadata, errors)) tuples.  metadata is None if the request
+        failed or the sensor has no metadata.
+    """
+    ref_des_list = _unique(ref_des_list)
+    workers = max(1, min(workers or uframe_base.pool_maxsize, len(ref_des_list)))
+
+    # Concurrent requests for the same platform's sensors are coalesced
+    platform_sensors = MetadataCache(max_size=len(ref_des_list))
+
+    def fetch(ref_des):
+        tokens = ref_des.split('-')
+        if len(tokens) != 4 or not all(tokens):
+            return (ref_des, (None, [{'url' : None, 'code' : None, 'reason' : 'Invalid reference designator'}]))
+
+        if check_sensors:
+            # If the sensor list cannot be fetched, fall back to requesting the
+            # metadata
+            sensors = platform_sensors.get('{:s}-{:s}'.format(tokens[0], tokens[1]),
+                lambda: set(get_platform_sensors(tokens[0], tokens[1], uframe_base=uframe_base, errors=[])))
+            if sensors and '{:s}-{:s}'.format(tokens[2], tokens[3]) not in sensors:
+                return (ref_des, (None, [{'url' : None, 'code' : None, 'reason' : 'Sensor not found'}]))
+
+        errors = []
+        metadata = _fetch_sensor_metadata(tokens[0], tokens[1], '{:s}-{:s}'.format(tokens[2], tokens[3]), uframe_base, errors=errors)
+        if not metadata:
+            if not errors:
+                errors.append({'url' : None, 'code' : None, 'reason' : 'No metadata found'})
+            metadata = None
+        return (ref_des, (metadata, errors))
+
+    if workers == 1:
+        for ref_des in ref_des_list:
+            yield fetch(ref_des)
+        return
+
+    pool = ThreadPool(workers)
+    try:
+        for result in pool.imap_unordered(fetch, ref_des_list):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _unique(values):
+    """
+    Return the unique values, in the order first listed.
+    """
+    seen = set()
+    unique = []
+    for value in values:
+        if value not in seen:
+            seen.add(value)
+            unique.append(value)
+    return unique
+
+def _fetch_sensor_metadata(array_id, platform, sensor, uframe_base, errors=None, revalidate=False, keys=None):
+    """
+    Fetch the metadata record for the sensor through the uframe_base metadata
+    cache, if it has one.  Returns None if the request failed.
+
+    If revalidate is True, the in-memory metadata cache is bypassed and a
+    cached inventory response is revalidated with the server even if it is
+    fresh, so that the latest stream endTimes are returned.
+
+    If keys (e.g. ('times',)) is specified, only those members of the record
+    are decoded and returned.  Partial records bypass the in-memory metadata
+    cache, but a record already held in it is used.
+    """
     url = uframe_base.url + '/{:s}/{:s}/{:s}/metadata'.format(
         array_id,
         platform,
         sensor
     )
 
-    try:
-        r = requests.get(url, timeout=uframe_base.timeout)
-    except (requests.Timeout, requests.ConnectionError) as e:
-        sys.stderr.write('{:s}: {:s}\n'.format(e.message[0], url))
-        return metadata
+    def fetch():
+        return _fetch_json(url, uframe_base, errors=errors, level='metadata', revalidate=revalidate, keys=keys)
 
-    if r.status_code != HTTP_STATUS_OK:
-        sys.stderr.write('Request failed: {:s} ({:s})\n'.format(r.reason, url))
-        return metadata
+    if uframe_base.metadata_cache is None or revalidate:
+        return fetch()
 
-    return r.json()
+    ref_des = '{:s}-{:s}-{:s}'.format(array_id, platform, sensor)
+    if keys:
+        metadata = uframe_base.metadata_cache.peek(ref_des)
+        if metadata is None:
+            return fetch()
+        uframe_base.metrics.record_cache('metadata', 'memory')
+        return dict((key, metadata[key]) for key in keys if key in metadata)
 
+    fetched = []
 
-def get_uframe_array(array_id, out_dir=None, exec_dpa=True, urlonly=False, alltimes=False, deltatype='days', deltaval=1, provenance=False, limit=True, uframe_base=UFrame(), file_format='netcdf'):
+    def fetch_once():
+        fetched.append(True)
+        return fetch()
+
+    metadata = uframe_base.metadata_cache.get(ref_des, fetch_once)
+    if not fetched:
+        uframe_base.metrics.record_cache('metadata', 'memory')
+    return metadata
+
+def get_uframe_array(array_id, out_dir=None, exec_dpa=True, urlonly=False, alltimes=False, deltatype='days', deltaval=1, provenance=False, limit=True, uframe_base=UFrame(), file_format='netcdf', parallel=1, incremental=False, watermark_file=None, chunk_records=None, chunk_size=DEFAULT_CHUNK_SIZE, fsync=False, queue_depth=None):
     """
     Download NetCDF / JSON files for the most recent 1-day worth of data for telemetered
     and recovered data streams for the specified array_id.
@@ -175,9 +621,30 @@ def get_uframe_array(array_id, out_dir=None, exec_dpa=True, urlonly=False, allti
             Defaults to the current working directory.
         exec_dpa: set to False to NOT execute L1/L2 data product algorithms prior
             to download.  Defaults to True
+        parallel: number of concurrent downloads.  Defaults to 1
+        incremental: set to True to request only the data added to each stream
+            since its last successful download, as recorded in watermark_file.
+            Each request begins 1 millisecond after the watermark, and streams
+            whose endTime has not changed are skipped.  The sensor metadata is
+            revalidated with uFrame rather than taken from a fresh cache entry.
+            Streams without a watermark are requested using
+            alltimes/deltatype/deltaval.
+        watermark_file: stream endTime watermark file used by incremental.
+            Defaults to out_dir/.uframe_watermarks.json
+        chunk_records: if specified, split each stream request into time chunks
+            of roughly chunk_records records, estimated from the stream metadata.
+            Each chunk is a separate request, written to its own file.
+        chunk_size: number of bytes read and written at a time when downloading
+        fsync: set to True to fsync each downloaded file before it is moved into
+            place
+        queue_depth: maximum number of discovered downloads waiting for one of
+            the parallel download workers.  Discovery of the platforms, sensors
+            and metadata pauses while the queue is full.  Defaults to 2 x
+            parallel.
 
     Returns:
-        urls: array of dictionaries containing the url, response code and reason
+        urls: array of dictionaries containing the url, response code and reason.
+            Chunks of the same stream are consecutive and in time order.
     """
 
     fetched_urls = []
@@ -236,77 +703,169 @@ def get_uframe_array(array_id, out_dir=None, exec_dpa=True, urlonly=False, allti
     else:
         limit = -1 # no limit
 
-    for platform in platforms:
-
-        p_name = '{:s}-{:s}'.format(array, platform)
-        if not urlonly:
-            sys.stdout.write('{:s}: Fetching platform data sensors ({:s})\n'.format(p_name, uframe_base))
-            sys.stdout.flush()
-
-        sensors = get_platform_sensors(array, platform, uframe_base=uframe_base)
-        if not sensors:
-            sys.stderr.write('{:s}: No data sensors found for this platform\n'.format(p_name))
-            sys.stderr.flush()
-            continue
+    watermarks = None
+    if incremental:
+        from uframe.sync import WatermarkStore, WATERMARK_FILE_NAME
+        if not watermark_file:
+            watermark_file = os.path.join(out_dir or os.path.realpath(os.curdir), WATERMARK_FILE_NAME)
+        watermarks = WatermarkStore(watermark_file)
+    # (ref_des, method, stream, endTime) of each request, for updating the
+    # watermarks once the downloads complete
+    requested_streams = []
+
+    if chunk_records:
+        from uframe.planner import plan_time_chunks
+
+    # Inventory discovery, in this thread, feeds a bounded queue of downloads
+    # consumed by the executor's workers, so that the downloads of one sensor
+    # overlap the discovery of the next
+    executor = None
+    if not urlonly:
+        from uframe.download import DownloadExecutor
+        executor = DownloadExecutor(parallel=parallel, per_host=uframe_base.max_downloads, queue_depth=queue_depth)
 
-        if not urlonly:
-            sys.stdout.write('{:s}: {:d} sensors fetched\n'.format(p_name, len(sensors)))
-            sys.stdout.flush()
+    try:
+        for platform in platforms:
 
-        if not urlonly:
-            sys.stdout.write('Fetching platform sensors ({:s})\n'.format(uframe_base))
-            sys.stdout.flush()
-        for sensor in sensors:
-            # Fetch sensor metadata
+            p_name = '{:s}-{:s}'.format(array, platform)
+            if not urlonly:
+                sys.stdout.write('{:s}: Fetching platform data sensors ({:s})\n'.format(p_name, uframe_base))
+                sys.stdout.flush()
 
-            meta = get_sensor_metadata(array, platform, sensor, uframe_base=uframe_base)
-            if not meta:
-                sys.stderr.write('{:s}: No metadata found for sensor: {:s}\n'.format(p_name, sensor))
+            sensors = get_platform_sensors(array, platform, uframe_base=uframe_base)
+            if not sensors:
+                sys.stderr.write('{:s}: No data sensors found for this platform\n'.format(p_name))
                 sys.stderr.flush()
                 continue
 
-            for metadata in meta['times']:
-                if alltimes:
-                    ts0 = metadata['beginTime']
-                    ts1 = metadata['endTime']
-                else:
-                    dt1 = parser.parse(metadata['endTime'])
-                    if dt1.year < 2000:
-                        sys.stderr.write('{:s}: Invalid metadata endTime: {:s}\n'.format(p_name, metadata['endTime']))
-                        sys.stderr.flush()
-                        continue
-    
-                    dt0 = dt1 - tdelta(**dict({deltatype : deltaval}))
-                    ts1 = metadata['endTime']
-                    ts0 = '{:s}Z'.format(dt0.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3])
+            if not urlonly:
+                sys.stdout.write('{:s}: {:d} sensors fetched\n'.format(p_name, len(sensors)))
+                sys.stdout.flush()
+
+            if not urlonly:
+                sys.stdout.write('Fetching platform sensors ({:s})\n'.format(uframe_base))
+                sys.stdout.flush()
+            for sensor in sensors:
+                # Fetch sensor metadata
+
+                # Incremental downloads need the current stream endTimes
+                meta = get_sensor_metadata(array, platform, sensor, uframe_base=uframe_base, revalidate=incremental)
+                if not meta:
+                    sys.stderr.write('{:s}: No metadata found for sensor: {:s}\n'.format(p_name, sensor))
+                    sys.stderr.flush()
+                    continue
+
+                ref_des = '{:s}-{:s}'.format(p_name, sensor)
+
+                # Default request windows of all of the sensor's streams
+                if not alltimes:
+                    default_windows = time_windows([t['endTime'] for t in meta['times']], deltatype, deltaval)
+
+                for (i, metadata) in enumerate(meta['times']):
+                    watermark = None
+                    if watermarks is not None:
+                        watermark = watermarks.get(ref_des, metadata['method'], metadata['stream'])
+
+                    if watermark:
+                        if parse_iso8601(metadata['endTime']) <= parse_iso8601(watermark):
+                            if not urlonly:
+                                sys.stdout.write('{:s}: No new data since {:s}: {:s}-{:s}\n'.format(ref_des, watermark, metadata['method'], metadata['stream']))
+                                sys.stdout.flush()
+                            continue
+                        # The watermark's record was downloaded by the previous request
+                        ts0 = next_timestamp(watermark)
+                        ts1 = metadata['endTime']
+                    elif alltimes:
+                        ts0 = metadata['beginTime']
+                        ts1 = metadata['endTime']
+                    else:
+                        if not default_windows[i]:
+                            sys.stderr.write('{:s}: Invalid metadata endTime: {:s}\n'.format(p_name, metadata['endTime']))
+                            sys.stderr.flush()
+                            continue
+
+                        (ts0, ts1) = default_windows[i]
                 
-                stream = metadata['stream']
-                method = metadata['method']
-                dest_dir = os.path.join(out_dir, p_name, method) if not urlonly else None
-
-                fetched_url = fetch_uframe_time_bound_stream(
-                    uframe_base = uframe_base,
-                    subsite = array,
-                    node = platform,
-                    sensor = sensor,
-                    method = method,
-                    stream = stream,
-                    begin_datetime = ts0,
-                    end_datetime = ts1,
-                    file_format = file_format,
-                    exec_dpa = exec_dpa,
-                    urlonly = urlonly,
-                    dest_dir = dest_dir,
-                    provenance = provenance,
-                    limit = str(limit)
-                )
-                fetched_urls.append(fetched_url)
+                    stream = metadata['stream']
+                    method = metadata['method']
+                    dest_dir = os.path.join(out_dir, p_name, method) if not urlonly else None
+
+                    # Split large requests into chunks of roughly chunk_records records
+                    windows = [(ts0, ts1)]
+                    if chunk_records:
+                        windows = plan_time_chunks(ts0, ts1, metadata, chunk_records=chunk_records)
+
+                    for (chunk_ts0, chunk_ts1) in windows:
+                        request = dict(
+                            uframe_base = uframe_base,
+                            subsite = array,
+                            node = platform,
+                            sensor = sensor,
+                            method = method,
+                            stream = stream,
+                            begin_datetime = chunk_ts0,
+                            end_datetime = chunk_ts1,
+                            file_format = file_format,
+                            exec_dpa = exec_dpa,
+                            urlonly = urlonly,
+                            dest_dir = dest_dir,
+                            provenance = provenance,
+                            limit = str(limit),
+                            chunk_size = chunk_size,
+                            fsync = fsync
+                        )
+                        if executor:
+                            executor.submit(**request)
+                        else:
+                            fetched_urls.append(fetch_uframe_time_bound_stream(**request))
+                        requested_streams.append((ref_des, method, stream, chunk_ts1))
+
+        if executor:
+            fetched_urls = executor.results()
+    finally:
+        # Do not leave the worker threads behind if discovery fails
+        if executor:
+            executor.close()
+
+    # Advance the watermarks of the streams that were downloaded successfully.
+    # A chunked stream only advances up to its first failed chunk.
+    if watermarks is not None and not urlonly:
+        failed_streams = set()
+        for ((ref_des, method, stream, ts1), fetched_url) in zip(requested_streams, fetched_urls):
+            if (ref_des, method, stream) in failed_streams:
+                continue
+            if fetched_url['code'] == HTTP_STATUS_OK:
+                watermarks.set(ref_des, method, stream, ts1)
+            else:
+                failed_streams.add((ref_des, method, stream))
+        watermarks.save()
 
     return fetched_urls
 
 
 def fetch_uframe_time_bound_stream(uframe_base, subsite, node, sensor, method, stream, begin_datetime, end_datetime,
-                                     file_format, exec_dpa, urlonly, dest_dir, provenance, limit):
+                                     file_format, exec_dpa, urlonly, dest_dir, provenance, limit, progress=None,
+                                     chunk_size=DEFAULT_CHUNK_SIZE, fsync=False):
+    """
+    Request the stream data between begin_datetime and end_datetime and write the
+    response to dest_dir.
+
+    Args:
+        progress: optional callable, called with the number of bytes written
+            each time a chunk of the response is written to disk.
+        chunk_size: number of bytes read from the response and written to disk
+            at a time
+        fsync: set to True to fsync the file to disk before it is moved into place
+
+    Returns:
+        fetched_url: dictionary containing the url, response code, reason,
+            request time, the path of the file written (None if no file was
+            written), the number of bytes received, the time to first byte
+            (ttfb) and total time (elapsed) of the request, in seconds, and the
+            transfer rate in bytes/sec.  A completed download has code 200,
+            even if it was resumed from a partial file with a Range request
+            (resumed is True).
+    """
        
     url = '{:s}/{:s}/{:s}/{:s}/{:s}/{:s}?beginDT={:s}&endDT={:s}&format=application/{:s}&execDPA={:s}&limit={:s}&include_provenance={:s}'.format(
         uframe_base.url,
@@ -327,13 +886,189 @@ def fetch_uframe_time_bound_stream(uframe_base, subsite, node, sensor, method, s
         'url' : url,
         'reason' : None,
         'code' : -1,
-        'request_time' : datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+        'request_time' : datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S'),
+        'file' : None,
+        'bytes' : 0,
+        'ttfb' : None,
+        'elapsed' : None,
+        'bytes_per_sec' : None,
+        'resumed' : False
     }
 
     # If urlonly is True, do not attempt to fetch.
     if not urlonly:
 
-        # Create the destination directory for this file
+        # Attempt to download the file.  Timeouts and 5xx responses are retried
+        # after a jittered backoff, resuming the partial file.
+        if _make_dest_dir(dest_dir):
+            file_name = _stream_file_name(subsite, node, stream, method, begin_datetime, end_datetime, file_format)
+            zip_file_name = _stream_file_name(subsite, node, stream, method, begin_datetime, end_datetime, 'zip')
+            start_time = time.time()
+            for attempt in range(uframe_base.retries + 1):
+                if attempt:
+                    delay = backoff_delay(attempt)
+                    sys.stderr.write('Retrying in {:0.1f}s (retry {:d} of {:d}, concurrency limit {:d}): {:s}\n'.format(
+                        delay, attempt, uframe_base.retries, uframe_base.data_limiter.limit, url))
+                    sys.stderr.flush()
+                    uframe_base.metrics.record_retry('data')
+                    time.sleep(delay)
+                status = _download_stream_file(uframe_base, url, stream, dest_dir, file_name, zip_file_name, fetched_url, progress, chunk_size, fsync)
+                if not is_overloaded(status):
+                    break
+
+            elapsed = fetched_url['elapsed'] = time.time() - start_time
+            if elapsed > 0:
+                fetched_url['bytes_per_sec'] = fetched_url['bytes'] / elapsed
+
+    return fetched_url
+    
+def _download_stream_file(uframe_base, url, stream, dest_dir, file_name, zip_file_name, fetched_url, progress, chunk_size, fsync):
+    """
+    Make one attempt at downloading the stream url to dest_dir/file_name (or
+    dest_dir/zip_file_name if uFrame returns a zip file), updating fetched_url.
+    Returns the response status code, or STATUS_ERROR if no response was received.
+    """
+    # The response is written to file_path.part, with the number of bytes
+    # received recorded in the journal file_path.part.json, and renamed
+    # to file_path once complete.  An interrupted transfer is resumed
+    # from the end of the .part file on the next request.
+    file_path = os.path.join(dest_dir, file_name)
+    part_path = '{:s}.part'.format(file_path)
+    journal_path = '{:s}.json'.format(part_path)
+    journal = _read_download_journal(journal_path, part_path, url)
+
+    headers = {}
+    if journal['bytes']:
+        headers['Range'] = 'bytes={:d}-'.format(journal['bytes'])
+        # Only resume if the response has not changed since the partial
+        # transfer
+        if journal['etag'] or journal['last_modified']:
+            headers['If-Range'] = journal['etag'] or journal['last_modified']
+
+    sys.stdout.write('Fetching url: {:s}\n'.format(url))
+    sys.stdout.flush()
+    received = fetched_url['bytes']
+    status = STATUS_ERROR
+    ttfb = None
+    r = None
+    ticket = uframe_base.data_limiter.acquire()
+    start_time = time.time()
+    try:
+        r = uframe_base.get(url, stream=True, headers=headers)
+        ttfb = fetched_url['ttfb'] = time.time() - start_time
+        fetched_url['reason'] = r.reason
+        fetched_url['code'] = status = r.status_code
+        if r.status_code in (HTTP_STATUS_OK, HTTP_STATUS_PARTIAL_CONTENT):
+            # Write the file if the request succeeded
+            
+            # 2015-07-30: kerfoot@marine.rutgers.edu
+            # Special zip-file case:
+            # if the r.headers['content-type'] == 'application/octet-stream'
+            # and r.headers['content-disposition'] ends with .zip", 
+            # override the file_format and download as zip file.  If 
+            # r.headers['content-type'] is anything else, download as the
+            # user specified format.
+            # This is a TEMPORARY patch to handle uframe returning zips
+            # of 1 or more .nc files.
+            
+            if r.headers['content-type'] == 'application/octet-stream' and r.headers['content-disposition'].endswith('.zip"'):
+                file_path = os.path.join(dest_dir, zip_file_name)
+
+            if r.status_code == HTTP_STATUS_PARTIAL_CONTENT and not r.headers.get('content-range', '').startswith('bytes {:d}-'.format(journal['bytes'])):
+                # The server returned a different range than the one requested
+                sys.stderr.write('Download failed: unexpected Content-Range {:s} (discarding partial file {:s})\n'.format(r.headers.get('content-range', ''), part_path))
+                sys.stderr.flush()
+                _remove_file(part_path)
+                _remove_file(journal_path)
+                fetched_url['reason'] = 'Invalid Content-Range'
+                return status
+            elif r.status_code == HTTP_STATUS_PARTIAL_CONTENT:
+                sys.stdout.write('Resuming file at byte {:d}: {:s}\n'.format(journal['bytes'], file_path))
+                mode = 'r+b'
+            else:
+                # The server ignored the Range request: start over
+                sys.stdout.write('Writing file: {:s}\n'.format(file_path))
+                journal['bytes'] = 0
+                mode = 'wb'
+            journal['etag'] = r.headers.get('etag')
+            journal['last_modified'] = r.headers.get('last-modified')
+            sys.stdout.flush()
+
+            journaled_bytes = [journal['bytes']]
+
+            def chunk_written(num_bytes):
+                journal['bytes'] += num_bytes
+                fetched_url['bytes'] += num_bytes
+                if journal['bytes'] - journaled_bytes[0] >= _journal_interval:
+                    fid.flush()
+                    _write_download_journal(journal_path, journal)
+                    journaled_bytes[0] = journal['bytes']
+                if progress:
+                    progress(num_bytes)
+
+            with open(part_path, mode) as fid:
+                fid.seek(journal['bytes'])
+                fid.truncate()
+                try:
+                    _write_response(r, fid, chunk_size, chunk_written)
+                    if fsync:
+                        fid.flush()
+                        os.fsync(fid.fileno())
+                finally:
+                    fid.flush()
+                    _write_download_journal(journal_path, journal)
+
+            # The transfer is complete: move it into place
+            os.rename(part_path, file_path)
+            _remove_file(journal_path)
+            fetched_url['file'] = file_path
+            if r.status_code == HTTP_STATUS_PARTIAL_CONTENT:
+                # The complete file was received: report the resumed transfer
+                # as a successful request
+                fetched_url['code'] = HTTP_STATUS_OK
+                fetched_url['reason'] = 'OK'
+                fetched_url['resumed'] = True
+        elif r.status_code == HTTP_STATUS_RANGE_NOT_SATISFIABLE:
+            # The partial file no longer matches the response: discard it
+            sys.stderr.write('Download failed: {:d} {:s} (discarding partial file {:s})\n'.format(r.status_code, r.reason, part_path))
+            sys.stderr.flush()
+            _remove_file(part_path)
+            _remove_file(journal_path)
+        else:
+            sys.stderr.write('Download failed: {:d} {:s}\n'.format(r.status_code, r.reason))
+            sys.stderr.flush()
+    except requests.RequestException as e:
+        sys.stderr.write('{:s}: {:s}\n'.format(str(e), url))
+        sys.stderr.flush()
+        if isinstance(e, (requests.Timeout, requests.ConnectionError)):
+            fetched_url['reason'] = 'ConnectTimeout'
+        else:
+            fetched_url['reason'] = e.__class__.__name__
+        fetched_url['code'] = 500
+        status = STATUS_ERROR
+    finally:
+        # Release the connection back to the shared pool, even if the
+        # transfer was interrupted
+        if r is not None:
+            r.close()
+        elapsed = time.time() - start_time
+        # The time to first byte, rather than the transfer time, measures how
+        # busy the server is
+        uframe_base.data_limiter.release(ticket, 'data', ttfb if ttfb is not None else elapsed, overloaded=is_overloaded(status))
+        uframe_base.metrics.record_request('data', status, elapsed, fetched_url['bytes'] - received, stream)
+
+    return status
+
+def _make_dest_dir(dest_dir):
+    """
+    Create dest_dir if it does not exist.  Directories that are known to exist
+    are remembered so that the file system is only checked once per directory.
+    Returns True if the directory exists.
+    """
+    if dest_dir in _dest_dirs:
+        return True
+
+    with _dest_dirs_lock:
         if not os.path.exists(dest_dir):
             sys.stdout.write('Creating destination directory: {:s}\n'.format(dest_dir))
             sys.stdout.flush()
@@ -342,59 +1077,85 @@ def fetch_uframe_time_bound_stream(uframe_base, subsite, node, sensor, method, s
             except OSError as e:
                 sys.stderr.write(str(e))
                 sys.stderr.flush()
+                return False
+        _dest_dirs.add(dest_dir)
 
-        # Attempt to download the file
-        if os.path.exists(dest_dir):
-            sys.stdout.write('Fetching url: {:s}\n'.format(url))
-            sys.stdout.flush()
-            try:
-                r = requests.get(url, stream=True, timeout=uframe_base.timeout)
-                fetched_url['reason'] = r.reason
-                fetched_url['code'] = r.status_code
-                if r.status_code == HTTP_STATUS_OK:
-                    # Write the file if the request succeeded
-                    
-                    # 2015-07-30: kerfoot@marine.rutgers.edu
-                    # Special zip-file case:
-                    # if the r.headers['content-type'] == 'application/octet-stream'
-                    # and r.headers['content-disposition'] ends with .zip", 
-                    # override the file_format and download as zip file.  If 
-                    # r.headers['content-type'] is anything else, download as the
-                    # user specified format.
-                    # This is a TEMPORARY patch to handle uframe returning zips
-                    # of 1 or more .nc files.
-                    
-                    if r.headers['content-type'] == 'application/octet-stream' and r.headers['content-disposition'].endswith('.zip"'):
-                        file_format = 'zip'
-                        
-                    file_name = '{:s}-{:s}-{:s}-{:s}-{:s}-{:s}.{:s}'.format(
-                        subsite,
-                        node,
-                        stream,
-                        method,
-                        parser.parse(begin_datetime).strftime('%Y%m%dT%H%M%S'),
-                        parser.parse(end_datetime).strftime('%Y%m%dT%H%M%S'),
-                        __filename_extension[file_format]
-                    )
-                    file_path = os.path.join(dest_dir, file_name)
-                    sys.stdout.write('Writing file: {:s}\n'.format(file_path))
-                    sys.stdout.flush()
-                    with open(file_path, 'wb') as fid:
-                        for chunk in r.iter_content(chunk_size=1024):
-                            if chunk:
-                                fid.write(chunk)
-                                fid.flush()
-                else:
-                    sys.stderr.write('Download failed: {:d} {:s}\n'.format(r.status_code, r.reason))
-                    sys.stderr.flush()
-            except (requests.Timeout, requests.ConnectionError) as e:
-                sys.stderr.write('{:s}: {:s}\n'.format(e.message[0], url))
-                sys.stderr.flush()
-                fetched_url['reason'] = 'ConnectTimeout'
-                fetched_url['code'] = 500
+    return True
 
-    return fetched_url
+def _write_response(r, fid, chunk_size, chunk_written):
+    """
+    Write the body of the streamed response r to fid, chunk_size bytes at a
+    time, calling chunk_written with the number of bytes after each write.
+    Unencoded responses are read into a single reused buffer.
+    """
+    try:
+        if r.headers.get('content-encoding'):
+            # Let requests decode compressed responses
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    fid.write(chunk)
+                    chunk_written(len(chunk))
+            return
+
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        while True:
+            num_bytes = r.raw.readinto(buf)
+            if not num_bytes:
+                break
+            fid.write(view[:num_bytes])
+            chunk_written(num_bytes)
+    except (ReadTimeoutError, ProtocolError) as e:
+        # Report interrupted transfers the same way as failed requests
+        raise requests.ConnectionError(e)
+
+def _stream_file_name(subsite, node, stream, method, begin_datetime, end_datetime, file_format):
     
+    return '{:s}-{:s}-{:s}-{:s}-{:s}-{:s}.{:s}'.format(
+        subsite,
+        node,
+        stream,
+        method,
+        file_stamp(begin_datetime),
+        file_stamp(end_datetime),
+        __filename_extension[file_format]
+    )
+
+def _read_download_journal(journal_path, part_path, url):
+    """
+    Return the download journal for part_path.  A new, empty journal is returned
+    if there is no journal, it is for a different url or the partial file is
+    shorter than the journaled number of bytes.
+    """
+    journal = {'url' : url, 'bytes' : 0, 'etag' : None, 'last_modified' : None}
+
+    try:
+        with open(journal_path, 'r') as fid:
+            saved = json.load(fid)
+        if saved['url'] == url and os.path.getsize(part_path) >= saved['bytes']:
+            journal.update(saved)
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    return journal
+
+def _write_download_journal(journal_path, journal):
+
+    tmp_path = '{:s}.tmp'.format(journal_path)
+    try:
+        with open(tmp_path, 'w') as fid:
+            json.dump(journal, fid)
+        os.rename(tmp_path, journal_path)
+    except (IOError, OSError) as e:
+        sys.stderr.write('Failed to write download journal: {:s}\n'.format(str(e)))
+        sys.stderr.flush()
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 def get_ref_des_streams(ref_des, uframe_base=UFrame()):
     
     tokens = ref_des.split('-')
@@ -404,18 +1165,14 @@ def get_ref_des_streams(ref_des, uframe_base=UFrame()):
         
     metadata_url = '{:s}/{:s}/{:s}/{:s}-{:s}/metadata'.format(uframe_base.url, tokens[0], tokens[1], tokens[2], tokens[3])
     
-    # Fetch the metadata 
-    r = requests.get(metadata_url)
-    if r.status_code != 200:
+    # Fetch the metadata times, without decoding the parameters
+    errors = []
+    metadata = _fetch_sensor_metadata(tokens[0], tokens[1], '{:s}-{:s}'.format(tokens[2], tokens[3]), uframe_base, errors=errors, keys=('times',))
+    if not metadata:
         sys.stderr.write('Failed to fetch metadata response: {:s}\n'.format(metadata_url))
         return []
         
     streams = []
-    try:
-        metadata = r.json()
-    except ValueError as e:
-        sys.stderr.write('{:s}\n'.format(e.message))
-        return streams
         
     for stream in metadata['times']:
         streams.append([ref_des, stream['stream']])
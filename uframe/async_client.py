@@ -0,0 +1,111 @@
+"""
+Non-blocking client for issuing many concurrent uFrame requests from one process.
+"""
+
+from multiprocessing.pool import ThreadPool
+from uframe import (UFrame,
+    get_arrays,
+    get_platforms,
+    get_platform_sensors,
+    get_sensor_metadata,
+    fetch_uframe_time_bound_stream)
+
+
+class AsyncUFrame(object):
+    """
+    Non-blocking counterpart of the uFrame request functions.
+
+    Each method submits the corresponding blocking function to a dispatcher and
+    immediately returns a multiprocessing.pool.AsyncResult.  Use
+    result.get() (or AsyncUFrame.gather) to wait for the value, or pass a
+    callback to be called with the value when the request completes.
+
+    Inventory/metadata requests and streaming downloads are dispatched by
+    separate thread pools, so that queued downloads cannot occupy the workers
+    needed by small metadata requests.  All requests share the connection pool
+    of the underlying UFrame instance.
+
+    Args:
+        uframe_base: UFrame instance to use.  A new instance, with max_requests
+            inventory connections and max_downloads data connections, is created
+            if not specified.
+        max_requests: maximum number of concurrent inventory and metadata requests
+        max_downloads: maximum number of concurrent data downloads
+    """
+
+    def __init__(self, uframe_base=None, max_requests=16, max_downloads=4):
+        if uframe_base is None:
+            uframe_base = UFrame(pool_maxsize=max_requests, max_downloads=max_downloads)
+        self._uframe_base = uframe_base
+        self._requests = ThreadPool(max_requests)
+        self._downloads = ThreadPool(max_downloads)
+
+    @property
+    def uframe_base(self):
+        return self._uframe_base
+
+    def get_arrays(self, array_id=None, callback=None):
+        return self._submit(self._requests, get_arrays, callback,
+            array_id=array_id)
+
+    def get_platforms(self, array_id, callback=None):
+        return self._submit(self._requests, get_platforms, callback,
+            array_id=array_id)
+
+    def get_platform_sensors(self, array_id, platform, callback=None):
+        return self._submit(self._requests, get_platform_sensors, callback,
+            array_id=array_id,
+            platform=platform)
+
+    def get_sensor_metadata(self, array_id, platform, sensor, callback=None):
+        return self._submit(self._requests, get_sensor_metadata, callback,
+            array_id=array_id,
+            platform=platform,
+            sensor=sensor)
+
+    def fetch_uframe_time_bound_stream(self, subsite, node, sensor, method, stream, begin_datetime, end_datetime,
+                                       file_format='netcdf', exec_dpa=True, urlonly=False, dest_dir=None,
+                                       provenance=False, limit='-1', callback=None):
+        return self._submit(self._downloads, fetch_uframe_time_bound_stream, callback,
+            subsite=subsite,
+            node=node,
+            sensor=sensor,
+            method=method,
+            stream=stream,
+            begin_datetime=begin_datetime,
+            end_datetime=end_datetime,
+            file_format=file_format,
+            exec_dpa=exec_dpa,
+            urlonly=urlonly,
+            dest_dir=dest_dir,
+            provenance=provenance,
+            limit=limit)
+
+    @staticmethod
+    def gather(results, timeout=None):
+        """
+        Wait for each of the AsyncResults and return their values, in order.
+        """
+        return [r.get(timeout) for r in results]
+
+    def close(self):
+        """
+        Stop accepting requests and wait for the outstanding ones to complete.
+        """
+        for pool in (self._requests, self._downloads):
+            pool.close()
+        for pool in (self._requests, self._downloads):
+            pool.join()
+
+    def _submit(self, pool, func, callback, **kwargs):
+        kwargs['uframe_base'] = self._uframe_base
+        return pool.apply_async(func, kwds=kwargs, callback=callback)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return '<AsyncUFrame(url={:s})>'.format(self._uframe_base.url)
@@ -5,7 +5,16 @@ from collections import OrderedDict
 # from ~/code/pylib
 from uframe import *
 
-def test_product_availability(test_csv, uframe=None, resultsdir=None, out_csv=None):
+def test_product_availability(test_csv, uframe=None, resultsdir=None, out_csv=None, workers=1):
+    '''
+    Test the availability of the streams and parameters listed in test_csv and
+    write the results to test_csv-test_results.csv.
+    
+    With workers > 1, the metadata for all of the reference designators in
+    test_csv is first fetched concurrently, using a pool of workers threads,
+    and the rows are then tested in memory.  The results are the same as those
+    of the serial (workers=1) run.
+    '''
     
     out_csv = None
     
@@ -20,7 +29,7 @@ def test_product_availability(test_csv, uframe=None, resultsdir=None, out_csv=No
         
     # Open up test_csv for reading
     try:
-        fid = open(csv_file, 'rU')
+        fid = open(test_csv, 'rU')
     except IOError as e:
         sys.stderr.write('{:s}: {:s}\n'.format(e.message, e.filename))
         sys.stderr.flush()
@@ -38,7 +47,7 @@ def test_product_availability(test_csv, uframe=None, resultsdir=None, out_csv=No
     # Open the output file to write the results
     try:
         if not out_csv:
-            (out_path, out_file) = os.path.split(csv_file)
+            (out_path, out_file) = os.path.split(test_csv)
             (f_name, ext) = os.path.splitext(out_file)
             csv_name = '{:s}-test_results{:s}'.format(f_name, ext)
             out_csv = os.path.join(out_path, csv_name)
@@ -67,11 +76,21 @@ def test_product_availability(test_csv, uframe=None, resultsdir=None, out_csv=No
     r_param = 5
     t_param = 6
     
-    # dict for holding metadata urls
-    all_metadata = {}
+    # Metadata indexes (see MetadataIndex) by reference designator.  None for
+    # reference designators for which no metadata was found.
+    indexes = {}
     
     # First line of test_csv contains column headers
     headers = c.next()
+    
+    if workers > 1:
+        # Prefetch the metadata for all of the reference designators, then
+        # start over at the first row
+        indexes = prefetch_metadata_indexes(_unique_ref_des(c, refdes), uframe, workers)
+        fid.seek(0)
+        c = csv.reader(fid)
+        c.next()
+        
     # Add test result columns
     all_tests = OrderedDict()
     all_tests['DataStreamR Available'] = 0
@@ -87,14 +106,25 @@ def test_product_availability(test_csv, uframe=None, resultsdir=None, out_csv=No
     for h in all_tests.keys():
         headers.append(h)
     
+    # Test result column indices
+    url_col = headers.index('UFrame Metadata URL')
+    r_cols = (headers.index('DataStreamR Available'),
+        headers.index('ParameterID_R Available'),
+        headers.index('ParameterID_R in Stream'),
+        headers.index('UFrame DataStreamR'))
+    t_cols = (headers.index('DataStreamT Available'),
+        headers.index('ParameterID_T Available'),
+        headers.index('ParameterID_T in Stream'),
+        headers.index('UFrame DataStreamT'))
+    test_values = all_tests.values()
+    
     # Write the output headers
     out_writer.writerow(headers) 
     
     for row in c:
     
         # Add the test result cells               
-        for (k,v) in all_tests.items():
-            row.append(v)
+        row.extend(test_values)
             
         # Break up the reference designator to create the metadata request url
         ref_tokens = row[refdes].split('-')
@@ -105,116 +135,28 @@ def test_product_availability(test_csv, uframe=None, resultsdir=None, out_csv=No
             out_writer.writerow(row)
             continue
         
-        if row[refdes] in all_metadata.keys() and not all_metadata[row[refdes]]:
-            continue
-        elif row[refdes] in all_metadata.keys():
-            meta = all_metadata[row[refdes]]
-        else:    
-            # Attempt to fetch the metadata
+        if row[refdes] not in indexes:
             sys.stdout.write('{:s}: Fetching metadata\n'.format(row[refdes]))
             sys.stdout.flush()
+            indexes[row[refdes]] = fetch_metadata_index(row[refdes], uframe)
             
-            meta = get_sensor_metadata(ref_tokens[0], ref_tokens[1], '{:s}-{:s}'.format(ref_tokens[2], ref_tokens[3]))
-            if not meta:
-                all_metadata[row[refdes]] = None
-                # Write the results to the output file
-                out_writer.writerow(row)
-                continue
+        index = indexes[row[refdes]]
+        if index is None:
+            # Write the results to the output file
+            out_writer.writerow(row)
+            continue
             
-            # Cache the metadata record so we don't have to fetch it each time for 
-            # the same reference designator
-            all_metadata[row[refdes]] = meta   
+        row[url_col] = index.url
         
-        # Create the metadata url
-        url = uframe.url + '/{:s}/{:s}/{:s}/metadata'.format(
-            ref_tokens[0],
-            ref_tokens[1],
-            '{:s}-{:s}'.format(ref_tokens[2], ref_tokens[3])
-        ) 
-        i = headers.index('UFrame Metadata URL')
-        row[i] = url
-        
-        # Create the list of available data streams and parameters
-        streams = [m['stream'] for m in meta['times']]
-        parameters = [m['particleKey'] for m in meta['parameters']]
-        
-        # RECOVERED
-        if row[r_stream]:
-            
-            # 1. Is the recovered data stream (r_stream) available?
-            if row[r_stream] in streams:
-                i = headers.index('DataStreamR Available')
-                row[i] = 1
-                
-                # 2. Is the recovered parameter (r_param) available?
-                if row[r_param]:
-                    if row[r_param] in parameters:
-                        i = headers.index('ParameterID_R Available')
-                        row[i] = 1
-                        
-                        # 3. Is the recovered parameter (r_param) identified 
-                        # with the stream (r_stream)?
-                        i = parameters.index(row[r_param])
-                        if meta['parameters'][i]['stream'] == row[r_stream]:
-                            i = headers.index('ParameterID_R in Stream')
-                            row[i] = 1
-                        
-                        # See if the parameter (particleKey) is associated with any stream
-                        stream = get_parameter_stream(meta, row[r_param], 'recovered')
-                        
-                        if stream:
-                            i = headers.index('UFrame DataStreamR')  
-                            row[i] = stream
-    
-        elif row[r_param] and row[r_param] in parameters:
-            # If no stream was specified for this test case (row), see if the 
-            # parameter (particleKey) is associated with any stream
-            stream = get_parameter_stream(meta, row[r_param], 'recovered')
-                                
-            if stream:
-                i = headers.index('UFrame DataStreamR')  
-                row[i] = meta['times'][stream_i]['stream']
-                
-        else:
+        # RECOVERED: 1. Is the recovered data stream (r_stream) available?
+        # 2. Is the recovered parameter (r_param) available?  3. Is the
+        # recovered parameter (r_param) identified with the stream (r_stream)?
+        if not test_row_stream(row, index, r_stream, r_param, 'recovered', r_cols):
             sys.stderr.write('{:s}: No recovered stream specified\n'.format(row[refdes]))
             sys.stderr.flush()
             
-        # TELEMETERED
-        if row[t_stream]:
-            
-            # 4. Is the telemetered data stream (t_stream) available?
-            if row[t_stream] in streams:
-                i = headers.index('DataStreamT Available')
-                row[i] = 1
-                
-                # 5. Is the telemetered parameter (t_param) available?
-                if row[t_param]:
-                    if row[t_param] in parameters:
-                        i = headers.index('ParameterID_T Available')
-                        row[i] = 1
-                        
-                        # 6. Is the telemetered parameter (t_param) identifid with the stream (t_stream)
-                        i = parameters.index(row[t_param])
-                        if meta['parameters'][i]['stream'] == row[t_stream]:
-                            i = headers.index('ParameterID_T in Stream')
-                            row[i] = 1
-                        
-                        # See if the parameter (particleKey) is associated with any telemetered stream
-                        stream = get_parameter_stream(meta, row[r_param], 'telemetered')
-                        
-                        if stream:
-                            i = headers.index('UFrame DataStreamT')  
-                            row[i] = stream
-                              
-        elif row[t_param] and row[t_param] in parameters:
-            # If no stream was specified for this test case (row), see if the 
-            # parameter (particleKey) is associated with any stream
-            stream = get_parameter_stream(meta, row[r_param], 'recovered')
-                                
-            if stream:
-                i = headers.index('UFrame DataStreamT')  
-                row[i] = meta['times'][stream_i]['stream']             
-        else:
+        # TELEMETERED: 4-6. As above, for t_stream and t_param
+        if not test_row_stream(row, index, t_stream, t_param, 'telemetered', t_cols):
             sys.stderr.write('{:s}: No telemetered stream specified\n'.format(row[refdes]))
             sys.stderr.flush()
             
@@ -226,31 +168,217 @@ def test_product_availability(test_csv, uframe=None, resultsdir=None, out_csv=No
     
     return out_csv
     
-def get_parameter_stream(metadata, parameter, method=None):
+def fetch_metadata_index(ref_des, uframe):
+    '''
+    Fetch the metadata for the reference designator and return its
+    MetadataIndex, or None if no metadata was found.
+    '''
+    
+    ref_tokens = ref_des.split('-')
+    
+    # Attempt to fetch the metadata
+    meta = get_sensor_metadata(ref_tokens[0], ref_tokens[1], '{:s}-{:s}'.format(ref_tokens[2], ref_tokens[3]), uframe_base=uframe)
+    if not meta:
+        return None
+        
+    # Create the metadata url
+    url = uframe.url + '/{:s}/{:s}/{:s}/metadata'.format(
+        ref_tokens[0],
+        ref_tokens[1],
+        '{:s}-{:s}'.format(ref_tokens[2], ref_tokens[3])
+    ) 
+    
+    return MetadataIndex(meta, url)
+    
+def prefetch_metadata_indexes(ref_des_list, uframe, workers):
+    '''
+    Concurrently fetch the metadata for each reference designator in
+    ref_des_list using at most workers concurrent requests.  Progress and
+    failures are reported in ref_des_list order, as in the serial path.
+    
+    Returns:
+        indexes: dictionary mapping each reference designator to its
+            MetadataIndex, or to None if no metadata was found
+    '''
+    
+    indexes = {}
+    for (ref_des, (meta, errors)) in get_sensor_metadata_many(ref_des_list, uframe_base=uframe, workers=workers, check_sensors=False).items():
+        sys.stdout.write('{:s}: Fetching metadata\n'.format(ref_des))
+        sys.stdout.flush()
+        for error in errors:
+            if error['url']:
+                sys.stderr.write('Request failed: {:s} ({:s})\n'.format(error['reason'], error['url']))
+        sys.stderr.flush()
+        
+        if not meta:
+            indexes[ref_des] = None
+            continue
+            
+        ref_tokens = ref_des.split('-')
+        url = uframe.url + '/{:s}/{:s}/{:s}/metadata'.format(
+            ref_tokens[0],
+            ref_tokens[1],
+            '{:s}-{:s}'.format(ref_tokens[2], ref_tokens[3])
+        )
+        indexes[ref_des] = MetadataIndex(meta, url)
+        
+    return indexes
+    
+def _unique_ref_des(rows, refdes):
+    '''
+    Return the valid reference designators in column refdes of rows, in the
+    order they first appear.
+    '''
+    
+    seen = set()
+    ref_des_list = []
+    for row in rows:
+        ref_des = row[refdes]
+        if ref_des not in seen and len(ref_des.split('-')) == 4:
+            seen.add(ref_des)
+            ref_des_list.append(ref_des)
+            
+    return ref_des_list
+    
+def test_row_stream(row, index, stream_col, param_col, method, result_cols):
+    '''
+    Fill in the stream and parameter test result cells of a test matrix row for
+    a single stream method.
+    
+    Parameters:
+        row: test matrix row
+        index: MetadataIndex of the row's reference designator
+        stream_col: index of the row's expected stream name
+        param_col: index of the row's expected parameter (particleKey)
+        method: stream method prefix (i.e.: recovered, telemetered)
+        result_cols: indices of the row's stream available, parameter available,
+            parameter in stream and uFrame stream result cells
+            
+    Returns:
+        False if the row specifies neither a stream nor a parameter that is
+        available, True otherwise.
+    '''
+    
+    (stream_available, param_available, param_in_stream, stream_found) = result_cols
+    stream = row[stream_col]
+    parameter = row[param_col]
+    
+    if stream:
+        
+        if stream in index.streams:
+            row[stream_available] = 1
+            
+            if parameter and parameter in index.parameter_streams:
+                row[param_available] = 1
+                
+                if index.parameter_in_stream(parameter, stream):
+                    row[param_in_stream] = 1
+                    
+                # See if the parameter (particleKey) is associated with any
+                # stream of the method
+                uframe_stream = index.parameter_stream(parameter, method)
+                if uframe_stream:
+                    row[stream_found] = uframe_stream
+                    
+    elif parameter and parameter in index.parameter_streams:
+        # If no stream was specified for this test case (row), see if the 
+        # parameter (particleKey) is associated with any stream
+        uframe_stream = index.parameter_stream(parameter, method)
+        if uframe_stream:
+            row[stream_found] = uframe_stream
+            
+    else:
+        return False
+        
+    return True
+    
+class MetadataIndex(object):
+    '''
+    Set and dictionary indexes of a sensor metadata record, built once per
+    reference designator so that each test matrix row is checked with constant
+    time lookups.
     
-    parameters = [m['particleKey'] for m in meta['parameters']]
+    Attributes:
+        url: the metadata url
+        streams: set of the names of the available streams
+        parameter_streams: dictionary mapping each parameter (particleKey) to
+            the list of the streams containing it, in metadata order
+        stream_times: dictionary mapping each (stream, method) to its list of
+            metadata 'times' entries
+    '''
     
-    if not parameters:
+    def __init__(self, metadata, url=None):
+        
+        self.url = url
+        self.streams = set()
+        self.stream_times = {}
+        self.parameter_streams = {}
+        
+        self._stream_methods = {}
+        for t in metadata.get('times', []):
+            self.streams.add(t['stream'])
+            key = (t['stream'], t['method'])
+            if key not in self.stream_times:
+                self.stream_times[key] = []
+                self._stream_methods.setdefault(t['stream'], []).append(t['method'])
+            self.stream_times[key].append(t)
+            
+        self._parameter_stream_pairs = set()
+        for p in metadata.get('parameters', []):
+            key = (p['particleKey'], p['stream'])
+            if key not in self._parameter_stream_pairs:
+                self._parameter_stream_pairs.add(key)
+                self.parameter_streams.setdefault(p['particleKey'], []).append(p['stream'])
+                
+        self._parameter_stream = {}
+        
+    def parameter_in_stream(self, parameter, stream):
+        '''
+        Return True if the parameter (particleKey) is identified with the
+        stream: the stream of its first entry in the metadata parameters.
+        '''
+        streams = self.parameter_streams.get(parameter)
+        return bool(streams) and streams[0] == stream
+        
+    def parameter_stream(self, parameter, method=None):
+        '''
+        Return the name of the first available stream containing the parameter
+        (particleKey) whose method starts with method, or None.
+        '''
+        key = (parameter, method)
+        try:
+            return self._parameter_stream[key]
+        except KeyError:
+            pass
+            
+        found = None
+        for stream in self.parameter_streams.get(parameter, ()):
+            for stream_method in self._stream_methods.get(stream, ()):
+                if not method or stream_method.startswith(method):
+                    found = stream
+                    break
+            if found:
+                break
+                
+        self._parameter_stream[key] = found
+        return found
+        
+def get_parameter_stream(metadata, parameter, method=None):
+    '''
+    Return the name of the first available stream in the metadata record
+    containing the parameter (particleKey) whose method starts with method, or
+    None.  Use a MetadataIndex to look up more than one parameter.
+    '''
+    
+    if not metadata.get('parameters'):
         sys.stderr.write('No parameters found in metadata record\n')
         sys.stderr.flush()
-        return []
-    elif parameter in parameters:
+        return None
+        
+    index = MetadataIndex(metadata)
+    if parameter not in index.parameter_streams:
         sys.stderr.write('Parameter not found in metadata record: {:s}\n'.format(parameter))
         sys.stderr.flush()
-        return []
-        
-    particle_streams = [x['stream'] for i,x in enumerate(meta['parameters']) if x['particleKey'] == row[t_param]]
-    stream_i = -1
-    streams = []
-    for stream in particle_streams:
-        if stream_i > -1:
-            break
-        for t in range(len(meta['times'])):
-            if method:
-                if meta['times'][t]['stream'] == stream and meta['times'][t]['method'] == method:
-                    streams.append(meta['times'][t])
-            else:
-                if meta['times'][t]['stream'] == stream:
-                    streams.append(meta['times'][t])
+        return None
         
-        return streams
\ No newline at end of file
+    return index.parameter_stream(parameter, method)
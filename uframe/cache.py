@@ -0,0 +1,302 @@
+"""
+Caches for uFrame inventory and metadata responses.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.getenv('UFRAME_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.uframe', 'cache'))
+
+# Default time to live, in seconds, for each level of the /sensor/inv tree
+DEFAULT_TTLS = {'arrays' : 86400,
+    'platforms' : 86400,
+    'sensors' : 86400,
+    'metadata' : 3600}
+
+# Default maximum size of the on-disk cache, in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Default maximum number of metadata records held in memory
+DEFAULT_METADATA_CACHE_SIZE = 128
+
+
+class InventoryCache(object):
+    """
+    Size-bounded on-disk cache of uFrame /sensor/inv responses.
+
+    Each response body is stored, undecoded, in a single JSON file keyed by
+    the request url, along with the time it was fetched and the ETag and
+    Last-Modified response headers.  Callers decode as much of the body as
+    they need.  An entry younger than the TTL for its level is used without
+    contacting the server.  Older entries are revalidated with a conditional
+    request when the server supplied validators.
+
+    When the cache grows beyond max_bytes, the least recently used entries are
+    removed.
+
+    Args:
+        cache_dir: directory in which to store the cached responses
+        ttls: optional dictionary mapping a level ('arrays', 'platforms',
+            'sensors' or 'metadata') to its time to live, in seconds.  Levels
+            not specified use DEFAULT_TTLS.
+        max_bytes: maximum total size of the cached responses
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self._cache_dir = cache_dir
+        self._ttls = DEFAULT_TTLS.copy()
+        self._ttls.update(ttls or {})
+        self._max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def ttls(self):
+        return self._ttls
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    def get(self, url):
+        """
+        Return the cached entry for url, or None if there is no entry.  Entries
+        are dictionaries containing the url, fetched time, etag, last_modified
+        and body (the JSON response text).  Entries written by earlier versions
+        contain the decoded response (content) instead of body.
+        """
+        path = self._path(url)
+        try:
+            with open(path, 'r') as fid:
+                entry = json.load(fid)
+        except (IOError, ValueError):
+            return None
+
+        if entry.get('url') != url:
+            return None
+
+        # Record the access for least recently used eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return entry
+
+    def is_fresh(self, entry, level):
+        """
+        True if entry is younger than the time to live for level.
+        """
+        return time.time() - entry['fetched'] < self._ttls.get(level, 0)
+
+    def validators(self, entry):
+        """
+        Return the conditional request headers for revalidating entry.
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """
+        Store the JSON response text (body) for url.
+        """
+        entry = {'url' : url,
+            'fetched' : time.time(),
+            'etag' : etag,
+            'last_modified' : last_modified,
+            'body' : body}
+        self._write(url, entry)
+
+    def touch(self, entry):
+        """
+        Mark entry as freshly fetched, after the server confirmed it has not
+        been modified.
+        """
+        entry['fetched'] = time.time()
+        self._write(entry['url'], entry)
+
+    def clear(self):
+        """
+        Remove all cached entries.
+        """
+        with self._lock:
+            for (path, size, mtime) in self._entries():
+                _remove(path)
+            self._size = 0
+
+    def _path(self, url):
+        return os.path.join(self._cache_dir, '{:s}.json'.format(hashlib.sha1(url.encode('utf-8')).hexdigest()))
+
+    def _write(self, url, entry):
+        path = self._path(url)
+
+        # Write to a temporary file and rename it into place so that concurrent
+        # readers never see a partial entry
+        (fd, tmp_path) = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fid:
+                json.dump(entry, fid)
+            size = os.path.getsize(tmp_path)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.rename(tmp_path, path)
+        except (IOError, OSError, TypeError, ValueError):
+            _remove(tmp_path)
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum([e[1] for e in self._entries()])
+            else:
+                self._size += size - old_size
+            if self._size > self._max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self._cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self._cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        # Remove least recently used entries until the cache is at 90% of
+        # max_bytes, so that eviction does not run on every write
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        self._size = sum([e[1] for e in entries])
+        target = self._max_bytes * 0.9
+        for (path, size, mtime) in entries:
+            if self._size <= target:
+                break
+            _remove(path)
+            self._size -= size
+
+    def __repr__(self):
+        return '<InventoryCache(cache_dir={:s})>'.format(self._cache_dir)
+
+
+class MetadataCache(object):
+    """
+    Bounded, thread-safe, least recently used in-memory cache of sensor metadata
+    records, keyed by reference designator.
+
+    Concurrent requests for the same key are coalesced: the first caller fetches
+    the record and the others wait for, and share, its result.  Empty (failed)
+    results are shared with the waiting callers but are not cached.
+
+    Args:
+        max_size: maximum number of records to hold
+    """
+
+    def __init__(self, max_size=DEFAULT_METADATA_CACHE_SIZE):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def get(self, key, fetch):
+        """
+        Return the record for key, calling fetch() to retrieve it if it is not
+        cached and no other thread is already fetching it.
+        """
+        owner = False
+        with self._lock:
+            if key in self._entries:
+                value = self._entries.pop(key)
+                self._entries[key] = value
+                self._hits += 1
+                return value
+
+            flight = self._in_flight.get(key)
+            if flight:
+                self._coalesced += 1
+            else:
+                flight = {'event' : threading.Event(), 'value' : None}
+                self._in_flight[key] = flight
+                self._misses += 1
+                owner = True
+
+        if not owner:
+            flight['event'].wait()
+            return flight['value']
+
+        try:
+            value = fetch()
+            flight['value'] = value
+            if value:
+                with self._lock:
+                    self._entries[key] = value
+                    while len(self._entries) > self._max_size:
+                        self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight['event'].set()
+
+        return value
+
+    def peek(self, key):
+        """
+        Return the cached record for key, or None, without fetching it or
+        updating the statistics.
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return a dictionary containing the cache hits, misses, coalesced
+        requests, current size and maximum size.
+        """
+        with self._lock:
+            return {'hits' : self._hits,
+                'misses' : self._misses,
+                'coalesced' : self._coalesced,
+                'size' : len(self._entries),
+                'max_size' : self._max_size}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '<MetadataCache(size={:d}, max_size={:d})>'.format(len(self._entries), self._max_size)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
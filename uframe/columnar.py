@@ -0,0 +1,204 @@
+"""
+Columnar export of stream maps as NumPy structured arrays (.npz) and Parquet.
+
+NumPy is required for both formats and pyarrow for Parquet.  Neither is required
+by the rest of the package.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+HAVE_NUMPY = np is not None
+HAVE_PYARROW = pyarrow is not None and HAVE_NUMPY
+
+# Dictionary-encoded string columns and the stream map record fields they come
+# from.  Two-token fields are looked up in the record's stream (times) entry.
+STRING_COLUMNS = (('reference_designator', 'stream sensor'),
+    ('stream', 'stream stream'),
+    ('method', 'stream method'),
+    ('parameter', 'particleKey'),
+    ('pdId', 'pdId'),
+    ('units', 'units'),
+    ('shape', 'shape'),
+    ('type', 'type'),
+    ('fillValue', 'fillValue'),
+    ('metadata_url', 'metadata_url'))
+
+# Dictionary-encoded timestamp columns, stored as datetime64[ms]
+TIME_COLUMNS = (('beginTime', 'beginTime'),
+    ('endTime', 'endTime'))
+
+
+class _Column(object):
+    """
+    Dictionary encoder for a single column.
+    """
+
+    def __init__(self):
+        self.codes = []
+        self.categories = []
+        self._index = {}
+
+    def append(self, value):
+        try:
+            code = self._index[value]
+        except KeyError:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+
+def stream_map_columns(stream_maps):
+    """
+    Collect the records of the stream maps into typed, dictionary-encoded
+    columns.
+
+    Args:
+        stream_maps: iterable of stream maps (lists of stream map records), as
+            returned by map_uframe_datastreams.iter_stream_maps
+
+    Returns:
+        (table, categories): table is a NumPy structured array with one row per
+            record.  String columns (see STRING_COLUMNS) are int32 codes into
+            the matching categories array, count is int64, beginTime and
+            endTime are datetime64[ms] and unsigned and calculated are bool.
+            categories maps each string column to its unicode array of values.
+    """
+    strings = [(name, field.split(' '), _Column()) for (name, field) in STRING_COLUMNS]
+    times = [(name, field, _Column()) for (name, field) in TIME_COLUMNS]
+    counts = []
+    unsigned = []
+    calculated = []
+
+    for stream_map in stream_maps:
+        for record in stream_map:
+            stream = record['stream']
+            for (name, tokens, column) in strings:
+                if len(tokens) == 1:
+                    column.append(record[tokens[0]])
+                else:
+                    column.append(stream[tokens[1]])
+            for (name, field, column) in times:
+                column.append(stream.get(field))
+            counts.append(stream.get('count') or 0)
+            unsigned.append(bool(record.get('unsigned')))
+            calculated.append(record['shape'] == 'FUNCTION')
+
+    dtype = [(name, np.int32) for (name, field) in STRING_COLUMNS]
+    dtype.extend([(name, 'datetime64[ms]') for (name, field) in TIME_COLUMNS])
+    dtype.extend([('count', np.int64), ('unsigned', np.bool_), ('calculated', np.bool_)])
+
+    table = np.empty(len(counts), dtype=dtype)
+    categories = {}
+    for (name, tokens, column) in strings:
+        table[name] = column.codes
+        categories[name] = np.array([u'' if c is None else unicode(c) for c in column.categories], dtype=np.unicode_)
+    for (name, field, column) in times:
+        # Parse each distinct timestamp once
+        values = _datetime64(column.categories)
+        table[name] = values[np.array(column.codes, dtype=np.intp)]
+    table['count'] = counts
+    table['unsigned'] = unsigned
+    table['calculated'] = calculated
+
+    return (table, categories)
+
+
+def _datetime64(timestamps):
+    """
+    Convert ISO-8601 UTC timestamps (i.e.: 2014-04-14T23:05:31.335Z) to a
+    datetime64[ms] array.  Missing timestamps are NaT.
+    """
+    values = []
+    for ts in timestamps:
+        if not ts:
+            values.append('NaT')
+        elif ts.endswith('Z'):
+            values.append(ts[:-1])
+        else:
+            values.append(ts)
+    return np.array(values, dtype='datetime64[ms]')
+
+
+def write_npz(stream_maps, path):
+    """
+    Write the stream map records to path as a compressed NumPy .npz archive
+    containing the structured array 'streams' and a '<column>_categories' array
+    for each string column.  See stream_map_columns and load_npz.
+
+    Returns:
+        count: number of records written
+    """
+    (table, categories) = stream_map_columns(stream_maps)
+
+    arrays = {'streams' : table}
+    for (name, values) in categories.items():
+        arrays['{:s}_categories'.format(name)] = values
+    np.savez_compressed(path, **arrays)
+
+    return len(table)
+
+
+def load_npz(path):
+    """
+    Load a stream map archive written by write_npz.
+
+    Filtering is vectorized on the integer codes and typed columns.  For
+    example, all telemetered streams with more than 1000 records:
+
+        (table, categories) = load_npz('streams.npz')
+        code = categories['method'].tolist().index(u'telemetered')
+        rows = table[(table['method'] == code) & (table['count'] > 1000)]
+        ref_des = categories['reference_designator'][rows['reference_designator']]
+
+    Returns:
+        (table, categories): see stream_map_columns
+    """
+    archive = np.load(path)
+    try:
+        table = archive['streams']
+        categories = {}
+        for (name, field) in STRING_COLUMNS:
+            categories[name] = archive['{:s}_categories'.format(name)]
+    finally:
+        archive.close()
+
+    return (table, categories)
+
+
+def write_parquet(stream_maps, path):
+    """
+    Write the stream map records to path as a Parquet file.  String columns are
+    dictionary-encoded, beginTime and endTime are millisecond timestamps and
+    count is int64.
+
+    Returns:
+        count: number of records written
+    """
+    (table, categories) = stream_map_columns(stream_maps)
+
+    names = []
+    arrays = []
+    for (name, field) in STRING_COLUMNS:
+        names.append(name)
+        arrays.append(pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(table[name]),
+            pyarrow.array(categories[name], type=pyarrow.string())))
+    for (name, field) in TIME_COLUMNS:
+        names.append(name)
+        arrays.append(pyarrow.array(table[name], type=pyarrow.timestamp('ms')))
+    for name in ('count', 'unsigned', 'calculated'):
+        names.append(name)
+        arrays.append(pyarrow.array(table[name]))
+
+    pyarrow.parquet.write_table(pyarrow.Table.from_arrays(arrays, names=names), path)
+
+    return len(table)
@@ -0,0 +1,192 @@
+"""
+Concurrent crawler for the uFrame /sensor/inv tree (arrays -> platforms -> sensors
+-> metadata).
+"""
+
+import threading
+from collections import deque
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+from uframe import UFrame, get_arrays, get_platforms, get_platform_sensors, get_sensor_metadata
+
+_crawl_levels = ('platforms', 'sensors', 'metadata')
+
+
+class InventoryCrawler(object):
+    """
+    Crawl the uFrame inventory tree using a bounded pool of worker threads.
+
+    The levels of the tree are fetched as a pipeline: each sensor's metadata is
+    requested as soon as its platform's sensor list arrives, while the later
+    platform and sensor lists are still being fetched, so sensor records stream
+    out as the crawl goes.  Results are always returned in the order uFrame
+    lists the arrays, platforms and sensors, regardless of the order in which
+    the requests complete.
+
+    Failed requests and empty branches do not stop the crawl.  They are recorded
+    in errors as dictionaries containing the level, reference designator, url,
+    response code and reason.
+
+    Args:
+        uframe_base: UFrame instance to crawl
+        workers: size of the worker pool.  1 crawls serially in the calling thread.
+        fanout: optional dictionary mapping a level ('platforms', 'sensors' or
+            'metadata') to the maximum number of concurrent requests for that
+            level.  Levels not specified may use all workers.
+    """
+
+    def __init__(self, uframe_base=None, workers=1, fanout=None):
+        self._uframe_base = uframe_base or UFrame()
+        self._workers = max(1, workers)
+        fanout = fanout or {}
+        self._limits = {}
+        for level in _crawl_levels:
+            n = min(fanout.get(level) or self._workers, self._workers)
+            self._limits[level] = threading.BoundedSemaphore(max(1, n))
+        self.errors = []
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def crawl(self, arrays=None, subsite=None, metadata=True):
+        """
+        Crawl the inventory tree and return the list of sensor records.  See
+        iter_crawl.
+        """
+        return list(self.iter_crawl(arrays=arrays, subsite=subsite, metadata=metadata))
+
+    def iter_crawl(self, arrays=None, subsite=None, metadata=True):
+        """
+        Crawl the inventory tree, yielding each sensor record as soon as it, and
+        all of the records before it, are available.  Only a bounded number of
+        platform lists, sensor lists and metadata records are fetched ahead of
+        the consumer.
+
+        Args:
+            arrays: list of array names to crawl.  All arrays are crawled if not
+                specified.
+            subsite: restrict the crawl to the specified platform
+            metadata: set to False to stop at the sensor level and not fetch the
+                sensor metadata records
+
+        Yields:
+            sensor: dictionary containing the array, platform, sensor, ref_des,
+                metadata_url and, if requested, the metadata record (None if it
+                could not be fetched).
+        """
+        self.errors = []
+
+        if arrays is None:
+            errors = []
+            arrays = get_arrays(uframe_base=self._uframe_base, errors=errors)
+            self._add_errors('arrays', None, errors)
+
+        pool = ThreadPool(self._workers) if self._workers > 1 else None
+        try:
+            # Each level lazily consumes the branches produced by the level
+            # above it
+            platform_lists = self._imap(pool, 'platforms', self._fetch_platforms, ((a,) for a in arrays))
+            platforms = ((array, platform) for ((array,), array_platforms) in platform_lists
+                for platform in array_platforms if not subsite or subsite == platform)
+            sensor_lists = self._imap(pool, 'sensors', self._fetch_sensors, platforms)
+            sensors = ((array, platform, sensor) for ((array, platform), platform_sensors) in sensor_lists
+                for sensor in platform_sensors)
+
+            if not metadata:
+                for branch in sensors:
+                    yield self._sensor_record(*branch)
+                return
+
+            for (branch, meta) in self._imap(pool, 'metadata', self._fetch_metadata, sensors):
+                record = self._sensor_record(*branch)
+                record['metadata'] = meta
+                yield record
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+    def _sensor_record(self, array, platform, sensor):
+        return {'array' : array,
+            'platform' : platform,
+            'sensor' : sensor,
+            'ref_des' : '{:s}-{:s}-{:s}'.format(array, platform, sensor),
+            'metadata_url' : '{:s}/{:s}/{:s}/{:s}/metadata'.format(
+                self._uframe_base.url,
+                array,
+                platform,
+                sensor)}
+
+    def _imap(self, pool, level, func, branches):
+        """
+        Lazily apply func to each branch, yielding (branch, value) tuples in
+        order and merging the per-branch errors.  At most 2 x workers branches
+        are submitted ahead of the value being yielded.
+        """
+        def task(branch):
+            with self._limits[level]:
+                return func(*branch)
+
+        if pool:
+            pending = deque()
+            branches = iter(branches)
+            for branch in islice(branches, 2 * self._workers):
+                pending.append((branch, pool.apply_async(task, (branch,))))
+            while pending:
+                (branch, result) = pending.popleft()
+                (value, errors) = result.get()
+                for next_branch in islice(branches, 1):
+                    pending.append((next_branch, pool.apply_async(task, (next_branch,))))
+                self._add_errors(level, '-'.join(branch), errors)
+                yield (branch, value)
+        else:
+            for branch in branches:
+                (value, errors) = task(branch)
+                self._add_errors(level, '-'.join(branch), errors)
+                yield (branch, value)
+
+    def _add_errors(self, level, ref_des, errors):
+        for error in errors:
+            error['level'] = level
+            error['ref_des'] = ref_des
+            self.errors.append(error)
+
+    def _fetch_platforms(self, array):
+        errors = []
+        platforms = get_platforms(array, uframe_base=self._uframe_base, errors=errors)
+        if not platforms and not errors:
+            errors.append(_empty_branch('Array contains no platforms'))
+        return (platforms, errors)
+
+    def _fetch_sensors(self, array, platform):
+        errors = []
+        sensors = get_platform_sensors(array, platform, uframe_base=self._uframe_base, errors=errors)
+        if not sensors and not errors:
+            errors.append(_empty_branch('Platform contains no sensors'))
+        return (sensors, errors)
+
+    def _fetch_metadata(self, array, platform, sensor):
+        errors = []
+        meta = get_sensor_metadata(array, platform, sensor, uframe_base=self._uframe_base, errors=errors)
+        if not meta:
+            if not errors:
+                errors.append(_empty_branch('No metadata found'))
+            meta = None
+        return (meta, errors)
+
+
+def _empty_branch(reason):
+    return {'url' : None, 'code' : None, 'reason' : reason}
+
+
+def crawl_inventory(uframe_base=None, arrays=None, subsite=None, metadata=True, workers=1, fanout=None):
+    """
+    Convenience wrapper around InventoryCrawler.crawl.
+
+    Returns:
+        (sensors, errors): the sensor records and the per-branch errors
+    """
+    crawler = InventoryCrawler(uframe_base, workers=workers, fanout=fanout)
+    sensors = crawler.crawl(arrays=arrays, subsite=subsite, metadata=metadata)
+    return (sensors, crawler.errors)
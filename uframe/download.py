@@ -0,0 +1,157 @@
+"""
+Concurrent execution of uFrame time-bound stream downloads.
+"""
+
+import sys
+import time
+import threading
+from urlparse import urlparse
+from multiprocessing.pool import ThreadPool
+from uframe import fetch_uframe_time_bound_stream
+
+
+class DownloadExecutor(object):
+    """
+    Run fetch_uframe_time_bound_stream requests on a bounded pool of workers.
+
+    At most parallel transfers are in flight at once, and at most per_host of
+    those to any one uFrame host.  While downloads are running, the aggregate
+    throughput is periodically written to stream.
+
+    The executor is the consumer side of a producer/consumer pipeline: the
+    caller can keep discovering and submitting downloads while earlier ones
+    run.  At most queue_depth downloads wait for a worker; beyond that, submit
+    blocks until one completes, so discovery never runs far ahead of the
+    downloads.
+
+    Args:
+        parallel: maximum number of concurrent transfers
+        per_host: maximum number of concurrent transfers to a single host.
+            Defaults to parallel.
+        report_interval: seconds between throughput reports.  Set to 0 to
+            disable reporting.
+        stream: file-like object to write the throughput reports to
+        queue_depth: maximum number of submitted downloads waiting for a
+            worker.  Defaults to 2 x parallel.
+    """
+
+    def __init__(self, parallel=4, per_host=None, report_interval=5, stream=sys.stdout, queue_depth=None):
+        self._parallel = max(1, parallel)
+        self._queue_depth = max(0, queue_depth if queue_depth is not None else 2 * self._parallel)
+        self._slots = threading.BoundedSemaphore(self._parallel + self._queue_depth)
+        self._blocked_time = 0.0
+        self._per_host = max(1, per_host or self._parallel)
+        self._report_interval = report_interval
+        self._stream = stream
+        self._pool = ThreadPool(self._parallel)
+        self._results = []
+        self._limiter = None
+        self._host_limits = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._active = 0
+        self._completed = 0
+        self._start_time = None
+        self._reporter = None
+        self._done = threading.Event()
+
+    @property
+    def parallel(self):
+        return self._parallel
+
+    @property
+    def queue_depth(self):
+        return self._queue_depth
+
+    @property
+    def blocked_time(self):
+        """
+        Total seconds submit spent waiting for the queue to drain.
+        """
+        return self._blocked_time
+
+    def submit(self, **kwargs):
+        """
+        Queue a download, blocking while queue_depth downloads are already
+        waiting.  kwargs are passed to fetch_uframe_time_bound_stream.
+        """
+        if not self._slots.acquire(False):
+            start_time = time.time()
+            self._slots.acquire()
+            self._blocked_time += time.time() - start_time
+
+        if self._start_time is None:
+            self._start_time = time.time()
+            if self._report_interval:
+                self._reporter = threading.Thread(target=self._report)
+                self._reporter.daemon = True
+                self._reporter.start()
+
+        self._limiter = kwargs['uframe_base'].data_limiter
+        host = urlparse(kwargs['uframe_base'].url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self._per_host)
+            limit = self._host_limits[host]
+
+        kwargs['progress'] = self._progress
+        self._results.append(self._pool.apply_async(self._fetch, (limit, kwargs)))
+
+    def results(self):
+        """
+        Wait for all queued downloads and return their fetched_url records in
+        the order they were submitted.
+        """
+        fetched_urls = [r.get() for r in self._results]
+        self.close()
+        return fetched_urls
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        self._done.set()
+        if self._reporter:
+            self._reporter.join()
+            self._reporter = None
+            self._write_report()
+
+    def throughput(self):
+        """
+        Return the aggregate throughput, in bytes per second, since the first
+        download was submitted.
+        """
+        if self._start_time is None:
+            return 0.0
+        elapsed = time.time() - self._start_time
+        return self._bytes / elapsed if elapsed > 0 else 0.0
+
+    def _fetch(self, limit, kwargs):
+        with limit:
+            with self._lock:
+                self._active += 1
+            try:
+                return fetch_uframe_time_bound_stream(**kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+                self._slots.release()
+
+    def _progress(self, num_bytes):
+        with self._lock:
+            self._bytes += num_bytes
+
+    def _report(self):
+        while not self._done.wait(self._report_interval):
+            self._write_report()
+
+    def _write_report(self):
+        self._stream.write('Downloads: {:d} active, {:d} queued, {:d}/{:d} complete, {:0.1f} MB, {:0.2f} MB/sec, concurrency limit {:d}\n'.format(
+            self._active,
+            len(self._results) - self._completed - self._active,
+            self._completed,
+            len(self._results),
+            self._bytes / 1048576.,
+            self.throughput() / 1048576.,
+            self._limiter.limit))
+        self._stream.flush()
@@ -0,0 +1,127 @@
+"""
+JSON decoding backends.
+"""
+
+import re
+import json
+from collections import OrderedDict
+
+# Installed decoders, fastest first
+_backend_modules = OrderedDict()
+for _name in ('ujson', 'simplejson'):
+    try:
+        _backend_modules[_name] = __import__(_name)
+    except ImportError:
+        pass
+_backend_modules['json'] = json
+
+# Patterns matching a JSON string, everything up to the next bracket outside
+# a string, the rest of a scalar value and whitespace
+_string = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_to_bracket = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+_scalar = re.compile(r'[^,\]}\s]*')
+_whitespace = re.compile(r'\s*')
+
+
+class JSONBackend(object):
+    """
+    A named JSON decoder.
+
+    Args:
+        name: 'ujson', 'simplejson', 'json' (the standard library) or 'auto'
+            (the fastest installed decoder).  If not specified, the standard
+            library is used.  The faster decoders may parse floating point
+            values differently, so they must be chosen explicitly.
+    """
+
+    def __init__(self, name=None):
+        if name is None:
+            name = 'json'
+        elif name == 'auto':
+            name = _backend_modules.keys()[0]
+        if name not in _backend_modules:
+            raise ValueError('JSON backend not installed: {:s}'.format(name))
+        self._name = name
+        self.loads = _backend_modules[name].loads
+
+    @property
+    def name(self):
+        return self._name
+
+    def loads_members(self, s, names):
+        """
+        Decode only the named members of the JSON object s.  The values of the
+        other members are skipped without building them, so that a caller that
+        needs, e.g., the times of a metadata response does not pay for its
+        parameters.  Returns a dictionary of the named members found in s.
+        Raises ValueError if s is not a JSON object.
+        """
+        members = {}
+        idx = _whitespace.match(s).end()
+        if s[idx:idx + 1] != '{':
+            raise ValueError('Expecting object: char {:d}'.format(idx))
+        idx = _whitespace.match(s, idx + 1).end()
+        if s[idx:idx + 1] == '}':
+            return members
+
+        while True:
+            match = _string.match(s, idx)
+            if not match:
+                raise ValueError('Expecting property name: char {:d}'.format(idx))
+            name = json.loads(match.group())
+            idx = _whitespace.match(s, match.end()).end()
+            if s[idx:idx + 1] != ':':
+                raise ValueError('Expecting : delimiter: char {:d}'.format(idx))
+            start = _whitespace.match(s, idx + 1).end()
+            end = _value_end(s, start)
+            if name in names:
+                members[name] = self.loads(s[start:end])
+                if len(members) == len(names):
+                    return members
+            idx = _whitespace.match(s, end).end()
+            delimiter = s[idx:idx + 1]
+            if delimiter == '}':
+                return members
+            elif delimiter != ',':
+                raise ValueError('Expecting , delimiter: char {:d}'.format(idx))
+            idx = _whitespace.match(s, idx + 1).end()
+
+    def __repr__(self):
+        return '<JSONBackend(name={:s})>'.format(self._name)
+
+
+def _value_end(s, idx):
+    """
+    Return the index following the JSON value that starts at s[idx], found by
+    matching its brackets rather than decoding it.
+    """
+    first = s[idx:idx + 1]
+    if first == '"':
+        match = _string.match(s, idx)
+        if not match:
+            raise ValueError('Unterminated string: char {:d}'.format(idx))
+        return match.end()
+    elif first not in ('[', '{'):
+        return _scalar.match(s, idx).end()
+
+    (start, depth) = (idx, 0)
+    while True:
+        c = s[idx:idx + 1]
+        if c in ('[', '{'):
+            depth += 1
+        elif c in (']', '}'):
+            depth -= 1
+            if not depth:
+                return idx + 1
+        else:
+            # End of s, or an unterminated string
+            break
+        idx = _to_bracket.match(s, idx + 1).end()
+    raise ValueError('Unterminated {:s}: char {:d}'.format('array' if first == '[' else 'object', start))
+
+
+def available_backends():
+    """
+    Return the names of the installed JSON decoders, fastest first.
+    """
+    return _backend_modules.keys()
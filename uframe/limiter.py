@@ -0,0 +1,190 @@
+"""
+Adaptive (AIMD) limit on the number of concurrent requests made to a uFrame
+instance, and jittered backoff for retried requests.
+"""
+
+import random
+import threading
+
+# Statuses of overloaded responses, which are retried and cut the limit, in
+# addition to all 5xx responses and requests that failed without a response
+_overload_status = (429,)
+
+# Default jittered backoff parameters, in seconds
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_CAP = 30.0
+
+
+def is_overloaded(status):
+    """
+    Return True if status (an HTTP status code, or uframe.metrics.STATUS_ERROR
+    for a request that failed without a response) indicates an overloaded or
+    unreachable server, whose requests should be retried.
+    """
+    if not isinstance(status, int):
+        return True
+    return status >= 500 or status in _overload_status
+
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF_BASE, cap=DEFAULT_BACKOFF_CAP):
+    """
+    Return the number of seconds to wait before retry number attempt (starting
+    at 1): a random delay between 0 and base * 2^(attempt - 1), capped at cap
+    ("full jitter"), so that clients which failed together do not retry together.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class AdaptiveLimiter(object):
+    """
+    Additive-increase/multiplicative-decrease limit on the number of requests
+    in flight.
+
+    Each request acquires a slot before it is sent and releases it, with its
+    latency and whether the server was overloaded, once it completes.  While
+    requests succeed with a latency close to the usual latency of their
+    endpoint, the limit grows by 1 for every limit requests.  A timeout, a 5xx
+    (or 429) response or a latency spike multiplies the limit by backoff.  The
+    limit is cut at most once for the requests that were in flight together,
+    so a burst of failures from one overloaded moment counts as one signal.
+
+    Args:
+        maximum: upper bound of the limit.  Should not exceed the number of
+            workers or pooled connections making the requests.
+        initial: initial limit.  Defaults to maximum.
+        minimum: lower bound of the limit
+        backoff: factor the limit is multiplied by when the server is overloaded
+        latency_tolerance: a request is a latency spike if it takes longer than
+            latency_tolerance times the usual latency of its endpoint, and at
+            least latency_floor seconds longer
+        latency_floor: see latency_tolerance
+        smoothing: weight of each new latency in the exponential moving average
+            used as the usual latency of an endpoint
+        metrics: optional uframe.metrics.RequestMetrics in which the limit and
+            number of requests in flight are published as gauges
+        name: name of the requests the limit applies to (i.e.: 'data'), used
+            as a prefix of the gauge names and in the log messages
+        stream: file-like object to which limit changes are written.  Defaults
+            to None, which does not log them.
+    """
+
+    def __init__(self, maximum, initial=None, minimum=1, backoff=0.5, latency_tolerance=3.0, latency_floor=0.25,
+                 smoothing=0.1, metrics=None, stream=None, name=None):
+        self._maximum = max(1, maximum)
+        self._minimum = max(1, min(minimum, self._maximum))
+        initial = self._maximum if initial is None else initial
+        self._limit = float(max(self._minimum, min(initial, self._maximum)))
+        self._backoff = backoff
+        self._latency_tolerance = latency_tolerance
+        self._latency_floor = latency_floor
+        self._smoothing = smoothing
+        self._metrics = metrics
+        self._stream = stream
+        self._name = name
+        self._in_flight = 0
+        self._acquired = 0
+        self._last_decrease = 0
+        self._latencies = {}
+        self._condition = threading.Condition(threading.Lock())
+        self._publish()
+
+    @property
+    def limit(self):
+        """
+        Current maximum number of requests in flight.
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def stream(self):
+        """
+        File-like object to which limit changes are written, or None.
+        """
+        return self._stream
+    @stream.setter
+    def stream(self, stream):
+        self._stream = stream
+
+    @property
+    def minimum(self):
+        return self._minimum
+
+    @property
+    def maximum(self):
+        return self._maximum
+
+    def acquire(self):
+        """
+        Block until a request may be sent.  Returns a ticket to pass to release.
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+            self._acquired += 1
+            self._publish()
+            return self._acquired
+
+    def release(self, ticket, endpoint, latency=None, overloaded=False):
+        """
+        Release the slot of a completed request and adjust the limit.
+
+        Args:
+            ticket: value returned by acquire
+            endpoint: endpoint kind of the request (i.e.: 'metadata')
+            latency: request latency, in seconds, or None if unknown
+            overloaded: True if the request timed out or the server returned a
+                5xx (or 429) response
+        """
+        with self._condition:
+            self._in_flight -= 1
+            reason = None
+            if overloaded:
+                reason = 'server overloaded'
+            elif latency is not None:
+                usual = self._latencies.get(endpoint)
+                if usual is None:
+                    self._latencies[endpoint] = latency
+                else:
+                    if latency > usual * self._latency_tolerance and latency - usual > self._latency_floor:
+                        reason = '{:s} latency {:0.2f}s, usual {:0.2f}s'.format(endpoint, latency, usual)
+                    self._latencies[endpoint] = usual + self._smoothing * (latency - usual)
+
+            previous = int(self._limit)
+            if reason:
+                # Only cut once for the requests that were in flight together
+                if ticket > self._last_decrease:
+                    self._limit = max(self._minimum, self._limit * self._backoff)
+                    self._last_decrease = self._acquired
+            else:
+                self._limit = min(self._maximum, self._limit + 1.0 / self._limit)
+
+            if int(self._limit) != previous:
+                self._log('uFrame {:s}concurrency limit {:s} to {:d}{:s}\n'.format(
+                    '{:s} '.format(self._name) if self._name else '',
+                    'decreased' if reason else 'increased', int(self._limit), ' ({:s})'.format(reason) if reason else ''))
+            self._publish()
+            self._condition.notify_all()
+
+    def _publish(self):
+        if self._metrics is not None:
+            prefix = '{:s}_'.format(self._name) if self._name else ''
+            self._metrics.set_gauge('{:s}concurrency_limit'.format(prefix), int(self._limit))
+            self._metrics.set_gauge('{:s}requests_in_flight'.format(prefix), self._in_flight)
+
+    def _log(self, message):
+        if self._stream:
+            self._stream.write(message)
+            self._stream.flush()
+
+    def __repr__(self):
+        return '<AdaptiveLimiter(name={:s}, limit={:d}, min={:d}, max={:d})>'.format(
+            self._name or '', self.limit, self._minimum, self._maximum)
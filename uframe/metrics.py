@@ -0,0 +1,236 @@
+"""
+Request counters and latency histograms for a UFrame instance, exportable as
+JSON or Prometheus text.
+"""
+
+import sys
+import json
+import atexit
+import threading
+
+# Endpoint kinds
+ENDPOINTS = ('arrays', 'platforms', 'sensors', 'metadata', 'data')
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Status recorded for requests that failed without a response (i.e.: timeouts
+# and connection errors)
+STATUS_ERROR = 'error'
+
+
+class _Histogram(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for (i, bound) in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        cumulative = []
+        total = 0
+        for (bound, count) in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            cumulative.append([bound, total])
+        return {'count' : self.count, 'sum' : self.sum, 'buckets' : cumulative}
+
+
+class _EndpointMetrics(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.status = {}
+        self.bytes = 0
+        self.retries = 0
+        self.cache = {}
+        self.latency = _Histogram()
+
+    def to_dict(self):
+        return {'requests' : self.requests,
+            'status' : dict((str(k), v) for (k, v) in self.status.items()),
+            'bytes' : self.bytes,
+            'retries' : self.retries,
+            'cache' : dict(self.cache),
+            'latency' : self.latency.to_dict()}
+
+
+class RequestMetrics(object):
+    """
+    Thread-safe per-endpoint request metrics.
+
+    For each endpoint kind (see ENDPOINTS), the number of requests, responses
+    by status code, bytes received, retries, cache outcomes and a histogram of
+    the request latencies are kept.  Data requests are also totalled by stream
+    so that the most expensive streams can be found.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = dict((e, _EndpointMetrics()) for e in ENDPOINTS)
+            self._streams = {}
+            self._gauges = {}
+
+    def _endpoint(self, endpoint):
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints[endpoint] = _EndpointMetrics()
+        return metrics
+
+    def record_request(self, endpoint, status, elapsed, num_bytes=0, stream=None):
+        """
+        Record a completed request.
+
+        Args:
+            endpoint: endpoint kind (i.e.: 'metadata')
+            status: HTTP status code, or STATUS_ERROR if no response was received
+            elapsed: request time, in seconds
+            num_bytes: number of response bytes received
+            stream: stream name of a data request
+        """
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics.requests += 1
+            metrics.status[status] = metrics.status.get(status, 0) + 1
+            metrics.bytes += num_bytes
+            metrics.latency.observe(elapsed)
+            if stream:
+                totals = self._streams.get(stream)
+                if totals is None:
+                    totals = self._streams[stream] = {'requests' : 0, 'seconds' : 0.0, 'bytes' : 0}
+                totals['requests'] += 1
+                totals['seconds'] += elapsed
+                totals['bytes'] += num_bytes
+
+    def record_retry(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint).retries += 1
+
+    def record_cache(self, endpoint, outcome):
+        """
+        Record a cache outcome ('fresh', 'revalidated', 'miss' or 'memory')
+        for a request.
+        """
+        with self._lock:
+            cache = self._endpoint(endpoint).cache
+            cache[outcome] = cache.get(outcome, 0) + 1
+
+    def set_gauge(self, name, value):
+        """
+        Set the current value of a gauge (i.e.: 'concurrency_limit').
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def to_dict(self):
+        """
+        Return a snapshot of the metrics as a dictionary.
+        """
+        with self._lock:
+            return {'endpoints' : dict((e, m.to_dict()) for (e, m) in self._endpoints.items()),
+                'streams' : dict((s, dict(t)) for (s, t) in self._streams.items()),
+                'gauges' : dict(self._gauges)}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=1, sort_keys=True)
+
+    def to_prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        snapshot = self.to_dict()
+        endpoints = sorted(snapshot['endpoints'].items())
+        lines = []
+
+        def metric(name, metric_type, help_text):
+            lines.append('# HELP {:s} {:s}'.format(name, help_text))
+            lines.append('# TYPE {:s} {:s}'.format(name, metric_type))
+
+        metric('uframe_requests_total', 'counter', 'Requests by endpoint and response status.')
+        for (endpoint, m) in endpoints:
+            for (status, count) in sorted(m['status'].items()):
+                lines.append('uframe_requests_total{{endpoint="{:s}",status="{:s}"}} {:d}'.format(endpoint, status, count))
+
+        metric('uframe_received_bytes_total', 'counter', 'Response bytes received by endpoint.')
+        for (endpoint, m) in endpoints:
+            lines.append('uframe_received_bytes_total{{endpoint="{:s}"}} {:d}'.format(endpoint, m['bytes']))
+
+        metric('uframe_retries_total', 'counter', 'Retried requests by endpoint.')
+        for (endpoint, m) in endpoints:
+            lines.append('uframe_retries_total{{endpoint="{:s}"}} {:d}'.format(endpoint, m['retries']))
+
+        metric('uframe_cache_total', 'counter', 'Cache outcomes by endpoint.')
+        for (endpoint, m) in endpoints:
+            for (outcome, count) in sorted(m['cache'].items()):
+                lines.append('uframe_cache_total{{endpoint="{:s}",outcome="{:s}"}} {:d}'.format(endpoint, outcome, count))
+
+        metric('uframe_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+        for (endpoint, m) in endpoints:
+            for (bound, count) in m['latency']['buckets']:
+                le = bound if isinstance(bound, basestring) else repr(bound)
+                lines.append('uframe_request_duration_seconds_bucket{{endpoint="{:s}",le="{:s}"}} {:d}'.format(endpoint, le, count))
+            lines.append('uframe_request_duration_seconds_sum{{endpoint="{:s}"}} {:s}'.format(endpoint, repr(m['latency']['sum'])))
+            lines.append('uframe_request_duration_seconds_count{{endpoint="{:s}"}} {:d}'.format(endpoint, m['latency']['count']))
+
+        metric('uframe_stream_duration_seconds_total', 'counter', 'Total data request time by stream.')
+        for (stream, totals) in sorted(snapshot['streams'].items()):
+            lines.append('uframe_stream_duration_seconds_total{{stream="{:s}"}} {:s}'.format(stream, repr(totals['seconds'])))
+
+        metric('uframe_stream_received_bytes_total', 'counter', 'Data bytes received by stream.')
+        for (stream, totals) in sorted(snapshot['streams'].items()):
+            lines.append('uframe_stream_received_bytes_total{{stream="{:s}"}} {:d}'.format(stream, totals['bytes']))
+
+        for (name, value) in sorted(snapshot['gauges'].items()):
+            metric('uframe_{:s}'.format(name), 'gauge', 'Current {:s}.'.format(name.replace('_', ' ')))
+            lines.append('uframe_{:s} {:s}'.format(name, repr(value)))
+
+        return '\n'.join(lines) + '\n'
+
+    def __repr__(self):
+        with self._lock:
+            return '<RequestMetrics(requests={:d})>'.format(sum(m.requests for m in self._endpoints.values()))
+
+
+def write_metrics(metrics, path):
+    """
+    Write metrics to path: as Prometheus text if path ends with .prom or .txt,
+    JSON otherwise.  A path of '-' writes JSON to STDERR.
+    """
+    if path == '-':
+        sys.stderr.write(metrics.to_json())
+        sys.stderr.write('\n')
+        sys.stderr.flush()
+        return
+
+    if path.endswith('.prom') or path.endswith('.txt'):
+        content = metrics.to_prometheus()
+    else:
+        content = metrics.to_json() + '\n'
+
+    try:
+        with open(path, 'w') as fid:
+            fid.write(content)
+    except IOError as e:
+        sys.stderr.write('Failed to write metrics file {:s}: {:s}\n'.format(path, str(e)))
+        sys.stderr.flush()
+
+
+def write_metrics_at_exit(metrics, path):
+    """
+    Write metrics to path (see write_metrics) when the interpreter exits.
+    """
+    atexit.register(write_metrics, metrics, path)
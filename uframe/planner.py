@@ -0,0 +1,77 @@
+"""
+Planning of large time-bound stream requests as a series of smaller requests.
+"""
+
+import math
+import datetime
+from uframe.timeutil import parse_iso8601, format_iso8601
+
+# Default target number of records per chunked request
+DEFAULT_CHUNK_RECORDS = 500000
+
+_one_millisecond = datetime.timedelta(milliseconds=1)
+
+
+def plan_time_chunks(begin_datetime, end_datetime, stream_times, chunk_records=DEFAULT_CHUNK_RECORDS, max_chunks=None):
+    """
+    Split the request window [begin_datetime, end_datetime] into consecutive,
+    non-overlapping windows that each contain roughly chunk_records records.
+
+    The number of records in the window is estimated from the stream's metadata
+    times entry (beginTime, endTime and count), assuming records are evenly
+    distributed over the life of the stream.  Each chunk after the first begins
+    1 millisecond after the end of the previous chunk so that no record is
+    requested twice.
+
+    Args:
+        begin_datetime: ISO-8601 request start time
+        end_datetime: ISO-8601 request end time
+        stream_times: the stream's entry from the metadata 'times' array
+        chunk_records: target number of records per chunk
+        max_chunks: optional maximum number of chunks
+
+    Returns:
+        chunks: list of (begin_datetime, end_datetime) ISO-8601 strings, in
+            time order.  The request window is returned as a single chunk if it
+            does not need to be split.
+    """
+    dt0 = parse_iso8601(begin_datetime)
+    dt1 = parse_iso8601(end_datetime)
+    stream_dt0 = parse_iso8601(stream_times['beginTime'])
+    stream_dt1 = parse_iso8601(stream_times['endTime'])
+
+    window = _total_seconds(dt1 - dt0)
+    stream_duration = _total_seconds(stream_dt1 - stream_dt0)
+    if window <= 0 or stream_duration <= 0 or chunk_records <= 0:
+        return [(begin_datetime, end_datetime)]
+
+    # Estimated number of records in the request window
+    num_records = stream_times['count'] * min(window / stream_duration, 1.0)
+    num_chunks = int(math.ceil(num_records / float(chunk_records)))
+    if max_chunks:
+        num_chunks = min(num_chunks, max_chunks)
+    # Don't split the window into chunks shorter than 1 second
+    num_chunks = min(num_chunks, int(window))
+    if num_chunks <= 1:
+        return [(begin_datetime, end_datetime)]
+
+    step = datetime.timedelta(seconds=window / num_chunks)
+    chunks = []
+    chunk_dt0 = dt0
+    for i in range(num_chunks):
+        if i == num_chunks - 1:
+            chunks.append((format_iso8601(chunk_dt0), end_datetime))
+            break
+        chunk_dt1 = dt0 + step * (i + 1)
+        chunks.append((format_iso8601(chunk_dt0), format_iso8601(chunk_dt1)))
+        chunk_dt0 = chunk_dt1 + _one_millisecond
+
+    # Keep the caller's exact start time
+    chunks[0] = (begin_datetime, chunks[0][1])
+
+    return chunks
+
+
+def _total_seconds(delta):
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+
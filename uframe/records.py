@@ -0,0 +1,184 @@
+"""
+Compact records for stream map rows.
+"""
+
+_string_types = (str, unicode)
+
+# Record key order tuple -> (key order, keys not stored in slots)
+_key_orders = {}
+
+# Parameter fields stored in slots.  Any other parameter fields are kept in a
+# per-record dictionary.
+_parameter_fields = ('particleKey',
+    'pdId',
+    'units',
+    'shape',
+    'fillValue',
+    'type',
+    'unsigned')
+
+# Metadata 'times' entry fields that repeat across records
+_times_fields = ('stream', 'method', 'sensor')
+
+
+def intern_string(value, table):
+    """
+    Return the canonical copy of value in table (a dictionary) so that equal
+    strings repeated across many records share a single object.  Unlike the
+    intern builtin, this also works for the unicode strings returned by the JSON
+    decoder, and the strings are released with the table.  Values that are not
+    strings are returned unchanged.
+    """
+    if type(value) in _string_types:
+        return table.setdefault(value, value)
+    return value
+
+
+def intern_stream_times(times, table):
+    """
+    Replace the repeated string values of a metadata 'times' entry with their
+    interned copies in table, in place, and return the entry.
+    """
+    for key in _times_fields:
+        if key in times:
+            times[key] = intern_string(times[key], table)
+    return times
+
+
+def _record_keys(parameter):
+    """
+    Return the shared record key order for the parameter entry and the keys
+    that are not stored in slots.
+    """
+    keys = tuple(parameter)
+    try:
+        return _key_orders[keys]
+    except KeyError:
+        pass
+    record_keys = keys
+    if 'metadata_url' not in keys:
+        record_keys = keys + ('metadata_url',)
+    extra_keys = tuple(k for k in keys if k not in _parameter_fields and k != 'stream' and k != 'metadata_url')
+    return _key_orders.setdefault(keys, (record_keys, extra_keys))
+
+
+class StreamRecord(object):
+    """
+    A single stream map row: a sensor parameter paired with one of its streams.
+
+    The parameter fields are stored in slots, with repeated strings interned in
+    a table shared by the records of a stream map (or of a whole crawl), and the
+    metadata 'times' entry is shared by all of the stream's records rather than
+    copied.  Records behave like the (read-mostly) dictionaries
+    they replace: fields are accessed as record['units'] or record.units,
+    record['stream'] is the times entry and to_dict() returns the equivalent
+    plain dictionary (i.e.: for JSON serialization).
+
+    Args:
+        parameter: the parameter's entry from the metadata 'parameters' array
+        stream: the stream's entry from the metadata 'times' array
+        metadata_url: the url of the sensor's metadata
+        table: dictionary in which repeated strings are interned (see
+            intern_string).  Strings are not interned if None.
+    """
+
+    __slots__ = _parameter_fields + ('stream', 'metadata_url', '_keys', '_extra')
+
+    def __init__(self, parameter, stream, metadata_url, table=None):
+        get = parameter.get
+        if table is None:
+            intern = lambda value: value
+        else:
+            intern = lambda value: intern_string(value, table)
+        self.particleKey = intern(get('particleKey'))
+        self.pdId = intern(get('pdId'))
+        self.units = intern(get('units'))
+        self.shape = intern(get('shape'))
+        self.fillValue = intern(get('fillValue'))
+        self.type = intern(get('type'))
+        self.unsigned = get('unsigned')
+        self.stream = stream
+        self.metadata_url = intern(metadata_url)
+
+        (self._keys, extra_keys) = _record_keys(parameter)
+        if extra_keys:
+            self._extra = dict((key, parameter[key]) for key in extra_keys)
+        else:
+            self._extra = None
+
+    def __getitem__(self, key):
+        if key in self._keys:
+            if self._extra is not None and key in self._extra:
+                return self._extra[key]
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.__slots__ and not key.startswith('_'):
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        if key not in self._keys:
+            self._keys = _record_keys(self._keys + (key,))[0]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self):
+        return [self[key] for key in self._keys]
+
+    def items(self):
+        return [(key, self[key]) for key in self._keys]
+
+    def iteritems(self):
+        for key in self._keys:
+            yield (key, self[key])
+
+    def to_dict(self):
+        """
+        Return the record as a plain dictionary, equal to the stream map
+        dictionary it replaces.  As with any dictionary, the key order is not
+        defined.
+        """
+        record = {}
+        for key in self._keys:
+            record[key] = self[key]
+        return record
+
+    def __eq__(self, other):
+        if isinstance(other, StreamRecord):
+            other = other.to_dict()
+        if not isinstance(other, dict):
+            return NotImplemented
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<StreamRecord({:s})>'.format(repr(self.to_dict()))
@@ -0,0 +1,196 @@
+"""
+Persisted inverted indexes of the uFrame inventory: stream -> reference designators
+and parameter -> streams.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import datetime
+from uframe import get_arrays
+from uframe.crawler import InventoryCrawler
+from uframe.jsonio import JSONBackend
+
+# Fields of each stream index entry, named as in the uFrame metadata times
+# entries (sensor is the reference designator)
+STREAM_FIELDS = ('sensor', 'method', 'beginTime', 'endTime', 'count')
+
+# Default maximum age, in seconds, of an index before it is rebuilt
+DEFAULT_MAX_AGE = 86400
+
+
+class StreamIndex(object):
+    """
+    Inverted index of the sensor metadata of a uFrame instance.
+
+    streams maps each stream name to the [sensor, method, beginTime, endTime,
+    count] of every reference designator and method producing it.  parameters
+    maps each parameter particleKey, and each pdId, to the names of the
+    streams containing it.
+
+    Args:
+        uframe_url: url of the indexed uFrame instance
+        streams: stream index, as described above
+        parameters: parameter index, as described above
+        created: time the index was built, in seconds since the epoch.
+            Defaults to now.
+        complete: False if the metadata of some sensors could not be fetched
+            when the index was built, so that it may be missing their streams
+    """
+
+    def __init__(self, uframe_url=None, streams=None, parameters=None, created=None, complete=True):
+        self._uframe_url = uframe_url
+        self._streams = streams if streams is not None else {}
+        self._parameters = parameters if parameters is not None else {}
+        self._created = created if created is not None else time.time()
+        self._complete = complete
+
+    @property
+    def uframe_url(self):
+        return self._uframe_url
+
+    @property
+    def created(self):
+        return self._created
+
+    @property
+    def complete(self):
+        return self._complete
+    @complete.setter
+    def complete(self, complete):
+        self._complete = complete
+
+    @property
+    def age(self):
+        """
+        Seconds since the index was built.
+        """
+        return time.time() - self._created
+
+    @property
+    def streams(self):
+        return self._streams
+
+    @property
+    def parameters(self):
+        return self._parameters
+
+    def add_sensor(self, ref_des, metadata):
+        """
+        Add the streams and parameters of a sensor metadata record to the index.
+        """
+        for t in metadata.get('times', []):
+            self._streams.setdefault(t['stream'], []).append(
+                [ref_des, t['method'], t['beginTime'], t['endTime'], t['count']])
+
+        for p in metadata.get('parameters', []):
+            for key in (p.get('particleKey'), p.get('pdId')):
+                if not key:
+                    continue
+                streams = self._parameters.setdefault(key, [])
+                if p['stream'] not in streams:
+                    streams.append(p['stream'])
+
+    def stream_entries(self, stream):
+        """
+        Return the [sensor, method, beginTime, endTime, count] entries of the
+        stream, or an empty list if no sensor produces it.
+        """
+        return self._streams.get(stream, [])
+
+    def parameter_streams(self, parameter):
+        """
+        Return the names of the streams containing parameter (a particleKey or
+        pdId), or an empty list if no stream contains it.
+        """
+        return self._parameters.get(parameter, [])
+
+    def save(self, path):
+        """
+        Write the index to path as JSON, replacing it atomically.  Returns True
+        on success.
+        """
+        index = {'uframe' : self._uframe_url,
+            'created' : self._created,
+            'created_utc' : datetime.datetime.utcfromtimestamp(self._created).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'complete' : self._complete,
+            'stream_fields' : STREAM_FIELDS,
+            'streams' : self._streams,
+            'parameters' : self._parameters}
+
+        tmp_path = '{:s}.tmp'.format(path)
+        try:
+            with open(tmp_path, 'w') as fid:
+                json.dump(index, fid, separators=(',', ':'))
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            sys.stderr.write('Failed to write stream index {:s}: {:s}\n'.format(path, str(e)))
+            sys.stderr.flush()
+            return False
+        return True
+
+    def __len__(self):
+        return len(self._streams)
+
+    def __repr__(self):
+        return '<StreamIndex(uframe={:s}, streams={:d}, parameters={:d}, complete={:s})>'.format(
+            self._uframe_url, len(self._streams), len(self._parameters), str(self._complete))
+
+
+def stream_index_path(cache_dir, uframe_url):
+    """
+    Return the default location of the stream index of the uFrame instance
+    uframe_url in cache_dir.
+    """
+    return os.path.join(cache_dir, 'streams-{:s}.index'.format(hashlib.sha1(uframe_url.encode('utf-8')).hexdigest()))
+
+
+def load_stream_index(path, json_backend=None):
+    """
+    Load a stream index written by StreamIndex.save.  Returns None if the file
+    does not exist or is not a valid index.
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'r') as fid:
+            index = JSONBackend(json_backend).loads(fid.read())
+        return StreamIndex(uframe_url=index['uframe'],
+            streams=index['streams'],
+            parameters=index['parameters'],
+            created=index['created'],
+            complete=index.get('complete', True))
+    except (IOError, ValueError, KeyError, TypeError) as e:
+        sys.stderr.write('Ignoring invalid stream index {:s}: {:s}\n'.format(path, str(e)))
+        sys.stderr.flush()
+        return None
+
+
+def build_stream_index(uframe_base, workers=1):
+    """
+    Crawl the inventory of uframe_base, fetching every sensor's metadata, and
+    return the index of its streams and parameters.  The index is marked
+    incomplete if any inventory or metadata request failed.
+
+    Returns:
+        (index, errors): the StreamIndex and the crawler's per-branch errors
+    """
+    index = StreamIndex(uframe_url=uframe_base.url)
+    arrays = get_arrays(uframe_base=uframe_base)
+    if not arrays:
+        index.complete = False
+        return (index, [{'level' : 'arrays', 'ref_des' : '', 'url' : uframe_base.url, 'code' : None, 'reason' : 'No arrays found'}])
+
+    crawler = InventoryCrawler(uframe_base, workers=workers)
+    for sensor in crawler.iter_crawl(arrays=arrays):
+        if sensor['metadata']:
+            index.add_sensor(sensor['ref_des'], sensor['metadata'])
+
+    # Empty branches are reported with no response code
+    if any(e['code'] is not None for e in crawler.errors):
+        index.complete = False
+
+    return (index, crawler.errors)
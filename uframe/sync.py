@@ -0,0 +1,75 @@
+"""
+Stream endTime watermarks for incremental downloads.
+"""
+
+import os
+import sys
+import json
+import threading
+
+WATERMARK_FILE_NAME = '.uframe_watermarks.json'
+
+
+class WatermarkStore(object):
+    """
+    Persistent record of the last successfully downloaded endTime for each
+    (reference designator, method, stream).
+
+    The watermarks are stored as a single JSON file mapping
+    REFDES/METHOD/STREAM to the endTime of the last successful download.
+
+    Args:
+        path: watermark file.  It is created by save() if it does not exist.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._watermarks = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as fid:
+                    self._watermarks = json.load(fid)
+            except (IOError, ValueError) as e:
+                sys.stderr.write('Ignoring invalid watermark file {:s}: {:s}\n'.format(path, str(e)))
+                sys.stderr.flush()
+
+    @property
+    def path(self):
+        return self._path
+
+    def get(self, ref_des, method, stream):
+        """
+        Return the endTime watermark for the stream, or None if the stream has
+        not been downloaded.
+        """
+        return self._watermarks.get(_watermark_key(ref_des, method, stream))
+
+    def set(self, ref_des, method, stream, end_time):
+        with self._lock:
+            self._watermarks[_watermark_key(ref_des, method, stream)] = end_time
+
+    def save(self):
+        """
+        Write the watermarks to the watermark file, replacing it atomically.
+        """
+        tmp_path = '{:s}.tmp'.format(self._path)
+        with self._lock:
+            try:
+                with open(tmp_path, 'w') as fid:
+                    json.dump(self._watermarks, fid, indent=1, sort_keys=True)
+                os.rename(tmp_path, self._path)
+            except (IOError, OSError) as e:
+                sys.stderr.write('Failed to write watermark file {:s}: {:s}\n'.format(self._path, str(e)))
+                sys.stderr.flush()
+
+    def __len__(self):
+        return len(self._watermarks)
+
+    def __repr__(self):
+        return '<WatermarkStore(path={:s})>'.format(self._path)
+
+
+def _watermark_key(ref_des, method, stream):
+    return '{:s}/{:s}/{:s}'.format(ref_des, method, stream)
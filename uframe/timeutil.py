@@ -0,0 +1,155 @@
+"""
+Fast parsing and formatting of uFrame ISO-8601 timestamps, and batch computation
+of request time windows.
+
+uFrame timestamps have the fixed format YYYY-MM-DDTHH:MM:SS.fffZ, which is parsed
+by slicing rather than with dateutil.  Other formats fall back to dateutil.
+The batch window computation uses NumPy datetime64 arrays if NumPy is installed.
+"""
+
+import datetime
+from dateutil import parser
+from dateutil.tz import tzutc
+from dateutil.relativedelta import relativedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAVE_NUMPY = np is not None
+
+# dateutil.relativedelta types with a fixed length, and their datetime64 units
+_fixed_units = {'weeks' : 'W',
+    'days' : 'D',
+    'hours' : 'h',
+    'minutes' : 'm',
+    'seconds' : 's'}
+
+# Minimum number of timestamps for which time_windows uses NumPy
+_min_batch = 16
+
+_epoch_2000 = datetime.datetime(2000, 1, 1)
+_one_millisecond = datetime.timedelta(milliseconds=1)
+_utc = tzutc()
+
+
+def is_uframe_timestamp(value):
+    """
+    True if value has the fixed uFrame format YYYY-MM-DDTHH:MM:SS[.f[f[f]]][Z],
+    with at most millisecond precision.
+    """
+    n = len(value)
+    if n < 19 or n > 24:
+        return False
+    if value[4] != '-' or value[7] != '-' or value[10] != 'T' or value[13] != ':' or value[16] != ':':
+        return False
+    if not (value[0:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16] + value[17:19]).isdigit():
+        return False
+    rest = value[19:-1] if value[-1] == 'Z' else value[19:]
+    if rest:
+        return len(rest) <= 4 and rest[0] == '.' and rest[1:].isdigit()
+    return True
+
+
+def parse_iso8601(value):
+    """
+    Parse an ISO-8601 timestamp and return a naive datetime in UTC.
+
+    Timestamps in the uFrame format are parsed directly.  Anything else is
+    parsed with dateutil, and converted to UTC if it has a time zone.
+
+    Raises:
+        ValueError: if value is not a valid timestamp
+    """
+    if is_uframe_timestamp(value):
+        rest = value[20:-1] if value[-1] == 'Z' else value[20:]
+        return datetime.datetime(int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+            int(value[11:13]),
+            int(value[14:16]),
+            int(value[17:19]),
+            int((rest + '000000')[:6]))
+
+    dt = parser.parse(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(_utc).replace(tzinfo=None)
+    return dt
+
+
+def format_iso8601(dt):
+    """
+    Format a naive UTC datetime in the uFrame format, truncated to milliseconds.
+    """
+    return '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:03d}Z'.format(
+        dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, dt.microsecond // 1000)
+
+
+def next_timestamp(value):
+    """
+    Return the uFrame format timestamp 1 millisecond (the resolution of uFrame
+    timestamps) after the ISO-8601 timestamp value: the start of a request that
+    follows one ending at value without requesting its last record again.
+    """
+    return format_iso8601(parse_iso8601(value) + _one_millisecond)
+
+
+def file_stamp(value):
+    """
+    Return the YYYYMMDDTHHMMSS form of an ISO-8601 timestamp, as used in
+    downloaded file names.
+    """
+    if is_uframe_timestamp(value):
+        return value[0:4] + value[5:7] + value[8:10] + 'T' + value[11:13] + value[14:16] + value[17:19]
+    return parse_iso8601(value).strftime('%Y%m%dT%H%M%S')
+
+
+def time_window(end_time, deltatype, deltaval):
+    """
+    Return the (begin, end) request window ending at end_time and extending
+    deltaval deltatype units (a dateutil.relativedelta type, i.e.: 'days')
+    back, or None if end_time is before the year 2000 (uFrame's marker for
+    invalid times).  begin is in the uFrame format and end is end_time.
+    """
+    dt1 = parse_iso8601(end_time)
+    if dt1 < _epoch_2000:
+        return None
+    if deltatype in _fixed_units:
+        # Equivalent to, and much cheaper than, the relativedelta
+        dt0 = dt1 - datetime.timedelta(**{deltatype : deltaval})
+    else:
+        dt0 = dt1 - relativedelta(**{deltatype : deltaval})
+    return (format_iso8601(dt0), end_time)
+
+
+def time_windows(end_times, deltatype, deltaval):
+    """
+    Batch version of time_window: return the window of each of end_times, or
+    None for each invalid one.
+
+    If NumPy is installed, the windows of uFrame format timestamps with a fixed
+    length deltatype (weeks, days, hours, minutes or seconds) are computed at
+    once with datetime64 arithmetic.  The rest use time_window.
+    """
+    windows = [None] * len(end_times)
+    batch = []
+    if HAVE_NUMPY and deltatype in _fixed_units and len(end_times) >= _min_batch:
+        batch = [i for (i, t) in enumerate(end_times) if is_uframe_timestamp(t)]
+
+    if batch:
+        # datetime64 does not accept the Z suffix
+        ts1 = np.array([end_times[i].rstrip('Z') for i in batch], dtype='datetime64[ms]')
+        ts0 = ts1 - np.timedelta64(deltaval, _fixed_units[deltatype])
+        valid = ts1 >= np.datetime64(_epoch_2000, 'ms')
+        begins = np.datetime_as_string(ts0, unit='ms')
+        for (j, i) in enumerate(batch):
+            if valid[j]:
+                windows[i] = ('{:s}Z'.format(begins[j]), end_times[i])
+
+    batched = set(batch)
+    for (i, end_time) in enumerate(end_times):
+        if i not in batched:
+            windows[i] = time_window(end_time, deltatype, deltaval)
+
+    return windows
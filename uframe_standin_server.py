@@ -0,0 +1,409 @@
+#! /usr/bin/env python
+
+from __future__ import division
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from email.utils import formatdate
+
+_inventory_path = '/sensor/inv'
+
+
+class SyntheticInventory(object):
+    """
+    A synthetic uFrame inventory of arrays x platforms x sensors x streams.
+
+    Every array has the same number of platforms, every platform the same number
+    of sensors and every sensor the same number of streams, each available for
+    every method.  The inventory is generated on demand, so arbitrarily large
+    inventories cost no memory.
+
+    Args:
+        arrays: number of arrays
+        platforms: number of platforms per array
+        sensors: number of sensors per platform
+        streams: number of streams per sensor
+        parameters: number of parameters per stream
+        methods: list of stream methods
+        records: number of records in each stream
+        begin_time: ISO-8601 beginTime of each stream
+        end_time: ISO-8601 endTime of each stream
+    """
+
+    def __init__(self, arrays=2, platforms=3, sensors=4, streams=2, parameters=20,
+                 methods=('telemetered', 'recovered_host'), records=100000,
+                 begin_time='2014-01-01T00:00:00.000Z', end_time='2015-01-01T00:00:00.000Z'):
+        self._arrays = ['SY{:02d}SYNT'.format(i + 1) for i in range(arrays)]
+        self._platforms = ['NODE{:02d}'.format(i + 1) for i in range(platforms)]
+        self._sensors = ['{:02d}-SYNTH{:03d}'.format(i + 1, i) for i in range(sensors)]
+        self._num_streams = streams
+        self._num_parameters = parameters
+        self._methods = list(methods)
+        self._records = records
+        self._begin_time = begin_time
+        self._end_time = end_time
+
+    @property
+    def num_sensors(self):
+        return len(self._arrays) * len(self._platforms) * len(self._sensors)
+
+    def arrays(self):
+        return list(self._arrays)
+
+    def platforms(self, array):
+        if array not in self._arrays:
+            return None
+        return list(self._platforms)
+
+    def sensors(self, array, platform):
+        if array not in self._arrays or platform not in self._platforms:
+            return None
+        return list(self._sensors)
+
+    def streams(self, array, platform, sensor):
+        if self.sensors(array, platform) is None or sensor not in self._sensors:
+            return None
+        prefix = sensor.split('-')[1].lower()
+        return ['{:s}_stream_{:d}'.format(prefix, i) for i in range(self._num_streams)]
+
+    def metadata(self, array, platform, sensor):
+        """
+        Return the metadata record for the sensor, or None if it does not exist.
+        """
+        streams = self.streams(array, platform, sensor)
+        if streams is None:
+            return None
+
+        ref_des = '{:s}-{:s}-{:s}'.format(array, platform, sensor)
+        parameters = []
+        times = []
+        for (s, stream) in enumerate(streams):
+            for p in range(self._num_parameters):
+                pd = s * self._num_parameters + p
+                parameters.append({'particleKey' : 'time' if p == 0 else '{:s}_parameter_{:d}'.format(stream, p),
+                    'stream' : stream,
+                    'pdId' : 'PD{:d}'.format(7 if p == 0 else 1000 + pd),
+                    'units' : 'seconds since 1900-01-01' if p == 0 else '1',
+                    'shape' : 'FUNCTION' if p % 5 == 4 else 'SCALAR',
+                    'fillValue' : '-9999999',
+                    'type' : 'DOUBLE' if p == 0 else 'FLOAT',
+                    'unsigned' : False})
+            for method in self._methods:
+                times.append({'stream' : stream,
+                    'method' : method,
+                    'sensor' : ref_des,
+                    'beginTime' : self._begin_time,
+                    'endTime' : self._end_time,
+                    'count' : self._records})
+
+        return {'parameters' : parameters, 'times' : times}
+
+    def has_stream(self, array, platform, sensor, method, stream):
+        return method in self._methods and stream in (self.streams(array, platform, sensor) or [])
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server for the synthetic inventory.
+
+    Args:
+        address: (host, port) to listen on
+        inventory: SyntheticInventory to serve
+        payload_bytes: size of each data (time-bound stream) response
+        latency: seconds to wait before responding to each request
+        jitter: maximum additional random wait, in seconds
+        bandwidth: maximum transfer rate of each response, in bytes/sec.  0 is
+            unlimited.
+        error_rate: fraction of requests that fail with 500 Internal Server Error
+        seed: random seed for the jitter and injected errors
+        verbose: log each request to STDERR
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, inventory, payload_bytes=1048576, latency=0, jitter=0,
+                 bandwidth=0, error_rate=0, seed=0, verbose=False):
+        HTTPServer.__init__(self, address, StandInRequestHandler)
+        self.inventory = inventory
+        self.payload_bytes = payload_bytes
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.verbose = verbose
+        self.last_modified = formatdate(time.time(), usegmt=True)
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def random(self):
+        with self._random_lock:
+            return self._random.random()
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the /sensor/inv inventory, metadata and time-bound stream endpoints
+    used by the uframe module.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'uFrameStandIn/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_GET(self):
+        server = self.server
+
+        delay = server.latency + server.jitter * server.random()
+        if delay > 0:
+            time.sleep(delay)
+
+        if server.error_rate and server.random() < server.error_rate:
+            self._send_body(500, 'text/plain', 'Injected error\n')
+            return
+
+        url = urlparse.urlparse(self.path)
+        if not (url.path == _inventory_path or url.path.startswith(_inventory_path + '/')):
+            self._send_body(404, 'text/plain', 'Not found\n')
+            return
+        tokens = [t for t in url.path[len(_inventory_path):].split('/') if t]
+        inventory = server.inventory
+
+        if len(tokens) == 0:
+            self._send_json(inventory.arrays())
+        elif len(tokens) == 1:
+            self._send_json(inventory.platforms(*tokens))
+        elif len(tokens) == 2:
+            self._send_json(inventory.sensors(*tokens))
+        elif len(tokens) == 4 and tokens[3] == 'metadata':
+            self._send_json(inventory.metadata(*tokens[:3]))
+        elif len(tokens) == 5 and inventory.has_stream(*tokens):
+            self._send_stream(url, tokens)
+        else:
+            self._send_body(404, 'text/plain', 'Not found\n')
+
+    def _send_json(self, content):
+        if content is None:
+            self._send_body(404, 'text/plain', 'Not found\n')
+            return
+
+        body = json.dumps(content)
+        etag = '"{:s}"'.format(hashlib.sha1(body).hexdigest())
+        headers = {'ETag' : etag, 'Last-Modified' : self.server.last_modified}
+        if self.headers.get('If-None-Match') == etag or self.headers.get('If-Modified-Since') == self.server.last_modified:
+            self._send_body(304, None, '', headers)
+            return
+        self._send_body(200, 'application/json', body, headers)
+
+    def _send_stream(self, url, tokens):
+        """
+        Send payload_bytes of deterministic data for the time-bound stream
+        request, honoring Range and If-Range requests.
+        """
+        query = urlparse.parse_qs(url.query)
+        content_type = query.get('format', ['application/netcdf'])[0]
+        key = hashlib.sha1(self.path).hexdigest()
+        etag = '"{:s}"'.format(key)
+        size = self.server.payload_bytes
+
+        status = 200
+        start = 0
+        end = size - 1
+        headers = {'ETag' : etag,
+            'Last-Modified' : self.server.last_modified,
+            'Accept-Ranges' : 'bytes'}
+
+        byte_range = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if byte_range and (not if_range or if_range in (etag, self.server.last_modified)):
+            try:
+                (first, last) = byte_range.split('=', 1)[1].split('-', 1)
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            except ValueError:
+                self._send_body(400, 'text/plain', 'Invalid Range\n')
+                return
+            if start >= size or start > end:
+                headers['Content-Range'] = 'bytes */{:d}'.format(size)
+                self._send_body(416, 'text/plain', '', headers)
+                return
+            status = 206
+            headers['Content-Range'] = 'bytes {:d}-{:d}/{:d}'.format(start, end, size)
+
+        # Repeat a 64 KB block derived from the request so that every response
+        # is reproducible
+        block = ''.join(hashlib.sha1('{:s}{:d}'.format(key, i)).digest() for i in range(3277))[:65536]
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(end - start + 1))
+        for (name, value) in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        bandwidth = self.server.bandwidth
+        write_size = min(len(block), max(1024, int(bandwidth / 20))) if bandwidth else len(block)
+        start_time = time.time()
+        sent = 0
+        position = start
+        while position <= end:
+            offset = position % len(block)
+            chunk = block[offset:offset + min(write_size, end - position + 1)]
+            self.wfile.write(chunk)
+            position += len(chunk)
+            sent += len(chunk)
+            if bandwidth:
+                wait = sent / bandwidth - (time.time() - start_time)
+                if wait > 0:
+                    time.sleep(wait)
+
+    def _send_body(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+def main(args):
+    """
+    Serve a synthetic uFrame inventory for deterministic benchmarking.
+
+    The server implements the /sensor/inv inventory tree, the sensor metadata
+    records and the time-bound stream data requests used by the uframe module,
+    for a generated inventory of --arrays x --platforms x --sensors sensors,
+    each with --streams streams.  Data responses are --payload-bytes of
+    reproducible data and support Range requests.  Latency, bandwidth caps and
+    errors may be injected.
+
+    Any of the scripts may be pointed at the server with --baseurl (i.e.:
+    --baseurl http://localhost when using the default port, 12576).
+    """
+    inventory = SyntheticInventory(arrays=args.arrays,
+        platforms=args.platforms,
+        sensors=args.sensors,
+        streams=args.streams,
+        parameters=args.parameters,
+        methods=args.methods.split(','),
+        records=args.records,
+        begin_time=args.begin_time,
+        end_time=args.end_time)
+
+    server = StandInServer((args.host, args.port),
+        inventory,
+        payload_bytes=args.payload_bytes,
+        latency=args.latency,
+        jitter=args.jitter,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        verbose=args.verbose)
+
+    sys.stdout.write('Serving {:d} synthetic sensors at http://{:s}:{:d}{:s}\n'.format(
+        inventory.num_sensors,
+        args.host,
+        args.port,
+        _inventory_path))
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return 0
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument('--host',
+            default='127.0.0.1',
+            help='Address to listen on (Default is 127.0.0.1).')
+    arg_parser.add_argument('-p', '--port',
+            type=int,
+            default=12576,
+            help='Port to listen on (Default is 12576, the uFrame web services port).')
+    arg_parser.add_argument('--arrays',
+            type=int,
+            default=2,
+            help='Number of arrays (Default is 2).')
+    arg_parser.add_argument('--platforms',
+            type=int,
+            default=3,
+            help='Number of platforms per array (Default is 3).')
+    arg_parser.add_argument('--sensors',
+            type=int,
+            default=4,
+            help='Number of sensors per platform (Default is 4).')
+    arg_parser.add_argument('--streams',
+            type=int,
+            default=2,
+            help='Number of streams per sensor (Default is 2).')
+    arg_parser.add_argument('--parameters',
+            type=int,
+            default=20,
+            help='Number of parameters per stream (Default is 20).')
+    arg_parser.add_argument('--methods',
+            default='telemetered,recovered_host',
+            help='Comma-separated list of stream methods (Default is telemetered,recovered_host).')
+    arg_parser.add_argument('--records',
+            type=int,
+            default=100000,
+            help='Number of records reported for each stream (Default is 100000).')
+    arg_parser.add_argument('--begin-time',
+            dest='begin_time',
+            default='2014-01-01T00:00:00.000Z',
+            help='beginTime of each stream (Default is 2014-01-01T00:00:00.000Z).')
+    arg_parser.add_argument('--end-time',
+            dest='end_time',
+            default='2015-01-01T00:00:00.000Z',
+            help='endTime of each stream (Default is 2015-01-01T00:00:00.000Z).')
+    arg_parser.add_argument('--payload-bytes',
+            dest='payload_bytes',
+            type=int,
+            default=1048576,
+            help='Size of each stream data response, in bytes (Default is 1048576).')
+    arg_parser.add_argument('--latency',
+            type=float,
+            default=0,
+            help='Seconds to wait before responding to each request (Default is 0).')
+    arg_parser.add_argument('--jitter',
+            type=float,
+            default=0,
+            help='Maximum additional random wait, in seconds (Default is 0).')
+    arg_parser.add_argument('--bandwidth',
+            type=float,
+            default=0,
+            help='Maximum transfer rate of each response, in bytes/sec (Default is 0, unlimited).')
+    arg_parser.add_argument('--error-rate',
+            dest='error_rate',
+            type=float,
+            default=0,
+            help='Fraction of requests that fail with 500 Internal Server Error (Default is 0).')
+    arg_parser.add_argument('--seed',
+            type=int,
+            default=0,
+            help='Random seed for the jitter and injected errors (Default is 0).')
+    arg_parser.add_argument('-v', '--verbose',
+            action='store_true',
+            help='Log each request to STDERR.')
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
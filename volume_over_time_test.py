@@ -3,74 +3,244 @@
 from __future__ import division
 import argparse
 import csv
+import datetime
+import json
 import os
+import platform
 import shutil
+import socket
+import sys
 import tempfile
+import threading
 import time
-from uframe import UFrame, fetch_uframe_time_bound_stream, HTTP_STATUS_OK
+from multiprocessing.pool import ThreadPool
+import requests
+from uframe import UFrame, fetch_uframe_time_bound_stream, HTTP_STATUS_OK, DEFAULT_RETRIES
+from uframe.limiter import AdaptiveLimiter
+from uframe.metrics import write_metrics_at_exit
 
+_percentiles = (50, 90, 99)
 
-__start_time = None
-__stop_time = None
 
+def percentile(values, p):
+    """
+    Return the pth percentile of values, linearly interpolated between the
+    closest ranks, or None if values is empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
 
-def record_start_time():
-    global __start_time
-    __start_time = time.time()
-    print 'Script started at: ', __start_time
 
+def summarize(values):
+    """
+    Return a dictionary containing the count, min, mean, max and p50/p90/p99 of
+    values.
+    """
+    summary = {'count' : len(values),
+        'min' : min(values) if values else None,
+        'mean' : sum(values) / len(values) if values else None,
+        'max' : max(values) if values else None}
+    for p in _percentiles:
+        summary['p{:d}'.format(p)] = percentile(values, p)
+    return summary
 
-def record_stop_time():
-    global __stop_time
-    __stop_time = time.time()
-    print 'Script stopped at: ', __stop_time
 
+class RunMonitor(object):
+    """
+    Tracks the requests and bytes in flight during a benchmark run.  The bytes
+    in flight are the bytes received so far by the requests that have not yet
+    completed.
+    """
 
-def get_dir_size(start_path):
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(start_path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            total_size += os.path.getsize(fp)
-    return total_size
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.bytes_in_flight = 0
+        self.peak_active = 0
+        self.peak_bytes_in_flight = 0
+
+    def fetch(self, **kwargs):
+        """
+        Call fetch_uframe_time_bound_stream with kwargs, tracking the request.
+        """
+        received = [0]
+
+        def progress(num_bytes):
+            received[0] += num_bytes
+            with self._lock:
+                self.bytes_in_flight += num_bytes
+                self.peak_bytes_in_flight = max(self.peak_bytes_in_flight, self.bytes_in_flight)
+
+        with self._lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            return fetch_uframe_time_bound_stream(progress=progress, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.bytes_in_flight -= received[0]
+
+
+def run_benchmark(uframe_base, rows, concurrency, args):
+    """
+    Download every stream in rows, using concurrency concurrent requests, to a
+    temporary directory which is deleted afterwards.
+
+    Returns:
+        run: dictionary containing the request counts, bytes received, wall
+            time, throughput, peak requests and bytes in flight, the time to
+            first byte and latency summaries (see summarize), the number of
+            retried requests, the data concurrency limit at the end of the run
+            and the per-request samples
+    """
+    dest_dir = tempfile.mkdtemp()
+    monitor = RunMonitor()
+    retries = uframe_base.metrics.to_dict()['endpoints']['data']['retries']
+
+    # Each request writes to its own directory: the file names do not include
+    # the sensor and repeated streams would collide
+    def fetch(i_row):
+        (i, row) = i_row
+        return monitor.fetch(uframe_base = uframe_base,
+            subsite = row['subsite'],
+            node = row['node'],
+            sensor = row['sensor'],
+            method = row['method'],
+            stream = row['stream'],
+            begin_datetime = row['begin_datetime'],
+            end_datetime = row['end_datetime'],
+            file_format = args.file_format,
+            exec_dpa = args.exec_dpa,
+            urlonly = False,
+            dest_dir = os.path.join(dest_dir, str(i)),
+            provenance = args.provenance,
+            limit = '10000' if args.limit else '-1')
+
+    stdout = sys.stdout
+    if args.quiet:
+        sys.stdout = open(os.devnull, 'w')
+    pool = ThreadPool(concurrency)
+    try:
+        start_time = time.time()
+        fetched_urls = pool.map(fetch, list(enumerate(rows)), chunksize=1)
+        wall_time = time.time() - start_time
+    finally:
+        pool.close()
+        pool.join()
+        if args.quiet:
+            sys.stdout.close()
+            sys.stdout = stdout
+        shutil.rmtree(dest_dir, ignore_errors=True)
+
+    samples = []
+    for fetched_url in fetched_urls:
+        samples.append({'url' : fetched_url['url'],
+            'code' : fetched_url['code'],
+            'bytes' : fetched_url['bytes'],
+            'ttfb' : fetched_url['ttfb'],
+            'elapsed' : fetched_url['elapsed']})
+    succeeded = [s for s in samples if s['code'] == HTTP_STATUS_OK]
+    total_bytes = sum(s['bytes'] for s in samples)
+
+    return {'concurrency' : concurrency,
+        'requests' : len(samples),
+        'succeeded' : len(succeeded),
+        'failed' : len(samples) - len(succeeded),
+        'bytes' : total_bytes,
+        'wall_time' : wall_time,
+        'throughput_mb_per_sec' : total_bytes / 1048576 / wall_time if wall_time > 0 else None,
+        'requests_per_sec' : len(samples) / wall_time if wall_time > 0 else None,
+        'peak_active' : monitor.peak_active,
+        'peak_bytes_in_flight' : monitor.peak_bytes_in_flight,
+        'retries' : uframe_base.metrics.to_dict()['endpoints']['data']['retries'] - retries,
+        'limit' : uframe_base.data_limiter.limit,
+        'ttfb' : summarize([s['ttfb'] for s in succeeded]),
+        'latency' : summarize([s['elapsed'] for s in succeeded]),
+        'samples' : samples}
+
+
+def summarize_runs(concurrency, runs):
+    """
+    Combine the measured runs at a concurrency level.  Throughput is summarized
+    over the runs and time to first byte and latency over all of the runs'
+    successful requests.
+    """
+    samples = [s for run in runs for s in run['samples'] if s['code'] == HTTP_STATUS_OK]
+    return {'concurrency' : concurrency,
+        'runs' : len(runs),
+        'requests' : sum(run['requests'] for run in runs),
+        'succeeded' : sum(run['succeeded'] for run in runs),
+        'failed' : sum(run['failed'] for run in runs),
+        'bytes' : sum(run['bytes'] for run in runs),
+        'throughput_mb_per_sec' : summarize([run['throughput_mb_per_sec'] for run in runs if run['throughput_mb_per_sec'] is not None]),
+        'peak_active' : max(run['peak_active'] for run in runs),
+        'peak_bytes_in_flight' : max(run['peak_bytes_in_flight'] for run in runs),
+        'retries' : sum(run['retries'] for run in runs),
+        'limit' : min(run['limit'] for run in runs),
+        'ttfb' : summarize([s['ttfb'] for s in samples]),
+        'latency' : summarize([s['elapsed'] for s in samples])}
+
+
+def _ms(seconds):
+    return seconds * 1000 if seconds is not None else float('nan')
 
 
 def main(args):
     """
     Uses the specified CSV file to download NetCDF / JSON files for the specified streams
-    during the specified time-bounds.
+    during the specified time-bounds, and benchmarks the downloads.
 
     See 'example_streams.csv' for format of CSV file.
 
-    The size in bytes of the downloaded files is calculated as well as the amount of time
-    the downloads took to complete.  These values are used to calculate a Volume-Over-Time
-    measurement.
+    All of the streams are downloaded once per run.  For each concurrency level
+    (--concurrency), --warmup unmeasured runs are followed by --repeat measured
+    runs.  The time to first byte and total latency of each request, the
+    throughput and the peak requests and bytes in flight of each run are
+    recorded, and the p50/p90/p99 latencies and throughput are reported for
+    each concurrency level.  The complete results may be written as JSON
+    (--json) to compare uFrame deployments and client versions.
+
+    The files are downloaded to a temporary directory and deleted after each run.
 
-    The files are downloaded to a temporary directory and deleted.
+    By default, failed requests are not retried and the number of concurrent
+    downloads is fixed at each concurrency level, so that the measurements are
+    not skewed by retry backoffs or by the adaptive concurrency limit.  With
+    --adaptive, the client's retries and adaptive limit are used, and the
+    number of retried requests and the lowest limit reached are reported for
+    each level.
 
     Default uFrame instance is: http://uframe-test.ooi.rutgers.edu
     """
 
-    file_downloads_succeeded = 0
-    file_downloads_failed = 0
-    temp_download_path = None
-
-    if not args.urlonly:
-
-        temp_download_path = tempfile.mkdtemp()
-
-        print 'Using temp download path: {:s}'.format(temp_download_path)
-
-        record_start_time()
+    try:
+        concurrency_levels = [int(c) for c in args.concurrency.split(',')]
+    except ValueError:
+        sys.stderr.write('Invalid concurrency levels: {:s}\n'.format(args.concurrency))
+        return 1
+    if not concurrency_levels or min(concurrency_levels) < 1:
+        sys.stderr.write('Concurrency levels must be positive: {:s}\n'.format(args.concurrency))
+        return 1
 
+    retries = DEFAULT_RETRIES if args.adaptive else 0
     if args.base_url:
-        uframe_base = UFrame(base_url=args.base_url, timeout=args.timeout)
+        uframe_base = UFrame(base_url=args.base_url, timeout=args.timeout, retries=retries, max_downloads=max(concurrency_levels))
     else:
-        uframe_base = UFrame(timeout=args.timeout)
+        uframe_base = UFrame(timeout=args.timeout, retries=retries, max_downloads=max(concurrency_levels))
+
+    if args.metrics:
+        write_metrics_at_exit(uframe_base.metrics, args.metrics)
 
     with open(args.streams_csv) as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
+        rows = list(csv.DictReader(csvfile))
+
+    if args.urlonly:
+        for row in rows:
             fetched_url = fetch_uframe_time_bound_stream(
                 uframe_base = uframe_base,
                 subsite = row['subsite'],
@@ -82,33 +252,88 @@ def main(args):
                 end_datetime = row['end_datetime'],
                 file_format = args.file_format,
                 exec_dpa = args.exec_dpa,
-                urlonly = args.urlonly,
-                dest_dir = temp_download_path
+                urlonly = True,
+                dest_dir = None,
+                provenance = args.provenance,
+                limit = '10000' if args.limit else '-1'
             )
-            if args.urlonly:
-                print fetched_url['url']
-            else:
-                if fetched_url['code'] == HTTP_STATUS_OK:
-                    file_downloads_succeeded += 1
-                else:
-                    file_downloads_failed += 1
-
-    if not args.urlonly:
-
-        record_stop_time()
-
-        total_bytes_downloaded = get_dir_size(temp_download_path)
-        total_elapsed_time = (__stop_time - __start_time)
-
-        print 'Deleting temp download path: ', temp_download_path
-        shutil.rmtree(temp_download_path, ignore_errors=True)
-
-        print '##############################################'
-        print 'File Downloads: succeeded={0}, failed={1}'.format(file_downloads_succeeded, file_downloads_failed)
-        print 'Total Bytes Downloaded: {0}'.format(total_bytes_downloaded)
-        print 'Total Elapsed Time: {0} seconds'.format(total_elapsed_time)
-        print 'Volume-Over-Time: {0} MB/sec'.format(total_bytes_downloaded / (1024 * 1024) / total_elapsed_time)
-        print '##############################################'
+            print fetched_url['url']
+        return 0
+
+    results = {'started' : datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'uframe' : uframe_base.url,
+        'streams_csv' : args.streams_csv,
+        'streams' : len(rows),
+        'file_format' : args.file_format,
+        'exec_dpa' : args.exec_dpa,
+        'provenance' : args.provenance,
+        'limit' : args.limit,
+        'adaptive' : args.adaptive,
+        'warmup' : args.warmup,
+        'repeat' : args.repeat,
+        'client' : {'host' : socket.gethostname(),
+            'python' : platform.python_version(),
+            'requests' : requests.__version__},
+        'runs' : [],
+        'summary' : []}
+
+    for concurrency in concurrency_levels:
+
+        # Each level starts at its own limit which, unless --adaptive, is fixed
+        uframe_base.data_limiter = AdaptiveLimiter(concurrency,
+            minimum=1 if args.adaptive else concurrency,
+            metrics=uframe_base.metrics,
+            name='data')
+
+        runs = []
+        for i in range(args.warmup + args.repeat):
+            warmup = i < args.warmup
+            run = run_benchmark(uframe_base, rows, concurrency, args)
+            run['warmup'] = warmup
+            results['runs'].append(run)
+            if not warmup:
+                runs.append(run)
+
+            print 'Concurrency {:d} {:s} {:d}: {:d}/{:d} succeeded, {:d} retried, {:0.2f} MB in {:0.2f} seconds, {:0.2f} MB/sec, limit {:d}'.format(
+                concurrency,
+                'warmup' if warmup else 'run',
+                i - args.warmup + 1 if not warmup else i + 1,
+                run['succeeded'],
+                run['requests'],
+                run['retries'],
+                run['bytes'] / 1048576,
+                run['wall_time'],
+                run['throughput_mb_per_sec'] or 0,
+                run['limit'])
+            sys.stdout.flush()
+
+        if runs:
+            results['summary'].append(summarize_runs(concurrency, runs))
+
+    print '##############################################'
+    print '{:>5s} {:>6s} {:>7s} {:>5s} {:>8s} {:>10s} {:>23s} {:>23s}'.format('conc', 'failed', 'retried', 'limit', 'MB/sec', 'peak MB', 'ttfb p50/p90/p99 (ms)', 'latency p50/p90/p99 (ms)')
+    for summary in results['summary']:
+        print '{:5d} {:6d} {:7d} {:5d} {:8.2f} {:10.2f} {:>23s} {:>23s}'.format(
+            summary['concurrency'],
+            summary['failed'],
+            summary['retries'],
+            summary['limit'],
+            summary['throughput_mb_per_sec']['p50'] or 0,
+            summary['peak_bytes_in_flight'] / 1048576,
+            '{:0.0f}/{:0.0f}/{:0.0f}'.format(*[_ms(summary['ttfb']['p{:d}'.format(p)]) for p in _percentiles]),
+            '{:0.0f}/{:0.0f}/{:0.0f}'.format(*[_ms(summary['latency']['p{:d}'.format(p)]) for p in _percentiles]))
+    print '##############################################'
+
+    if args.json_file:
+        try:
+            with open(args.json_file, 'w') as fid:
+                json.dump(results, fid, indent=1, sort_keys=True)
+        except IOError as e:
+            sys.stderr.write('{:s}: {:s}\n'.format(e.strerror, args.json_file))
+            return 1
+        print 'Results written to: {:s}'.format(args.json_file)
+
+    return 0
 
 
 if __name__ == '__main__':
@@ -131,10 +356,41 @@ if __name__ == '__main__':
             action='store_false',
             dest='exec_dpa',
             help='Do not execute data product algorithms (Default is On)')
+    arg_parser.add_argument('--provenance',
+            action='store_true',
+            dest='provenance',
+            help='Include provenance metadata.')
+    arg_parser.add_argument('--nolimit',
+            action='store_false',
+            dest='limit',
+            help='Request all points rather than at most 10000 per stream.')
     arg_parser.add_argument('-u', '--urlonly',
             action='store_true',
             help='Display the urls for the stream, but do not execute the download request')
+    arg_parser.add_argument('-c', '--concurrency',
+            default='1',
+            help='Comma-separated list of concurrency levels to benchmark (i.e.: 1,2,4,8).  Default is 1.')
+    arg_parser.add_argument('-r', '--repeat',
+            type=int,
+            default=1,
+            help='Number of measured runs per concurrency level (Default is 1).')
+    arg_parser.add_argument('--warmup',
+            type=int,
+            default=0,
+            help='Number of unmeasured warm-up runs per concurrency level (Default is 0).')
+    arg_parser.add_argument('--adaptive',
+            action='store_true',
+            help='Retry failed requests and adapt the concurrency limit, as the other scripts do, rather than use a fixed concurrency without retries.')
+    arg_parser.add_argument('-j', '--json',
+            dest='json_file',
+            help='Write the complete results, including every request, as JSON to this file.')
+    arg_parser.add_argument('--metrics',
+            dest='metrics',
+            help="Write request metrics on exit to this file: Prometheus text if it ends with .prom or .txt, JSON otherwise ('-' for STDERR).")
+    arg_parser.add_argument('-q', '--quiet',
+            action='store_true',
+            help='Do not print the progress of each download.')
 
     parsed_args = arg_parser.parse_args()
 
-    main(parsed_args)
+    sys.exit(main(parsed_args))